@@ -0,0 +1,300 @@
+"""
+Benchmarks offline de los tres scrapers.
+
+Levanta un servidor aiohttp local, en su propio hilo y event loop, que responde con las respuestas
+grabadas de `fixtures/` (Sky Scrapper, Booking.com y una página de Civitatis), apunta los módulos
+de `src/` a ese servidor y mide para cada `main`: throughput, percentiles de latencia por petición,
+tiempo de parseo y pico de memoria. El pico de memoria se mide en una pasada aparte sin cronometrar,
+porque tracemalloc ralentiza mucho la ejecución. No hace ninguna llamada a las APIs de pago.
+
+Uso:
+    python benchmarks/bench_scrapers.py                          # imprime los resultados
+    python benchmarks/bench_scrapers.py --output base.json       # guarda una línea base
+    python benchmarks/bench_scrapers.py --compare base.json      # falla (exit 1) si hay regresión
+    python benchmarks/bench_scrapers.py --selenium               # incluye activityfunc.main con Selenium (necesita Chrome)
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import date
+
+import lxml.html
+from aiohttp import web
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+import activityfunc
+import flightfunc
+import hotelfunc
+import httpfunc
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+HOTEL_PAGES = 3 # Páginas de cada búsqueda de hoteles: el servidor ajusta `count` y devuelve una página vacía a partir de ésta
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return json.load(f) if name.endswith(".json") else f.read()
+
+
+def make_app(latency):
+    """
+    Servidor que imita los endpoints usados por los scrapers, con `latency` segundos de espera por petición.
+    """
+    airport = load_fixture("sky_search_airport.json")
+    flights = load_fixture("sky_search_flights.json")
+    locations = load_fixture("booking_locations.json")
+    search = load_fixture("booking_search.json")
+    search = {**search, "count": HOTEL_PAGES * len(search["result"])}
+    civitatis = load_fixture("civitatis_budapest.html")
+
+    @web.middleware
+    async def delay(request, handler):
+        request.app["stats"]["requests"] += 1
+        await asyncio.sleep(latency)
+        return await handler(request)
+
+    async def hotel_search(request):
+        if int(request.query.get("page_number", 0)) >= HOTEL_PAGES:
+            return web.json_response({"count": search["count"], "result": []})
+        return web.json_response(search)
+
+    app = web.Application(middlewares=[delay])
+    app["stats"] = {"requests": 0} # Diccionario mutable: el estado de la app no se puede cambiar una vez arrancada
+    app.router.add_get("/sky/v1/flights/searchAirport", lambda r: web.json_response(airport))
+    app.router.add_get("/sky/v2/flights/searchFlights", lambda r: web.json_response(flights))
+    app.router.add_get("/booking/hotels/locations", lambda r: web.json_response(locations))
+    app.router.add_get("/booking/hotels/search", hotel_search)
+    app.router.add_get("/civitatis/es/{loc}/", lambda r: web.Response(text=civitatis, content_type="text/html"))
+    return app
+
+
+class MockServer:
+    """
+    Servidor de `make_app` en un hilo con su propio event loop, para que no compita con el código medido.
+
+    Args:
+        latency (float): Espera en segundos por petición.
+    """
+
+    def __init__(self, latency):
+        self.app = make_app(latency)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.runner = None
+        self.base = None
+
+    @property
+    def requests(self):
+        return self.app["stats"]["requests"]
+
+    async def _start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        self.base = asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class LatencyRecorder:
+    """
+    Mide la latencia de cada `ApiClient.get_json` mientras está activo.
+    """
+
+    def __init__(self):
+        self.samples = []
+        self.original = httpfunc.ApiClient.get_json
+
+    def __enter__(self):
+        original = self.original
+        samples = self.samples
+
+        async def timed(client, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original(client, *args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - start)
+
+        httpfunc.ApiClient.get_json = timed
+        return self
+
+    def __exit__(self, *exc):
+        httpfunc.ApiClient.get_json = self.original
+
+
+def latency_summary(samples):
+    if len(samples) < 2:
+        return {}
+    cuts = statistics.quantiles(samples, n=100)
+    return {"p50_ms": cuts[49] * 1000, "p90_ms": cuts[89] * 1000, "p99_ms": cuts[98] * 1000}
+
+
+async def run_main(server, coro_factory):
+    """
+    Ejecuta un `main` midiendo tiempo, peticiones servidas y latencias, y después lo repite sin cronometrar
+    para medir el pico de memoria (con tracemalloc activo los tiempos no son representativos).
+    """
+    before = server.requests
+    start = time.perf_counter()
+    with LatencyRecorder() as recorder:
+        rows = await coro_factory()
+    seconds = time.perf_counter() - start
+    requests = server.requests - before
+
+    tracemalloc.start()
+    try:
+        await coro_factory()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": seconds,
+        "requests": requests,
+        "rows": rows,
+        "requests_per_s": requests / seconds,
+        "peak_mb": peak / 1024**2,
+        **latency_summary(recorder.samples),
+    }
+
+
+async def bench_flights(server):
+    flightfunc.API_URL = f"{server.base}/sky"
+    origin = flightfunc.skyID("Madrid", "token") # skyID es síncrono; el servidor va en su propio hilo
+    destination = flightfunc.skyID("Budapest", "token")
+
+    async def run():
+        df = await flightfunc.main("token", origin, [destination, destination], 2, 2, max_concurrency=20, rate=None)
+        return len(df)
+
+    return await run_main(server, run)
+
+
+async def bench_hotels(server):
+    hotelfunc.API_URL = f"{server.base}/booking"
+    loc_ids = hotelfunc.get_location_ids(["Budapest", "Budapest"], "token")
+
+    async def run():
+        frames = await hotelfunc.main(loc_ids, "token", max_concurrency=20, rate=None)
+        return sum(len(df) for df in frames)
+
+    return await run_main(server, run)
+
+
+async def bench_activities(server, engine):
+    activityfunc.BASE_URL = f"{server.base}/civitatis"
+
+    async def run():
+        df = await asyncio.to_thread(activityfunc.main, ["budapest", "milan"], 4, 2, engine=engine)
+        return len(df)
+
+    return await run_main(server, run)
+
+
+def bench_parse(function, payload, repeat):
+    """
+    Tiempo medio por llamada de una función de parseo.
+    """
+    function(payload) # Calentamiento
+    start = time.perf_counter()
+    for _ in range(repeat):
+        rows = len(function(payload))
+    seconds = (time.perf_counter() - start) / repeat
+    return {"ms_per_call": seconds * 1000, "rows_per_call": rows, "rows_per_s": rows / seconds}
+
+
+def parse_benchmarks(repeat):
+    flights = load_fixture("sky_search_flights.json")
+    hotels = load_fixture("booking_search.json")["result"]
+    page = lxml.html.fromstring(load_fixture("civitatis_budapest.html"))
+    container = "".join(lxml.html.tostring(child, encoding="unicode") for child in page.get_element_by_id("activities-container"))
+    return {
+        "parse_flights_x50": bench_parse(flightfunc.parse_flight_responses, [flights] * 50, repeat),
+        "extract_hotels_x50": bench_parse(hotelfunc.extract_hotel_info, hotels * 50, repeat),
+        "extract_hotel_batch_x50": bench_parse(hotelfunc.extract_hotel_batch, [(hotels, date(2025, 7, 1), date(2025, 7, 10), f"w{i}") for i in range(50)], repeat),
+        "parse_activities": bench_parse(activityfunc.parse_activities_html, container, repeat),
+    }
+
+
+async def run_benchmarks(server, selenium, repeat):
+    results = {
+        "flightfunc.main": await bench_flights(server),
+        "hotelfunc.main": await bench_hotels(server),
+        "activityfunc.main[http]": await bench_activities(server, "http"),
+    }
+    if selenium:
+        results["activityfunc.main[selenium]"] = await bench_activities(server, "selenium")
+    results.update(parse_benchmarks(repeat))
+    return results
+
+
+# Métricas donde "más es mejor"; en el resto (tiempos, memoria) una subida es una regresión
+HIGHER_IS_BETTER = {"requests_per_s", "rows_per_s"}
+CHECKED = {"seconds", "requests_per_s", "peak_mb", "p90_ms", "ms_per_call", "rows_per_s"}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compara con una línea base y devuelve la lista de regresiones mayores que `tolerance` (fracción).
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if metric not in CHECKED or not old:
+                continue
+            change = (value - old) / old
+            if (metric in HIGHER_IS_BETTER and change < -tolerance) or (metric not in HIGHER_IS_BETTER and change > tolerance):
+                regressions.append(f"{name}.{metric}: {old:.3f} -> {value:.3f} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=20, help="Latencia simulada por petición")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones de cada benchmark de parseo")
+    parser.add_argument("--selenium", action="store_true", help="Incluye activityfunc.main con Selenium (necesita Chrome)")
+    parser.add_argument("--output", help="Fichero JSON donde guardar los resultados")
+    parser.add_argument("--compare", help="Fichero JSON con una línea base")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento relativo permitido frente a la línea base")
+    args = parser.parse_args()
+
+    with MockServer(args.latency_ms / 1000) as server:
+        results = asyncio.run(run_benchmarks(server, args.selenium, args.repeat))
+    for name, metrics in results.items():
+        print(name)
+        for metric, value in metrics.items():
+            print(f"  {metric:>16}: {value:,.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regresiones:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,152 +1,469 @@
 import pandas as pd
 import numpy as np
+import asyncio
 import concurrent.futures
-import janus
+import queue as queue_lib
+import threading
+from contextlib import contextmanager
 import time
+import aiohttp
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+import lxml.html
+from collections import namedtuple
+from metricsfunc import count, timed, profiled
+from planfunc import plan, shard_jobs
+from storefunc import sink_schema
 
-import janus
+BASE_URL = "https://www.civitatis.com" # Se puede sobrescribir para apuntar a un servidor local (benchmarks)
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0 Safari/537.36",
+    "Accept-Language": "es-ES,es;q=0.9",
+}
 
-def get_info_page(queue):
+def chrome_options():
     """
-    Extrae información de actividades desde una página web utilizando Selenium.
+    Opciones de Chrome usadas por todos los drivers del scraper.
+
+    Returns:
+        Options: Opciones de Chrome en modo headless.
+    """
+    options = Options()
+    options.add_argument("--headless=old")  # Ejecución sin interfaz gráfica
+    options.add_argument("--disable-dev-shm-usage")
+    return options
+
+# Errores de Selenium que dependen de la página y no dejan el navegador inservible
+PAGE_ERRORS = (NoSuchElementException, StaleElementReferenceException, TimeoutException)
+
+class DriverPool:
+    """
+    Pool de navegadores Chrome de larga duración que se reutilizan entre URLs.
+
+    Cada hueco del pool mantiene un único driver, que se crea bajo demanda, se reinicia tras
+    `max_pages` páginas o tras un fallo, y se cierra siempre al cerrar el pool.
+
+    Args:
+        size (int): Número de navegadores abiertos como máximo.
+        max_pages (int): Número de páginas tras las que se reinicia un navegador.
+    """
+
+    def __init__(self, size=4, max_pages=50):
+        self.size = size
+        self.max_pages = max_pages
+        self.slots = queue_lib.Queue()
+        self.drivers = set()
+        self.lock = threading.Lock()
+        for _ in range(size):
+            self.slots.put([None, 0]) # [driver, páginas servidas]
+
+    def _quit(self, driver):
+        with self.lock:
+            self.drivers.discard(driver)
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Error cerrando el driver: {e}")
+
+    def _start(self):
+        driver = webdriver.Chrome(options=chrome_options())
+        with self.lock:
+            self.drivers.add(driver)
+        return driver
+
+    @contextmanager
+    def driver(self):
+        """
+        Presta un navegador del pool durante el bloque `with`.
+
+        Los errores de la página (elemento que no está, espera agotada) se propagan sin tirar el navegador.
+        Cualquier otro error se trata como una caída: una `WebDriverException` de sesión, pero también los que
+        Selenium no envuelve cuando muere chromedriver (`urllib3.exceptions.MaxRetryError`, `ConnectionRefusedError`).
+        El navegador se descarta y el siguiente uso arranca uno nuevo.
+
+        Yields:
+            webdriver.Chrome: Navegador listo para usar.
+        """
+        slot = self.slots.get() # Bloquea hasta que haya un navegador libre
+        try:
+            if slot[0] is None or slot[1] >= self.max_pages: # Reinicio periódico para evitar fugas de memoria de Chrome
+                if slot[0] is not None:
+                    self._quit(slot[0])
+                    slot[0] = None # Si _start falla, no se vuelve a cerrar un navegador ya cerrado
+                slot[0], slot[1] = self._start(), 0
+            yield slot[0]
+            slot[1] += 1
+        except PAGE_ERRORS:
+            slot[1] += 1 # El navegador sigue bien: sólo ha fallado la página
+            raise
+        except Exception:
+            if slot[0] is not None: # Navegador posiblemente roto, se descarta
+                self._quit(slot[0])
+            slot[0], slot[1] = None, 0
+            raise
+        finally:
+            self.slots.put(slot)
+
+    def close(self):
+        """
+        Cierra todos los navegadores abiertos por el pool.
+        """
+        with self.lock:
+            drivers = list(self.drivers)
+        for driver in drivers:
+            self._quit(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+ACTIVITY_COLUMNS = ['Nombre', 'Precio', 'Link', 'Descripcion']
+OUTPUT_COLUMNS = ACTIVITY_COLUMNS + ['Ciudad', 'date_in', 'date_out'] # Cada actividad lleva la consulta de la que sale
+
+# Una página a scrapear junto a la consulta (destino y fechas) de la que sale
+PageTask = namedtuple("PageTask", ["city", "date_in", "date_out", "url"])
+
+def tag_records(records, task):
+    """
+    Añade a los registros de una página la consulta de la que salen (destino y fechas).
 
     Args:
-        queue (janus.Queue): Cola que contiene las URLs de las páginas a scrapear.
+        records (list): Registros devueltos por `parse_activities_html`.
+        task (PageTask): Página de la que salen.
 
     Returns:
-        pd.DataFrame: Un DataFrame que contiene los nombres, precios, enlaces y descripciones de las actividades.
+        list: Los mismos registros, con las columnas 'Ciudad', 'date_in' y 'date_out'.
     """
-    names_list = []
-    prices_list = []
-    links_list = []
-    desc_list = []
+    for record in records:
+        record.update(Ciudad=task.city, date_in=task.date_in, date_out=task.date_out)
+    return records
+
+def _parse_cards(tree):
+    records = []
+    for card in tree.find_class("o-search-list__item"): # El cuadro donde están los items
+        record = dict.fromkeys(ACTIVITY_COLUMNS, np.nan)
+        for el in card.iter("a", "h2", "span", "div"):
+            classes = el.get("class", "").split()
+            if el.tag == "a" and "_activity-link" in classes and pd.isna(record['Link']): # Algunas actividades (posiblemente patrocinadas) no tienen este enlace
+                href = el.get("href")
+                if href:
+                    record['Link'] = "https://www.civitatis.com" + href
+            elif el.tag == "h2" and "comfort-card__title" in classes and pd.isna(record['Nombre']):
+                record['Nombre'] = el.text_content().strip()
+            elif el.tag == "span" and "comfort-card__price__text" in classes and pd.isna(record['Precio']):
+                record['Precio'] = el.text_content()
+            elif el.tag == "div" and "comfort-card__text" in classes and "l-list-card__text" in classes and pd.isna(record['Descripcion']):
+                record['Descripcion'] = el.text_content().strip()
+        records.append(record)
+    return records
+
+@timed()
+def parse_activities_html(html):
+    """
+    Extrae las actividades del HTML del contenedor `activities-container` de Civitatis.
+
+    Es una función pura (texto HTML -> registros), así que se puede ejecutar en un ProcessPoolExecutor.
+    Cada tarjeta se recorre una sola vez y todos sus campos se sacan en esa pasada, de modo que
+    nombre, precio, enlace y descripción siempre quedan alineados; si falta un campo queda como NaN.
+
+    Args:
+        html (str): HTML interior del contenedor de actividades.
+
+    Returns:
+        list: Lista de diccionarios con las claves 'Nombre', 'Precio', 'Link' y 'Descripcion'.
+    """
+    if not html or not html.strip():
+        return []
+    return _parse_cards(lxml.html.fromstring(html))
+
+@timed()
+def parse_page_html(html):
+    """
+    Extrae las actividades de una página completa de Civitatis descargada sin navegador.
+
+    Sólo se parsea el nodo `activities-container`, igual que en Selenium, así las tarjetas de otras
+    partes de la página (recomendaciones...) no se cuelan en los resultados.
+
+    Args:
+        html (str): HTML de la página.
+
+    Returns:
+        list | None: Registros como en `parse_activities_html`, o None si la página está vacía o si el contenedor
+                     no está o no trae tarjetas (el listado se pinta con JavaScript y hace falta Selenium).
+    """
+    if not html or not html.strip(): # lxml no acepta documentos vacíos
+        return None
+    containers = lxml.html.fromstring(html).xpath("//*[@id='activities-container']")
+    if not containers or not containers[0].find_class("o-search-list__item"):
+        return None
+    return _parse_cards(containers[0])
+
+@timed()
+def fetch_page_html(pool, url):
+    """
+    Carga una página de Civitatis con Selenium y devuelve el HTML del contenedor de actividades.
+
+    Args:
+        pool (DriverPool): Pool de navegadores reutilizables.
+        url (str): URL de la página.
+
+    Returns:
+        str: HTML interior de `activities-container`.
+    """
+    with pool.driver() as driver: # El navegador se reutiliza entre URLs en lugar de abrir uno nuevo por página
+        print(f"Fetching URL: {url}")
+        time.sleep(0.5)
+        driver.get(url)
+
+        try:
+            consent_button = WebDriverWait(driver, 2).until(
+                EC.element_to_be_clickable((By.XPATH, '//*[@id="didomi-notice-disagree-button"]/span')) # Rechazamos cookies
+            )
+            consent_button.click()
+        except:
+            pass
+            # print(f"Consent button not found") # Esto porque hay casos en los que se abre pestaña nueva en el driver y no se necesita rechazar cookies
+        time.sleep(0.5)
+
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);") # Scroll para cargar contenido
+        time.sleep(0.5)
+
+        return driver.find_element(By.XPATH, '//*[@id="activities-container"]').get_attribute("innerHTML") # Extraer HTML para parsearlo fuera de Selenium
+
+def get_info_page(queue, pool, parse_executor, sink=None):
+    """
+    Worker: descarga páginas de actividades de la cola con Selenium y manda su HTML a parsear al pool de procesos.
+
+    El hilo sólo se encarga de la descarga; el parseo se hace en `parse_executor` mientras el hilo
+    sigue con la siguiente página. Termina al recibir su señal de parada (None). Cada elemento sacado
+    de la cola se marca con `task_done` aunque falle, así un `join` sobre la cola nunca se queda colgado.
+
+    Args:
+        queue (queue.Queue): Cola acotada con las páginas (`PageTask`) a scrapear.
+        pool (DriverPool): Pool de navegadores reutilizables.
+        parse_executor (concurrent.futures.Executor): Pool donde se ejecuta `parse_activities_html`.
+        sink (sinkfunc.ParquetSink, optional): Salida incremental; cada página se escribe a disco al terminar de parsearse
+                                               y las ya guardadas en ejecuciones anteriores se saltan.
+
+    Returns:
+        list: Tuplas (PageTask, futuro con la lista de registros) de cada página descargada.
+    """
+    pages = []
 
-    chrome_options = Options()
-    chrome_options.add_argument("--headless=old")  # Ejecución sin interfaz gráfica
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    
-    df_page = pd.DataFrame()
-    
     while True:
+        task = queue.get()
         try:
-            url = queue.sync_q.get() # Obtenemos los links de la cola, generados en la función de link_queue.
-            if url is None: # Como es una función que aplicaremos con futuros, ponemos una condición para que deje de ejecutarse si no quedan más links.
+            if task is None: # Señal de parada: el productor pone una por worker
                 break
-            driver = webdriver.Chrome(options=chrome_options)
-            print(f"Fetching URL: {url}")
-            time.sleep(0.5)
-            driver.get(url)
-
-            try:
-                consent_button = WebDriverWait(driver, 2).until(
-                    EC.element_to_be_clickable((By.XPATH, '//*[@id="didomi-notice-disagree-button"]/span')) # Rechazamos cookies
-                )
-                consent_button.click()
-            except:
-                pass
-                # print(f"Consent button not found") # Esto porque hay casos en los que se abre pestaña nueva en el driver y no se necesita rechazar cookies
-            time.sleep(0.5)
-
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);") # Scroll para cargar contenido
-            time.sleep(0.5)
-
-            urls_html = driver.find_element(By.XPATH, '//*[@id="activities-container"]').get_attribute("innerHTML") # Extraer HTML para luego hacer sopa
-
-            link_soup = BeautifulSoup(urls_html, "html.parser") # sopa, así evitamos tener que usar selenium
-            activities = link_soup.findAll("div", class_='o-search-list__item') # El cuadro donde están los items
-            for activity in activities: # El método de extracción de links es diferente al resto porque el tag de algunas actividades son diferentes (posiblemente patrocinados)
-                try:
-                    link = activity.find("a", class_='ga-trackEvent-element _activity-link').get('href')
-                    links_list.append("https://www.civitatis.com" + link)
-                except Exception as e:
-                    # print(f"Error link: {e}")
-                    links_list.append(np.nan)
-
-            # print(f"Links: {links_list}")
-
-            # Para el resto de info es el mismo método
-            names = link_soup.findAll("h2", class_="comfort-card__title")
-            names_list.extend([name.text.strip() for name in names])
-            # print(f"Names: {names_list}")
-
-            prices = link_soup.findAll("span", "comfort-card__price__text")
-            prices_list.extend([price.text for price in prices])
-            # print(f"Prices: {prices_list}")
-
-            descs = link_soup.findAll("div", class_='comfort-card__text l-list-card__text')
-            desc_list.extend([desc.text.strip() for desc in descs])
-            # print(f"Descriptions: {desc_list}")
-            # driver.quit()
-            queue.sync_q.task_done() # Aquí indicamos que la tarea que había en cola se ha finalizado, pasando a la siguiente
+            if sink is not None and sink.done(task.url):
+                continue
+            html = fetch_page_html(pool, task.url)
+            future = parse_executor.submit(parse_activities_html, html)
+            future.add_done_callback(lambda f: f.exception() or count("rows.activities", len(f.result()))) # El parseo va en otro proceso: las filas se cuentan aquí
+            if sink is not None: # Volcamos la página a disco en cuanto se termina de parsear
+                future.add_done_callback(lambda f, task=task: f.exception() or sink.write(pd.DataFrame(tag_records(f.result(), task), columns=OUTPUT_COLUMNS), task.url))
+            pages.append((task, future))
         except Exception as e:
-            print(f"Error scraping {url}: {e}")
-        
-    df_page = pd.DataFrame({'Nombre': names_list, 'Precio': prices_list, 'Link': links_list, 'Descripcion': desc_list})
-            
-    return df_page
+            print(f"Error scraping {task.url}: {e}")
+        finally:
+            queue.task_done()
+
+    return pages
 
-def link_queue(queue, base_url, pages):
+def link_queue(queue, tasks, workers):
     """
-    Añade URLs a una cola para el scraping.
+    Productor: añade las páginas a la cola y después una señal de parada por worker.
+
+    Como la cola está acotada, `put` se bloquea mientras los workers van atrasados, así que
+    `tasks` puede ser un generador y nunca hay más de `queue.maxsize` páginas esperando.
+    Las señales de parada se ponen aunque `tasks` lance una excepción (o se interrumpa el `put`),
+    así los workers siempre terminan; la excepción se propaga después.
 
     Args:
-        queue (janus.Queue): Cola donde se almacenarán las URLs.
-        base_url (str): URL base a la que se le añadirán los parámetros de la página.
-        pages (int): Número de páginas que se desea scrapear.
+        queue (queue.Queue): Cola donde se almacenarán las páginas.
+        tasks (iterable): Páginas (`PageTask`) que se desea scrapear.
+        workers (int): Número de workers que consumen la cola.
     """
-    for page in range(1, pages + 1):
-        url = base_url + f"&page={page}"
-        # print(f'Added {url} to queue')
-        queue.sync_q.put(url) # Añadimos las urls a la cola
-    queue.sync_q.put(None)  # Añadimos un None que indica el final de la cola de urls
+    try:
+        for task in tasks:
+            queue.put(task) # Añadimos las páginas a la cola
+    finally:
+        for _ in range(workers):
+            queue.put(None) # Un None por worker: cada uno termina al recibir el suyo
 
-def main(destinations):
+def selenium_engine(tasks, parse_executor, max_workers=10, pool_size=4, max_pages_per_driver=50, sink=None, queue_size=None):
+    """
+    Descarga páginas con navegadores Selenium en paralelo.
+
+    Args:
+        tasks (iterable): Páginas (`PageTask`) a scrapear; puede ser un generador.
+        parse_executor (concurrent.futures.Executor): Pool donde se parsea el HTML.
+        max_workers (int): Número de hilos que descargan, independiente del número de páginas.
+        pool_size (int): Número de navegadores Chrome abiertos a la vez.
+        max_pages_per_driver (int): Páginas tras las que se reinicia cada navegador.
+        sink (sinkfunc.ParquetSink, optional): Salida incremental con reanudación por URL.
+        queue_size (int, optional): Tamaño máximo de la cola; por defecto el doble de `max_workers`.
+
+    Returns:
+        list: Tuplas (PageTask, futuro con la lista de registros) de cada página descargada.
+    """
+    queue = queue_lib.Queue(maxsize=queue_size or 2 * max_workers) # Cola acotada: el productor espera a los workers
+
+    with DriverPool(pool_size, max_pages_per_driver) as pool, \
+         concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor: # Hilos para Selenium, procesos para parsear
+        workers = [executor.submit(get_info_page, queue, pool, parse_executor, sink) for _ in range(max_workers)]
+        link_queue(queue, tasks, max_workers) # El productor corre en este hilo; si falla, el error sale al cerrar el executor, con los workers ya terminados
+
+    return [page for worker in workers for page in worker.result()]
+
+@timed()
+async def fetch_page_static(session, url):
+    """
+    Descarga una página de Civitatis sin navegador.
+
+    Args:
+        session (aiohttp.ClientSession): Sesión HTTP con el pool de conexiones.
+        url (str): URL de la página.
+
+    Returns:
+        str | None: HTML de la página, o None si falla.
+    """
+    count("http.requests")
+    try:
+        async with session.get(url) as response:
+            if response.status != 200:
+                print(f"Error {response.status} en {url}")
+                return None
+            html = await response.text()
+            count("http.bytes", response.content_length or len(html.encode()))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Error scraping {url}: {e}")
+        return None
+    return html
+
+async def http_engine(tasks, parse_executor, sink=None, max_connections=20):
+    """
+    Descarga páginas de Civitatis con aiohttp, reutilizando conexiones (keep-alive) entre peticiones.
+
+    Args:
+        tasks (list): Páginas (`PageTask`) a scrapear.
+        parse_executor (concurrent.futures.Executor): Pool donde se parsea el HTML.
+        sink (sinkfunc.ParquetSink, optional): Salida incremental con reanudación por URL.
+        max_connections (int): Número máximo de conexiones abiertas a la vez.
+
+    Returns:
+        tuple: (lista de registros, páginas que necesitan Selenium porque su HTML estático no trae el listado).
+    """
+    loop = asyncio.get_running_loop()
+    connector = aiohttp.TCPConnector(limit=max_connections, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=30)
+
+    async with aiohttp.ClientSession(connector=connector, headers=HTTP_HEADERS, timeout=timeout) as session:
+        async def scrape(task):
+            html = await fetch_page_static(session, task.url)
+            if html is None:
+                return task, None
+            try:
+                records = await loop.run_in_executor(parse_executor, parse_page_html, html)
+            except Exception as e: # Como en Selenium, una página que no se puede parsear no tira el resto
+                print(f"Error parsing {task.url}: {e}")
+                return task, None
+            if records is None: # El listado se pinta con JavaScript: hace falta Selenium
+                return task, None
+            records = tag_records(records, task)
+            count("rows.activities", len(records))
+            if sink is not None:
+                sink.write(pd.DataFrame(records, columns=OUTPUT_COLUMNS), task.url)
+            return task, records
+
+        results = await asyncio.gather(*[scrape(task) for task in tasks if sink is None or not sink.done(task.url)])
+
+    records = [record for _, page in results if page is not None for record in page]
+    fallback = [task for task, page in results if page is None]
+    return records, fallback
+
+def run_async(coro):
+    """
+    Ejecuta una corrutina desde código síncrono, también desde Jupyter (donde ya hay un event loop en marcha).
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as runner:
+        return runner.submit(asyncio.run, coro).result()
+
+@profiled("activityfunc.main")
+def main(destinations, max_workers=10, pool_size=4, max_pages_per_driver=50, parse_workers=None, sink=None, engine="selenium", max_connections=20, dates=None, total_pages=2, shard=None):
     """
     Función principal que coordina el scraping de múltiples URLs.
 
     Args:
         destinations (list): Lista de destinos para los que se generarán URLs.
+        max_workers (int): Número de hilos que descargan con Selenium, independiente del número de destinos y páginas.
+        pool_size (int): Número de navegadores Chrome abiertos a la vez, independiente de `max_workers`.
+        max_pages_per_driver (int): Páginas tras las que se reinicia cada navegador.
+        parse_workers (int, optional): Número de procesos que parsean el HTML; por defecto uno por CPU.
+        sink (sinkfunc.ParquetSink, optional): Salida incremental con reanudación por URL.
+        engine (str): "selenium" para usar siempre el navegador, o "http" para descargar con aiohttp
+                      y usar Selenium sólo en las páginas cuyo HTML estático no trae el listado.
+        max_connections (int): Conexiones simultáneas del motor "http".
+        dates (dict | list, optional): Bloques de fechas del plan de búsqueda (ver `planfunc.date_windows`);
+                                       por defecto estancias de 14 noches desde el 1 y el 15 de julio y agosto de 2025.
+        total_pages (int): Número de páginas de resultados que se scrapean por destino y fechas.
+        shard (tuple, optional): (índice, total) para quedarse sólo con una parte del plan (ver `planfunc.shard_jobs`).
 
     Returns:
-        pd.DataFrame: Un DataFrame combinado que contiene la información de todas las actividades extraídas.
-    """
-    queue = janus.Queue() # En el main generamos la cola que vamos a usar 
-    day_in = 1
-    year = 2025
-    base_urls = []
-    for month in range(7,9):
-        for day_in in [1,15]:
-            date_in = f"{year}-{month}-{day_in:02}"  # Y M D
-            date_out = f"{year}-{month}-{day_in + 14}"  # Y M D
-            base_urls.extend([f'https://www.civitatis.com/es/{loc}/?fromDate={date_in}&toDate={date_out}' for loc in destinations]) # URLs base para cada loc
-    # print(base_urls)
-    total_pages = 2 # Número de páginas que vamos a scrapear por localización
-
-    max_w = 10
-    results = [] 
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_w) as executor: # Esto es para procesos paralelos
-        futures = [] # Los objetos de futuro que vamos generando
+        pd.DataFrame: Un DataFrame combinado que contiene la información de todas las actividades extraídas,
+                      con el destino y las fechas de la consulta en 'Ciudad', 'date_in' y 'date_out'.
+                      Si se usa `sink`, devuelve la ruta de la carpeta de salida.
+    """
+    if engine not in ("selenium", "http"):
+        raise ValueError(f"Motor no válido: {engine}")
 
-        for url in base_urls: # Añadimos a la cola todas las urls donde queremos extraer info
-            link_queue(queue, url, total_pages)
+    if dates is None:
+        dates = {"year": 2025, "months": [7, 8], "nights": 14, "days": [1, 15]}
+    jobs = plan({"destinations": destinations, "dates": dates})
+    if shard is not None:
+        jobs = shard_jobs(jobs, *shard)
+
+    def page_tasks(): # Generador: las páginas se crean a medida que los workers las piden
+        for job in jobs:
+            base_url = f'{BASE_URL}/es/{job.destination}/?fromDate={job.check_in}&toDate={job.check_out}' # URL base para cada loc y fechas
+            for page in range(1, total_pages + 1):
+                yield PageTask(job.destination, job.check_in, job.check_out, base_url + f"&page={page}")
+
+    tasks = page_tasks()
+    if sink is not None and sink.schema is None:
+        sink.schema = sink_schema("activities")
+    records = []
+    pages = []
+    
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=parse_workers) as parse_executor:
+            if engine == "http":
+                records, tasks = run_async(http_engine(list(tasks), parse_executor, sink, max_connections))
+                if tasks:
+                    print(f"{len(tasks)} páginas sin listado en el HTML estático, se descargan con Selenium")
 
-        for _ in base_urls: # Guión bajo porque solo usamos el for como iteración limitada, no se usan los elementos
-            future = executor.submit(get_info_page, queue) # Ejecutamos paralelamente la función para los elementos de la cola
-            futures.append(future) # Añadimos el futuro generado a la lista de futuros
+            if engine == "selenium" or tasks:
+                pages = selenium_engine(tasks, parse_executor, max_workers, pool_size, max_pages_per_driver, sink)
+    finally:
+        if sink is not None:
+            sink.close() # Aunque la ejecución falle, lo ya escrito queda confirmado para reanudar
 
+    if sink is not None:
+        return sink.path
 
-    for future in futures:
-        result_df = future.result()
-        results.append(result_df)
+    for task, parse_future in pages:
+        if parse_future.exception() is None:
+            records.extend(tag_records(parse_future.result(), task))
+        else:
+            print(f"Error parsing {task.url}: {parse_future.exception()}")
  
-    final_df = pd.concat(results, ignore_index=True) 
+    final_df = pd.DataFrame(records, columns=OUTPUT_COLUMNS) 
     # print(final_df)
     return final_df
 
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# TTL en segundos por endpoint. Los IDs de aeropuertos y destinos casi nunca cambian, los precios sí.
+DEFAULT_TTLS = {
+    "flights/searchAirport": 30 * 24 * 3600,
+    "hotels/locations": 30 * 24 * 3600,
+    "flights/searchFlights": 6 * 3600,
+    "hotels/search": 6 * 3600,
+}
+DEFAULT_TTL = 3600
+
+
+def cache_key(url, params=None):
+    """
+    Genera una clave estable para una petición a partir de la URL y sus parámetros.
+
+    Los parámetros se ordenan y se convierten a texto, así `{"a": 1, "b": "2"}` y `{"b": 2, "a": "1"}`
+    comparten la misma clave. Las cabeceras (donde va el token) no forman parte de la clave.
+
+    Args:
+        url (str): URL del endpoint.
+        params (dict, optional): Parámetros de la query.
+
+    Returns:
+        str: Hash SHA-256 de la petición normalizada.
+    """
+    items = sorted((str(k), str(v)) for k, v in (params or {}).items())
+    raw = json.dumps([url.rstrip("/"), items], separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Caché persistente en disco (SQLite) para las respuestas JSON de las APIs de RapidAPI.
+
+    Las respuestas se guardan comprimidas con zlib. La base de datos usa el modo WAL, por lo que
+    se puede leer desde varios hilos o procesos a la vez. Cuando se supera `max_entries` o `max_bytes`
+    se eliminan las entradas usadas hace más tiempo (LRU).
+
+    Las lecturas no escriben salvo para refrescar `accessed_at` de una entrada tocada hace más de
+    `touch_interval` segundos, así que casi nunca esperan al bloqueo de escritura de SQLite. Las entradas
+    caducadas no se borran al leerlas: se sobrescriben con el siguiente `set` o se eliminan al expulsar.
+
+    Args:
+        path (str): Ruta del fichero SQLite.
+        ttls (dict, optional): TTL en segundos por fragmento de URL del endpoint.
+        max_entries (int): Número máximo de respuestas guardadas.
+        max_bytes (int): Tamaño máximo (comprimido) de las respuestas guardadas.
+        touch_interval (float): Resolución en segundos de `accessed_at` para el LRU.
+    """
+
+    def __init__(self, path="../datos/http_cache.sqlite", ttls=None, max_entries=50_000, max_bytes=512 * 1024**2, touch_interval=3600):
+        self.path = path
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.lock = threading.Lock()
+        self.writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                fetched_at REAL
+            )""")
+        if "fetched_at" not in [column[1] for column in self.conn.execute("PRAGMA table_info(responses)")]: # Cachés anteriores
+            self.conn.execute("ALTER TABLE responses ADD COLUMN fetched_at REAL")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self.conn.commit()
+
+    def ttl_for(self, url):
+        """
+        Devuelve el TTL aplicable a una URL según el endpoint.
+        """
+        for endpoint, ttl in self.ttls.items():
+            if endpoint in url:
+                return ttl
+        return DEFAULT_TTL
+
+    def get(self, url, params=None, with_time=False):
+        """
+        Busca una respuesta en caché.
+
+        Args:
+            url (str): URL del endpoint.
+            params (dict, optional): Parámetros de la query.
+            with_time (bool): Devolver también el instante en que se descargó la respuesta guardada.
+
+        Returns:
+            dict | list | None: JSON guardado, o None si no existe o ha caducado. Con `with_time`, una tupla
+                                (JSON, instante de la descarga) o (None, None).
+        """
+        key = cache_key(url, params)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT body, expires_at, accessed_at, fetched_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                return (None, None) if with_time else None
+            if now - row[2] >= self.touch_interval: # Sólo se escribe si el LRU lo nota: la mayoría de lecturas no bloquean
+                self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+        data = json.loads(zlib.decompress(row[0]))
+        if not with_time:
+            return data
+        return data, row[3] if row[3] is not None else row[1] - self.ttl_for(url) # Entradas anteriores a la columna: se estima con el TTL
+
+    def set(self, url, params, data, ttl=None):
+        """
+        Guarda una respuesta en caché y aplica la política de expulsión si hace falta.
+
+        Args:
+            url (str): URL del endpoint.
+            params (dict): Parámetros de la query.
+            data (dict | list): JSON de la respuesta.
+            ttl (float, optional): TTL en segundos; por defecto el del endpoint.
+        """
+        key = cache_key(url, params)
+        body = zlib.compress(json.dumps(data, separators=(",", ":")).encode())
+        now = time.time()
+        ttl = self.ttl_for(url) if ttl is None else ttl
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, url, body, size, expires_at, accessed_at, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, body, len(body), now + ttl, now, now))
+            self.writes += 1
+            if self.writes % 100 == 1: # La expulsión recorre la tabla, no hace falta en cada escritura
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        self.conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        count, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Recorremos de más antigua a más reciente hasta volver a estar dentro de los límites
+        to_delete = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            count -= 1
+            total -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+
+    def clear(self):
+        """
+        Elimina todas las respuestas guardadas.
+        """
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,50 +1,61 @@
-import requests
 import pandas as pd
-from calendar import monthrange
 import asyncio
 import aiohttp
+import time
+import pyarrow as pa
+import pyarrow.compute as pc
 from tqdm import tqdm
+from httpfunc import ApiClient, run_bounded, fetch_json_sync
+from metricsfunc import count, timed, profiled
+from planfunc import Job, plan, job_key, shard_jobs
+from storefunc import sink_schema
 
-def skyID(city, token):
+API_URL = "https://sky-scrapper.p.rapidapi.com/api" # Se puede sobrescribir para apuntar a un servidor local (benchmarks)
+
+def skyID(city, token, cache=None):
     """
     Busca el skyId de una ciudad utilizando la API Sky Scrapper.
     
     Parámetros:
     city (str): Nombre de la ciudad para la cual se desea buscar el skyId.
     token (str): Token de autenticación para acceder a la API.
+    cache (cachefunc.ResponseCache, optional): Caché persistente de respuestas.
 
     Retorna:
     tuple: Un par que contiene el skyId de la ciudad y la respuesta completa en formato JSON.
     """
-    url = "https://sky-scrapper.p.rapidapi.com/api/v1/flights/searchAirport"
+    url = f"{API_URL}/v1/flights/searchAirport"
     headers = {
         'x-rapidapi-key': token,
         'x-rapidapi-host': "sky-scrapper.p.rapidapi.com"
     }
     querystring = {"query": city, "locale": "es-ES"}
-    response = requests.get(url, headers=headers, params=querystring)
-    city_json = response.json()
+    status, city_json = fetch_json_sync(url, headers, querystring, cache, validate=lambda r: bool(r.get("data")), memoize=True)
     id = city_json["data"][0]["skyId"]
     return id, city_json
 
-async def get_data(token, session, origin_data, destination_data, depart_date, return_date, adult_n, children_n):
+@timed("flightfunc.get_data.wall") # Incluye las esperas de la cuota y los reintentos; la latencia de cada petición va en http.request.<host>
+async def get_data(token, client, origin_data, destination_data, depart_date, return_date, adult_n, children_n, with_cached_at=False):
     """
     Realiza una búsqueda de vuelos entre dos destinos utilizando la API Sky Scrapper de forma asíncrona.
     
     Parámetros:
     token (str): Token de autenticación para acceder a la API.
-    session (aiohttp.ClientSession): Sesión HTTP asíncrona.
+    client (httpfunc.ApiClient): Cliente HTTP asíncrono con reintentos, límites de tasa y caché.
     origin_data (tuple): Tupla que contiene el skyId y el JSON de la ciudad de origen.
     destination_data (tuple): Tupla que contiene el skyId y el JSON de la ciudad de destino.
     depart_date (str): Fecha de salida en formato 'YYYY-MM-DD'.
     return_date (str): Fecha de regreso en formato 'YYYY-MM-DD'.
     adult_n (int): Número de adultos para el vuelo.
     children_n (int): Número de niños para el vuelo.
+    with_cached_at (bool): Devolver también el instante de la descarga original si la respuesta sale de la caché.
     
     Retorna:
-    dict: La respuesta de la API en formato JSON, que incluye información sobre los vuelos disponibles.
+    dict: La respuesta de la API en formato JSON, que incluye información sobre los vuelos disponibles,
+          o None si la consulta ha fallado tras todos los reintentos (queda registrada en `client.failures`).
+          Con `with_cached_at`, una tupla (JSON, cached_at) como en `ApiClient.get_json`.
     """
-    url = "https://sky-scrapper.p.rapidapi.com/api/v2/flights/searchFlights"
+    url = f"{API_URL}/v2/flights/searchFlights"
     origin_ID, origin_json = origin_data
     dest_ID, dest_json = destination_data
     querystring = {
@@ -67,16 +78,78 @@ async def get_data(token, session, origin_data, destination_data, depart_date, r
         "x-rapidapi-host": "sky-scrapper.p.rapidapi.com"
     }
 
-    async with session.get(url, headers=headers, params=querystring) as response:
-        result = await response.json()
-    
-    if "data" not in result:
-        print(f"Error en la respuesta para {depart_date} a {return_date}: {result}")  # Registro de la respuesta
-        return None  # O retorna un DataFrame vacío si prefieres
-        
-    return result
+    key = window_key(origin_data, destination_data, depart_date, return_date, adult_n, children_n)
+    return await client.get_json(url, headers, querystring, key=key, validate=lambda r: "data" in r, with_cached_at=with_cached_at)
+
+# Sólo se convierten los campos que usamos; pyarrow ignora el resto de claves de cada itinerario
+LEG_TYPE = pa.struct([
+    ("durationInMinutes", pa.int32()),
+    ("departure", pa.string()),
+    ("arrival", pa.string()),
+    ("stopCount", pa.int8()),
+    ("destination", pa.struct([("name", pa.string())])),
+    ("carriers", pa.struct([("marketing", pa.list_(pa.struct([("name", pa.string())])))])),
+])
+ITINERARY_TYPE = pa.struct([
+    ("price", pa.struct([("raw", pa.float64())])),
+    ("legs", pa.list_(LEG_TYPE)),
+])
+FLIGHT_COLUMNS = ["destination", "price", "carrier_go", "duration_go", "departure_go", "arrival_go", "stops_go",
+                  "carrier_back", "duration_back", "departure_back", "arrival_back", "stops_back"]
+
+def _list_element(lists, index):
+    """
+    Elemento `index` de cada lista, con nulo cuando la lista es más corta (pc.list_element fallaría).
+    """
+    has_item = pc.fill_null(pc.greater(pc.list_value_length(lists), index), False)
+    return pc.list_element(pc.if_else(has_item, lists, pa.nulls(len(lists), lists.type)), index)
+
+def _leg_columns(leg, suffix):
+    # pc.struct_field (y no .field) para que las piernas nulas den columnas nulas
+    carrier = pc.struct_field(_list_element(pc.struct_field(leg, ["carriers", "marketing"]), 0), "name")
+    return {
+        f"carrier_{suffix}": pc.dictionary_encode(carrier),
+        f"duration_{suffix}": pc.struct_field(leg, "durationInMinutes"),
+        f"departure_{suffix}": pc.strptime(pc.struct_field(leg, "departure"), format="%Y-%m-%dT%H:%M:%S", unit="s", error_is_null=True),
+        f"arrival_{suffix}": pc.strptime(pc.struct_field(leg, "arrival"), format="%Y-%m-%dT%H:%M:%S", unit="s", error_is_null=True),
+        f"stops_{suffix}": pc.struct_field(leg, "stopCount"),
+    }
+
+@timed()
+def parse_flight_responses(responses):
+    """
+    Extrae en una sola pasada columnar los itinerarios de varias respuestas de la API Sky Scrapper.
+
+    Los itinerarios se convierten a un array de Arrow con tipos fijos y las piernas de ida y vuelta
+    se aplanan con operaciones vectorizadas, sin recorrer los itinerarios uno a uno. Es una función
+    síncrona y sin estado, así que se puede ejecutar en un pool de hilos o procesos fuera del event loop.
 
-async def extract_flight_info(flights_json):
+    Parámetros:
+    responses (list): Lista de JSON devueltos por `get_data`. Las respuestas None o sin "data" se ignoran.
+
+    Retorna:
+    pandas.DataFrame: Un DataFrame con destino, precio, duración, hora de salida y llegada (datetime64),
+                      número de escalas y aerolíneas (categóricas) de la ida y de la vuelta.
+    """
+    itineraries = []
+    for response in responses:
+        if response and response.get("data"):
+            itineraries.extend(response["data"].get("itineraries", []))
+
+    itis = pa.array(itineraries, type=ITINERARY_TYPE)
+    legs = pc.struct_field(itis, "legs")
+    go = _list_element(legs, 0)
+    back = _list_element(legs, 1)
+
+    columns = {
+        "destination": pc.dictionary_encode(pc.struct_field(go, ["destination", "name"])),
+        "price": pc.struct_field(itis, ["price", "raw"]),
+        **_leg_columns(go, "go"),
+        **_leg_columns(back, "back"),
+    }
+    return pa.table({name: columns[name] for name in FLIGHT_COLUMNS}).to_pandas()
+
+def extract_flight_info(flights_json):
     """
     Extrae información relevante de los itinerarios de vuelos desde los datos proporcionados por la API.
 
@@ -87,106 +160,158 @@ async def extract_flight_info(flights_json):
     pandas.DataFrame: Un DataFrame con la información extraída, incluyendo destino, precio, duración, hora de salida y llegada,
                       número de escalas, y aerolíneas tanto para el vuelo de ida como para el de vuelta.
     """
-    itineraries = flights_json["data"]["itineraries"]
-    flight_info = {
-        "destination": [],
-        "price": [],
-        "carrier_go": [],
-        "duration_go": [],
-        "departure_go": [],
-        "arrival_go": [],
-        "stops_go": [],
-        "carrier_back": [],
-        "duration_back": [],
-        "departure_back": [],
-        "arrival_back": [],
-        "stops_back": []
-    }
+    return parse_flight_responses([flights_json])
+
+def window_key(origin_data, destination_data, depart_date, return_date, adult_n, children_n):
+    """
+    Clave que identifica una búsqueda de vuelos, usada para reanudar ejecuciones y en el manifiesto del modo incremental.
 
-    for iti in itineraries:
-        # Ida
-        price = iti["price"]["raw"]
-        destination = iti["legs"][0]["destination"]["name"]
-        duration_go = iti["legs"][0]["durationInMinutes"]
-        departure_go = iti["legs"][0]["departure"]
-        arrival_go = iti["legs"][0]["arrival"]
-        stops_go = iti["legs"][0]["stopCount"]
-        carrier_go = iti["legs"][0]["carriers"]["marketing"][0]["name"]
-
-        flight_info["price"].append(price)
-        flight_info["destination"].append(destination)
-        flight_info["duration_go"].append(duration_go)
-        flight_info["departure_go"].append(departure_go)
-        flight_info["arrival_go"].append(arrival_go)
-        flight_info["stops_go"].append(stops_go)
-        flight_info["carrier_go"].append(carrier_go)
-
-        # Vuelta
-        duration_back = iti["legs"][1]["durationInMinutes"]
-        departure_back = iti["legs"][1]["departure"]
-        arrival_back = iti["legs"][1]["arrival"]
-        stops_back = iti["legs"][1]["stopCount"]
-        carrier_back = iti["legs"][1]["carriers"]["marketing"][0]["name"]
-
-        flight_info["duration_back"].append(duration_back)
-        flight_info["departure_back"].append(departure_back)
-        flight_info["arrival_back"].append(arrival_back)
-        flight_info["stops_back"].append(stops_back)
-        flight_info["carrier_back"].append(carrier_back)
-
-    return pd.DataFrame(flight_info)
-
-async def all_month_flights(token, session, origin_data, destination_data, months, adult_n, children_n):
-    """
-    Busca vuelos para un conjunto de meses entre un origen y varios destinos utilizando la API Sky Scrapper.
+    Es la misma clave que `planfunc.job_key` da a la consulta del plan: dos orígenes o dos grupos distintos
+    para el mismo destino y fechas son búsquedas distintas.
+
+    Parámetros:
+    origin_data (tuple): Tupla que contiene el skyId y el JSON de la ciudad de origen.
+    destination_data (tuple): Tupla que contiene el skyId y el JSON de la ciudad de destino.
+    depart_date (str): Fecha de salida en formato 'YYYY-MM-DD'.
+    return_date (str): Fecha de regreso en formato 'YYYY-MM-DD'.
+    adult_n (int): Número de adultos para el vuelo.
+    children_n (int): Número de niños para el vuelo.
+
+    Retorna:
+    str: Clave "origen|destino|ida|vuelta|adults=N,children=M".
+    """
+    return job_key(Job(origin_data, destination_data, depart_date, return_date, {"adults": adult_n, "children": children_n}))
+
+async def window_flights(token, client, origin_data, destination_data, depart_date, return_date, adult_n, children_n, progress=None, sink=None, parse_executor=None, refresh=None, history=None, observed_at=None):
+    """
+    Consulta y extrae los vuelos de una única ventana de fechas.
 
     Parámetros:
     token (str): Token de autenticación para acceder a la API.
-    session (aiohttp.ClientSession): Sesión HTTP asíncrona.
+    client (httpfunc.ApiClient): Cliente HTTP asíncrono con reintentos, límites de tasa y caché.
     origin_data (tuple): Tupla que contiene el skyId y el JSON de la ciudad de origen.
     destination_data (tuple): Tupla que contiene el skyId y el JSON de la ciudad de destino.
-    months (list): Lista de meses (como enteros) para los cuales se buscarán vuelos.
+    depart_date (str): Fecha de salida en formato 'YYYY-MM-DD'.
+    return_date (str): Fecha de regreso en formato 'YYYY-MM-DD'.
     adult_n (int): Número de adultos para el vuelo.
     children_n (int): Número de niños para el vuelo.
-    
+    progress (tqdm, optional): Barra de progreso que se actualiza al terminar la consulta.
+    sink (sinkfunc.ParquetSink, optional): Salida incremental; si se indica, el lote se escribe en disco en lugar de devolverse.
+    parse_executor (concurrent.futures.Executor, optional): Pool donde se parsea la respuesta, fuera del event loop.
+                                                             Por defecto el pool de hilos del loop.
+    refresh (refreshfunc.Refresher, optional): Manifiesto del modo incremental donde se apunta la ventana si la consulta va bien.
+    history (historyfunc.PriceHistory, optional): Histórico de precios donde se añaden los vuelos de la ventana,
+                                                  en la ruta "skyId de origen-destino". Las respuestas servidas por la
+                                                  caché no se añaden: ya se observaron al descargarlas.
+    observed_at (float, optional): Instante de la observación en el histórico; por defecto ahora.
+
     Retorna:
-    pandas.DataFrame: Un DataFrame que contiene información sobre los vuelos encontrados en los meses especificados.
-    """
-    df_list = []
-    for month in months:
-        for day in tqdm(range(10, monthrange(2025, month)[1] + 1)):
-            depart_date = f'2025-{month:02}-{day-9:02}'
-            return_date = f'2025-{month:02}-{day:02}'
-            flight_json = await get_data(token, session, origin_data, destination_data, depart_date, return_date, adult_n, children_n)
-            flight_info = await extract_flight_info(flight_json)
-            df_list.append(flight_info)
-    
-    return pd.concat(df_list, ignore_index=True)
+    pandas.DataFrame: Un DataFrame con los vuelos de esa ventana (con su clave en la columna `window`),
+                      o None si se ha escrito en `sink` o si la respuesta no se ha podido parsear
+                      (queda registrada en `client.failures`, igual que una consulta fallida).
+    """
+    flight_json, cached_at = await get_data(token, client, origin_data, destination_data, depart_date, return_date, adult_n, children_n, with_cached_at=True)
+    key = window_key(origin_data, destination_data, depart_date, return_date, adult_n, children_n)
+    loop = asyncio.get_running_loop()
+    try:
+        flight_info = await loop.run_in_executor(parse_executor, parse_flight_responses, [flight_json])
+    except (pa.ArrowException, ValueError, TypeError, KeyError, AttributeError) as e: # Respuesta con "data" pero mal formada
+        count("parse.failures")
+        client.failures.append({"key": key, "url": f"{API_URL}/v2/flights/searchFlights", "error": f"Respuesta no parseable: {e!r}"})
+        if progress is not None:
+            progress.update(1)
+        return None
+    flight_info["window"] = key
+    count("rows.flights", len(flight_info))
+    if refresh is not None and flight_json is not None:
+        refresh.record("flights", key, depart_date, flight_info, fetched_at=cached_at) # Con la caché, la antigüedad es la de la descarga original
+    if history is not None and flight_json is not None and cached_at is None: # Una respuesta de la caché ya se observó al descargarla
+        history.record_flights(flight_info, observed_at, origin=origin_data[0]) # Ruta "origen-destino": cada origen tiene su serie
+    if progress is not None:
+        progress.update(1)
+    if sink is not None:
+        if flight_json is not None: # Las ventanas fallidas no se marcan como hechas, así se reintentan al reanudar
+            sink.write(flight_info, key)
+        return None
+    return flight_info
 
-async def main(token, origin_data, destinations_data, adult_n, children_n):
+@profiled("flightfunc.main")
+async def main(token, origin_data, destinations_data, adult_n, children_n, max_concurrency=10, rate=5, cache=None, sink=None, parse_executor=None, failures=None, refresh=None, dates=None, shard=None, history=None):
     """
     Función principal que coordina la búsqueda de vuelos para múltiples destinos y compila los resultados en un DataFrame.
 
+    Cada combinación (destino, ventana de fechas) se lanza como una tarea independiente, limitada por un semáforo
+    de `max_concurrency` consultas en vuelo y por un token bucket de `rate` consultas por segundo. Las consultas
+    se reintentan con backoff y las que fallan definitivamente se informan al final sin detener la ejecución.
+    Un destino repetido en `destinations_data` sólo se consulta una vez.
+
     Parámetros:
     token (str): Token de autenticación para acceder a la API.
     origin_data (tuple): Tupla que contiene el skyId y el JSON de la ciudad de origen.
     destinations_data (list): Lista de tuplas, cada una conteniendo el skyId y el JSON de una ciudad de destino.
     adult_n (int): Número de adultos para el vuelo.
     children_n (int): Número de niños para el vuelo.
+    max_concurrency (int): Número máximo de consultas simultáneas a la API.
+    rate (float): Número máximo de consultas por segundo (cuota de la API).
+    cache (cachefunc.ResponseCache, optional): Caché persistente de respuestas; las consultas repetidas no gastan cuota.
+    sink (sinkfunc.ParquetSink, optional): Salida incremental. Cada ventana se escribe a disco al parsearse y
+                                           las ventanas ya completadas en ejecuciones anteriores se saltan.
+    parse_executor (concurrent.futures.Executor, optional): Pool donde se parsean las respuestas (p. ej. un ProcessPoolExecutor).
+    failures (list, optional): Lista donde se añaden las consultas fallidas ({"key", "url", "error"}).
+    refresh (refreshfunc.Refresher, optional): Modo incremental: sólo se consultan las ventanas caducadas según el
+                                               manifiesto, y el resultado se combina después con `refresh.merge`.
+    dates (dict | list, optional): Bloques de fechas del plan de búsqueda (ver `planfunc.date_windows`);
+                                   por defecto ventanas de 9 noches en julio y agosto de 2025.
+    shard (tuple, optional): (índice, total) para quedarse sólo con una parte del plan (ver `planfunc.shard_jobs`).
+    history (historyfunc.PriceHistory, optional): Histórico de precios donde se añaden los vuelos de cada ventana consultada.
 
     Retorna:
-    pandas.DataFrame: Un DataFrame que contiene información sobre todos los vuelos encontrados para los destinos especificados.
+    pandas.DataFrame: Un DataFrame que contiene información sobre todos los vuelos encontrados para los destinos especificados
+                      (en modo incremental, sólo las ventanas consultadas). Si se usa `sink`, devuelve la ruta de la carpeta de salida.
     """
-    og_data = origin_data
-    months = [7, 8]
+    if sink is not None and sink.schema is None:
+        sink.schema = sink_schema("flights") # Esquema fijo: el primer lote puede no tener vuelos de vuelta o tener pocas categorías
+    if refresh is not None:
+        refresh.start("flights") # `refresh.merge` sólo sustituye las ventanas de esta ejecución
+    observed_at = time.time() # Todas las ventanas de esta ejecución cuentan como una misma observación en el histórico
+    spec = {"origins": [origin_data], "destinations": destinations_data, "dates": dates, "party": {"adults": adult_n, "children": children_n}}
+
+    def pending(client):
+        jobs = plan(spec) # El orden destino -> fecha se mantiene en el resultado final
+        if shard is not None:
+            jobs = shard_jobs(jobs, *shard)
+        seen = set()
+        for job in jobs:
+            if job_key(job) in seen: # Destino repetido en la lista: la misma consulta sólo se hace una vez
+                client.duplicate()
+                continue
+            seen.add(job_key(job))
+            if sink is not None and sink.done(job_key(job)): # Reanudación: se saltan las ventanas ya guardadas
+                continue
+            if refresh is not None and not refresh.due("flights", job_key(job), job.check_in): # Modo incremental: sólo las ventanas caducadas
+                continue
+            yield job
     
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for d_data in destinations_data:
-            task = all_month_flights(token, session, og_data, d_data, months, adult_n, children_n)
-            tasks.append(task)
-        
-        df_list = await asyncio.gather(*tasks)
+    try:
+        async with aiohttp.ClientSession() as session:
+            client = ApiClient(session, max_concurrency, rate, cache=cache)
+            with tqdm() as progress: # Sin total: contarlo recorrería el plan (y el manifiesto) dos veces
+                coros = (window_flights(token, client, job.origin, job.destination, str(job.check_in), str(job.check_out),
+                                        job.party["adults"], job.party["children"], progress, sink, parse_executor, refresh, history, observed_at)
+                         for job in pending(client)) # Generador: el plan no se materializa, se consume a medida que hay hueco
+                df_list = await run_bounded(coros, max_concurrency)
+        client.report()
+        if failures is not None:
+            failures.extend(client.failures)
+    finally:
+        if sink is not None:
+            sink.close() # Aunque la ejecución falle, lo ya escrito queda confirmado para reanudar
+
+    if sink is not None:
+        return sink.path
 
+    df_list = [df for df in df_list if df is not None] # Ventanas cuya respuesta no se pudo parsear
+    if not df_list: # Nada caducado en modo incremental
+        return pd.DataFrame(columns=FLIGHT_COLUMNS + ["window"])
     final_df = pd.concat(df_list, ignore_index=True)
     return final_df
@@ -0,0 +1,307 @@
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from storefunc import DIAS, detect_kind
+
+DAY = 24 * 3600
+
+
+def _day(timestamp):
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp)) # Igual que date(observed_at, 'unixepoch') en SQLite
+
+
+def _values(series):
+    """
+    Convierte una columna a una lista de valores de Python para SQLite (los nulos de pandas pasan a None).
+    """
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _dates(series):
+    return _values(pd.to_datetime(series).dt.strftime("%Y-%m-%d"))
+
+
+class PriceHistory:
+    """
+    Histórico de precios de solo inserción (SQLite): cada scrape añade sus precios con el instante en que
+    se observaron, en lugar de sobrescribir los CSV, para poder ver cómo se mueven con el tiempo.
+
+    Los vuelos se guardan por (ruta, fechas de ida y vuelta, observed_at) y los hoteles por
+    (hotel, fechas de entrada y salida, observed_at). Los índices incluyen el precio, así que las consultas
+    de evolución (`trend`, `window_history`, `hotel_history`) se resuelven sólo con el índice, sin leer
+    la tabla. Además se precalculan por día de observación los agregados que el EDA hacía con groupby:
+    número de ofertas, precio mínimo, mediano y medio por aerolínea (o tipo de alojamiento) y día de la
+    semana de la salida (o de la entrada).
+
+    Se pasa como `history` a `flightfunc.main` y `hotelfunc.main`.
+
+    Args:
+        path (str): Ruta del fichero SQLite del histórico.
+    """
+
+    def __init__(self, path="../datos/history.sqlite"):
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS flight_prices (
+                route TEXT NOT NULL,
+                depart_date TEXT NOT NULL,
+                return_date TEXT NOT NULL,
+                observed_at REAL NOT NULL,
+                carrier TEXT,
+                stops INTEGER,
+                duration INTEGER,
+                price REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS flight_prices_trend ON flight_prices (route, observed_at, price);
+            CREATE INDEX IF NOT EXISTS flight_prices_window ON flight_prices (route, depart_date, return_date, observed_at, price);
+
+            CREATE TABLE IF NOT EXISTS hotel_prices (
+                hotel_id INTEGER,
+                city TEXT NOT NULL,
+                date_in TEXT NOT NULL,
+                date_out TEXT NOT NULL,
+                observed_at REAL NOT NULL,
+                acc_type TEXT,
+                rating REAL,
+                price REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS hotel_prices_trend ON hotel_prices (city, observed_at, price);
+            CREATE INDEX IF NOT EXISTS hotel_prices_hotel ON hotel_prices (hotel_id, date_in, date_out, observed_at, price);
+
+            CREATE TABLE IF NOT EXISTS rollups (
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                day TEXT NOT NULL,
+                category TEXT NOT NULL,
+                weekday INTEGER NOT NULL,
+                offers INTEGER NOT NULL,
+                min_price REAL NOT NULL,
+                median_price REAL NOT NULL,
+                mean_price REAL NOT NULL,
+                PRIMARY KEY (source, key, day, category, weekday)
+            ) WITHOUT ROWID;
+
+            -- (source, key, día) con precios nuevos cuyos agregados hay que recalcular. Se escribe en la misma
+            -- transacción que los precios, así otra instancia puede recalcularlos si ésta no llega a cerrarse.
+            CREATE TABLE IF NOT EXISTS rollups_dirty (
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                day TEXT NOT NULL,
+                PRIMARY KEY (source, key, day)
+            ) WITHOUT ROWID;
+            """)
+        self.conn.commit()
+
+    def record_flights(self, df, observed_at=None, origin=None):
+        """
+        Añade al histórico los vuelos de un scrape (salida de `flightfunc.main` o de una ventana).
+
+        Args:
+            df (pd.DataFrame): Vuelos con las columnas de `flightfunc.FLIGHT_COLUMNS`.
+            observed_at (float, optional): Instante de la observación (timestamp); por defecto ahora.
+            origin (str, optional): Origen, que se antepone al destino en la ruta ("origen-destino").
+
+        Returns:
+            int: Filas añadidas.
+        """
+        df = df[df["price"].notna()]
+        if not len(df):
+            return 0
+        observed_at = time.time() if observed_at is None else observed_at
+        routes = df["destination"].astype(str)
+        if origin is not None:
+            routes = origin + "-" + routes
+        rows = list(zip(_values(routes), _dates(df["departure_go"]), _dates(df["departure_back"]), [observed_at] * len(df),
+                        _values(df["carrier_go"]), _values(df["stops_go"]), _values(df["duration_go"]), _values(df["price"].astype(float))))
+        with self.lock:
+            self.conn.executemany("INSERT INTO flight_prices VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.executemany("INSERT OR IGNORE INTO rollups_dirty VALUES ('flights', ?, ?)", [(route, _day(observed_at)) for route in set(routes)])
+            self.conn.commit()
+        return len(rows)
+
+    def record_hotels(self, df, observed_at=None):
+        """
+        Añade al histórico los hoteles de un scrape (salida de `hotelfunc.main` o de `extract_hotel_batch`).
+
+        Args:
+            df (pd.DataFrame | list): Hoteles con `city`, `date_in`, `date_out`, `acc_type`, `rating`, `price` y, si lo hay, `hotel_id`.
+            observed_at (float, optional): Instante de la observación (timestamp); por defecto ahora.
+
+        Returns:
+            int: Filas añadidas.
+        """
+        if isinstance(df, list):
+            if not df:
+                return 0
+            df = pd.concat(df, ignore_index=True)
+        df = df[df["price"].notna() & df["city"].notna()]
+        if not len(df):
+            return 0
+        observed_at = time.time() if observed_at is None else observed_at
+        cities = df["city"].astype(str)
+        hotel_ids = _values(df["hotel_id"]) if "hotel_id" in df.columns else [None] * len(df) # Los CSV de datos/ no tienen hotel_id
+        rows = list(zip(hotel_ids, _values(cities), _dates(df["date_in"]), _dates(df["date_out"]), [observed_at] * len(df),
+                        _values(df["acc_type"]), _values(df["rating"].astype(float)), _values(df["price"].astype(float))))
+        with self.lock:
+            self.conn.executemany("INSERT INTO hotel_prices VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.executemany("INSERT OR IGNORE INTO rollups_dirty VALUES ('hotels', ?, ?)", [(city, _day(observed_at)) for city in set(cities)])
+            self.conn.commit()
+        return len(rows)
+
+    def ingest(self, path, observed_at=None, origin=None):
+        """
+        Añade al histórico un CSV, Parquet o Feather de `datos/` (p. ej. para cargar los scrapes anteriores).
+
+        Args:
+            path (str): Fichero de vuelos o de alojamientos.
+            observed_at (float, optional): Instante de la observación; por defecto la fecha de modificación del fichero.
+            origin (str, optional): Origen de los vuelos, para que la ruta coincida con la de los scrapes ("origen-destino").
+
+        Returns:
+            int: Filas añadidas.
+        """
+        observed_at = os.path.getmtime(path) if observed_at is None else observed_at
+        df = pd.read_csv(path, index_col=0) if path.endswith(".csv") else pd.read_parquet(path) if path.endswith(".parquet") else pd.read_feather(path)
+        if detect_kind(df) == "flights":
+            return self.record_flights(df, observed_at, origin=origin)
+        return self.record_hotels(df, observed_at)
+
+    def update_rollups(self):
+        """
+        Recalcula los agregados de los días de observación con precios nuevos.
+
+        Sólo se leen (por índice) los precios de esos días, así que el coste no depende del tamaño del histórico.
+        Los días pendientes se guardan en la tabla `rollups_dirty`, por lo que también se recalculan los que
+        dejó otra instancia (o un proceso que terminó sin `close`). Se llama solo antes de `rollups` y al cerrar.
+        """
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE") # Lectura, recálculo y borrado de pendientes en una transacción: otro proceso no cuela precios en medio
+            try:
+                dirty = self.conn.execute("SELECT source, key, day FROM rollups_dirty ORDER BY source, key, day").fetchall()
+                for source, key, day in dirty:
+                    start = pd.Timestamp(day, tz="UTC").timestamp()
+                    if source == "flights":
+                        query = "SELECT carrier AS category, depart_date AS date, price FROM flight_prices WHERE route = ? AND observed_at >= ? AND observed_at < ?"
+                    else:
+                        query = "SELECT acc_type AS category, date_in AS date, price FROM hotel_prices WHERE city = ? AND observed_at >= ? AND observed_at < ?"
+                    prices = pd.read_sql_query(query, self.conn, params=(key, start, start + DAY))
+                    prices["category"] = prices["category"].fillna("")
+                    prices["weekday"] = pd.to_datetime(prices["date"]).dt.dayofweek
+                    stats = prices.groupby(["category", "weekday"])["price"].agg(["count", "min", "median", "mean"]).reset_index()
+                    self.conn.execute("DELETE FROM rollups WHERE source = ? AND key = ? AND day = ?", (source, key, day))
+                    self.conn.executemany("INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                          [(source, key, day, category, int(weekday), int(offers), low, median, mean)
+                                           for category, weekday, offers, low, median, mean in stats.itertuples(index=False)])
+                    self.conn.execute("DELETE FROM rollups_dirty WHERE source = ? AND key = ? AND day = ?", (source, key, day))
+                self.conn.commit()
+            except BaseException: # Sin rollback la conexión se quedaría con la transacción (y el bloqueo de escritura) abierta
+                self.conn.rollback()
+                raise
+
+    def rollups(self, source="flights", key=None, day=None):
+        """
+        Agregados precalculados por aerolínea (o tipo de alojamiento) y día de la semana.
+
+        Args:
+            source (str): "flights" o "hotels".
+            key (str, optional): Ruta (vuelos) o ciudad (hoteles); por defecto todas.
+            day (str, optional): Día de observación "YYYY-MM-DD"; por defecto el último de cada ruta o ciudad.
+
+        Returns:
+            pd.DataFrame: key, day, category, weekday (Lunes...Domingo), offers, min_price, median_price y mean_price.
+        """
+        self.update_rollups()
+        query = "SELECT key, day, category, weekday, offers, min_price, median_price, mean_price FROM rollups r WHERE source = ?"
+        params = [source]
+        if key is not None:
+            query += " AND key = ?"
+            params.append(key)
+        if day is not None:
+            query += " AND day = ?"
+            params.append(day)
+        else:
+            query += " AND day = (SELECT MAX(day) FROM rollups WHERE source = r.source AND key = r.key)"
+        with self.lock:
+            df = pd.read_sql_query(query + " ORDER BY key, day, category, weekday", self.conn, params=params)
+        df["weekday"] = pd.Categorical.from_codes(df["weekday"].values.astype(np.int8), categories=DIAS, ordered=True)
+        return df
+
+    def trend(self, key, days=30, source="flights", now=None):
+        """
+        Evolución diaria del precio de una ruta (o de los hoteles de una ciudad) en los últimos `days` días.
+
+        Se resuelve con un rango sobre el índice (ruta, observed_at, price), sin recorrer el histórico.
+
+        Args:
+            key (str): Ruta (vuelos) o ciudad (hoteles).
+            days (int): Días hacia atrás desde `now`.
+            source (str): "flights" o "hotels".
+            now (float, optional): Instante de referencia (timestamp); por defecto ahora.
+
+        Returns:
+            pd.DataFrame: Por día de observación: offers, min_price y mean_price.
+        """
+        now = time.time() if now is None else now
+        table, column = ("flight_prices", "route") if source == "flights" else ("hotel_prices", "city")
+        with self.lock:
+            return pd.read_sql_query(f"""
+                SELECT date(observed_at, 'unixepoch') AS day, COUNT(*) AS offers, MIN(price) AS min_price, AVG(price) AS mean_price
+                FROM {table} WHERE {column} = ? AND observed_at >= ?
+                GROUP BY day ORDER BY day""", self.conn, params=(key, now - days * DAY))
+
+    def window_history(self, route, depart_date, return_date):
+        """
+        Precio mínimo y medio de una ventana de vuelos concreta en cada observación.
+
+        Args:
+            route (str): Ruta (destino, u "origen-destino" si se guardó con `origin`).
+            depart_date (str | date): Fecha de ida.
+            return_date (str | date): Fecha de vuelta.
+
+        Returns:
+            pd.DataFrame: observed_at (datetime), offers, min_price y mean_price.
+        """
+        with self.lock:
+            df = pd.read_sql_query("""
+                SELECT observed_at, COUNT(*) AS offers, MIN(price) AS min_price, AVG(price) AS mean_price
+                FROM flight_prices WHERE route = ? AND depart_date = ? AND return_date = ?
+                GROUP BY observed_at ORDER BY observed_at""", self.conn, params=(route, str(depart_date)[:10], str(return_date)[:10]))
+        df["observed_at"] = pd.to_datetime(df["observed_at"], unit="s")
+        return df
+
+    def hotel_history(self, hotel_id, date_in=None, date_out=None):
+        """
+        Precios de un hotel en cada observación, para todas sus fechas o para una estancia concreta.
+
+        Args:
+            hotel_id (int): ID del hotel en Booking.com.
+            date_in (str | date, optional): Fecha de entrada.
+            date_out (str | date, optional): Fecha de salida (con `date_in`).
+
+        Returns:
+            pd.DataFrame: date_in, date_out, observed_at (datetime) y price.
+        """
+        query = "SELECT date_in, date_out, observed_at, price FROM hotel_prices WHERE hotel_id = ?"
+        params = [int(hotel_id)]
+        if date_in is not None:
+            query += " AND date_in = ? AND date_out = ?"
+            params += [str(date_in)[:10], str(date_out)[:10]]
+        with self.lock:
+            df = pd.read_sql_query(query + " ORDER BY date_in, date_out, observed_at", self.conn, params=params)
+        df["observed_at"] = pd.to_datetime(df["observed_at"], unit="s")
+        return df
+
+    def close(self):
+        self.update_rollups()
+        with self.lock:
+            self.conn.close()
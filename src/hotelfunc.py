@@ -1,25 +1,42 @@
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
-from calendar import monthrange
 import aiohttp
 import asyncio
 import random as rand
 import os
-import requests
+import time
+from httpfunc import ApiClient, run_bounded, fetch_json_sync
+from metricsfunc import count, timed, profiled
+from planfunc import plan, job_key, shard_jobs
+from storefunc import DIAS, sink_schema
 
-def get_location_ids(destinations, api_key):
+API_URL = "https://booking-com.p.rapidapi.com/v1" # Se puede sobrescribir para apuntar a un servidor local (benchmarks)
+
+# Columna de salida -> campo de cada hotel en los `result` de Booking.com
+HOTEL_FIELDS = {
+    "hotel_id": "hotel_id",
+    "hotel_name": "hotel_name",
+    "price": "min_total_price",
+    "rating": "review_score",
+    "distance_from_center": "distance_to_cc",
+    "acc_type": "accommodation_type_name",
+    "city": "city_trans",
+}
+
+def get_location_ids(destinations, api_key, cache=None):
     """
     Obtiene los IDs de los destinos a partir de la API de Booking.com.
 
     Args:
         destinations (list): Lista de nombres de destinos a buscar.
         api_key (str): La clave de API para autenticar las solicitudes.
+        cache (cachefunc.ResponseCache, optional): Caché persistente de respuestas.
 
     Returns:
         list: Lista de IDs de destinos obtenidos de la API.
     """
-    url_loc = "https://booking-com.p.rapidapi.com/v1/hotels/locations"
+    url_loc = f"{API_URL}/hotels/locations"
     
     headers = {
         "x-rapidapi-key": api_key,
@@ -30,15 +47,16 @@ def get_location_ids(destinations, api_key):
     
     for loc in destinations:
         querystring = {"locale": "es", "name": loc}
-        response = requests.get(url_loc, headers=headers, params=querystring)
+        status, data = fetch_json_sync(url_loc, headers, querystring, cache, validate=bool, memoize=True)
         
-        if response.status_code == 200:
-            loc_ids.append(response.json()[0]["dest_id"])
+        if status == 200:
+            loc_ids.append(data[0]["dest_id"])
         else:
-            print(f"Error al obtener ID para {loc}: {response.status_code}")
+            print(f"Error al obtener ID para {loc}: {status}")
     
     return loc_ids
 
+@timed()
 def extract_hotel_info(hotel_data):
     """
     Extrae información relevante de los datos de hoteles.
@@ -47,125 +65,297 @@ def extract_hotel_info(hotel_data):
         hotel_data (list): Lista de diccionarios con datos de hoteles.
 
     Returns:
-        pd.DataFrame: DataFrame con la información extraída de los hoteles, incluyendo nombre, precio,
+        pd.DataFrame: DataFrame con la información extraída de los hoteles, incluyendo id, nombre, precio,
                       calificación, distancia del centro, tipo de alojamiento y ciudad.
     """
-    result = dict(hotel_name=[], price=[], rating=[], distance_from_center=[], acc_type=[], city=[])
-
-    for hotel in hotel_data:
-        hotel_name = hotel.get("hotel_name", np.nan)
-        price = hotel.get("min_total_price", np.nan)
-        rating = hotel.get("review_score", np.nan)
-        distance_from_center = hotel.get("distance_to_cc", np.nan)
-        acc_type = hotel.get("accommodation_type_name", np.nan)
-        city = hotel.get("city_trans", np.nan)
-
-        result["hotel_name"].append(hotel_name)
-        result["price"].append(price)
-        result["rating"].append(rating)
-        result["distance_from_center"].append(distance_from_center)
-        result["acc_type"].append(acc_type)
-        result["city"].append(city)
-
+    result = {column: [hotel.get(field, np.nan) for hotel in hotel_data] for column, field in HOTEL_FIELDS.items()}
     df_hotel = pd.DataFrame(result)
     return df_hotel
 
-async def extract_hotel_info_loc(session, loc_id, children_ages, adult_n, room_n, trip_duration, year, token):
+@timed()
+def extract_hotel_batch(batches):
+    """
+    Extrae en un único DataFrame tipado los hoteles de muchas búsquedas (fechas de entrada) a la vez.
+
+    Cada columna se construye de una pasada sobre todos los hoteles, y las fechas, los días de la semana
+    y la ventana se repiten por bloques con numpy en lugar de asignarse búsqueda a búsqueda.
+
+    Args:
+        batches (list): Tuplas (hoteles, fecha de entrada, fecha de salida, clave de la ventana), donde
+                        `hoteles` es la lista `result` de Booking.com de esa búsqueda.
+
+    Returns:
+        pd.DataFrame: Columnas de `extract_hotel_info` más `date_in`, `date_out`, `day_in`, `day_out` y `window`,
+                      con los tipos de `storefunc.DTYPES["hotels"]`.
+    """
+    hotels = [hotel for batch in batches for hotel in batch[0]]
+    sizes = [len(batch[0]) for batch in batches]
+    columns = {column: [hotel.get(field) for hotel in hotels] for column, field in HOTEL_FIELDS.items()}
+
+    df_hotel = pd.DataFrame({
+        "hotel_id": pd.to_numeric(pd.Series(columns["hotel_id"], dtype=object), errors="coerce").astype("Int64"),
+        "hotel_name": pd.Categorical(columns["hotel_name"]),
+        "price": pd.to_numeric(pd.Series(columns["price"], dtype=object), errors="coerce").astype("float32"),
+        "rating": pd.to_numeric(pd.Series(columns["rating"], dtype=object), errors="coerce").astype("float32"),
+        "distance_from_center": pd.to_numeric(pd.Series(columns["distance_from_center"], dtype=object), errors="coerce").astype("float32"),
+        "acc_type": pd.Categorical(columns["acc_type"]),
+        "city": pd.Categorical(columns["city"]),
+    })
+    for side, position in (("in", 1), ("out", 2)):
+        dates = np.array([batch[position] for batch in batches], dtype="datetime64[D]").astype("datetime64[ns]")
+        df_hotel[f"date_{side}"] = np.repeat(dates, sizes)
+    for side in ("in", "out"):
+        weekdays = df_hotel[f"date_{side}"].dt.dayofweek.values # 0 = lunes, igual que el orden de DIAS
+        df_hotel[f"day_{side}"] = pd.Categorical.from_codes(weekdays, categories=DIAS, ordered=True)
+    df_hotel["window"] = pd.Categorical(np.repeat(np.array([batch[3] for batch in batches], dtype=object), sizes))
+    return df_hotel
+
+async def fetch_hotel_pages(client, url, headers, querystring, key, max_pages=10, batch_pages=3):
+    """
+    Descarga todas las páginas de resultados de una búsqueda de hoteles.
+
+    Primero se pide sólo la página 0: si ya trae los `count` resultados de la búsqueda (lo habitual) no se
+    gasta más cuota. Si no, con `count` y el tamaño de la primera página se piden a la vez exactamente las
+    páginas que faltan, hasta `max_pages`. Si la respuesta no trae `count`, las páginas se piden en tandas
+    concurrentes de `batch_pages` hasta que una llega vacía. Los hoteles repetidos entre páginas se
+    eliminan por `hotel_id`.
+
+    Args:
+        client (httpfunc.ApiClient): Cliente HTTP asíncrono con reintentos, límites de tasa y caché.
+        url (str): URL del endpoint de búsqueda.
+        headers (dict): Cabeceras de la petición.
+        querystring (dict): Parámetros de la búsqueda, sin `page_number`.
+        key (str): Identificador de la búsqueda para el informe de fallos.
+        max_pages (int): Número máximo de páginas a pedir.
+        batch_pages (int): Número de páginas que se piden a la vez cuando la respuesta no trae `count`.
+
+    Returns:
+        tuple: (lista de hoteles sin duplicados, True si todas las páginas pedidas se han descargado bien,
+                instante de la descarga original si todas las páginas salen de la caché persistente o None si alguna es nueva).
+    """
+    hotels = {}
+    complete = True
+    cached = [] # `cached_at` de cada página descargada bien
+
+    async def fetch(pages): # Las páginas de Booking.com empiezan en 0
+        nonlocal complete
+        responses = await asyncio.gather(*[
+            client.get_json(url, headers, {**querystring, "page_number": page}, key=f"{key}|p{page}", validate=lambda r: "result" in r, with_cached_at=True)
+            for page in pages
+        ])
+        datas = [data for data, _ in responses]
+        cached.extend(cached_at for data, cached_at in responses if data is not None)
+        last_page = False
+        for data in datas:
+            if data is None:
+                complete = False
+                continue
+            if not data["result"]: # Página vacía: no hay más resultados
+                last_page = True
+                continue
+            for hotel in data["result"]:
+                hotels.setdefault(hotel.get("hotel_id", id(hotel)), hotel)
+        return datas, last_page
+
+    def result():
+        cached_at = min(cached) if cached and None not in cached else None
+        return list(hotels.values()), complete, cached_at
+
+    (first,), last_page = await fetch([0])
+    if first is None or last_page:
+        return result()
+
+    total, page_size = first.get("count"), len(first["result"])
+    if total is not None:
+        if page_size < total: # Faltan páginas: se piden todas las que quedan de una vez
+            await fetch(range(1, min(max_pages, -(-int(total) // page_size))))
+        return result()
+
+    for start in range(1, max_pages, batch_pages): # Sin `count` no se sabe cuántas páginas hay
+        _, last_page = await fetch(range(start, min(start + batch_pages, max_pages)))
+        if last_page:
+            break
+    return result()
+
+async def extract_hotel_info_loc(client, loc_id, children_ages, adult_n, room_n, trip_duration, year, token, sink=None, max_pages=10, refresh=None, dates=None, shard=None, batch_windows=32, history=None, observed_at=None, seen=None):
     """
     Realiza una búsqueda de hoteles en una ubicación específica y extrae la información relevante.
 
+    Las fechas de entrada salen de un plan de búsqueda perezoso y se consultan en paralelo hasta el límite
+    de concurrencia de `client`; para cada una se recorren todas las páginas de resultados hasta `max_pages`.
+
     Args:
-        session (aiohttp.ClientSession): Sesión HTTP asíncrona para realizar las solicitudes.
+        client (httpfunc.ApiClient): Cliente HTTP asíncrono con reintentos, límites de tasa y caché.
         loc_id (str): ID del destino para la búsqueda de hoteles.
-        children_ages (str): Edades de los niños como una cadena separada por comas.
+        children_ages (str): Edades de los niños como una cadena separada por comas (vacía si no hay niños).
         adult_n (int): Número de adultos en la búsqueda.
         room_n (int): Número de habitaciones en la búsqueda.
         trip_duration (int): Duración del viaje en días.
         year (int): Año en el que se realizará el viaje.
         token (str): La clave de API para autenticar las solicitudes.
+        sink (sinkfunc.ParquetSink, optional): Salida incremental; cada tanda de fechas se escribe a disco
+                                               en lugar de acumularse, y las fechas ya completadas se saltan.
+        max_pages (int): Número máximo de páginas de resultados por fecha de entrada.
+        refresh (refreshfunc.Refresher, optional): Modo incremental: sólo se consultan las fechas caducadas según el manifiesto.
+        dates (dict | list, optional): Bloques de fechas del plan (ver `planfunc.date_windows`); por defecto
+                                       estancias de `trip_duration` días dentro de julio y agosto de `year`.
+        shard (tuple, optional): (índice, total) para quedarse sólo con una parte del plan.
+        batch_windows (int): Fechas de entrada que se acumulan antes de convertirlas a un DataFrame con `extract_hotel_batch`.
+        history (historyfunc.PriceHistory, optional): Histórico de precios donde se añaden los hoteles encontrados.
+        observed_at (float, optional): Instante de la observación en el histórico; por defecto ahora.
+        seen (set, optional): Claves ya planificadas en esta ejecución, compartidas entre ubicaciones: una fecha
+                              de una ubicación repetida (o de bloques de fechas solapados) sólo se consulta una vez.
 
     Returns:
-        list: Lista de DataFrames con la información de hoteles para cada día de la búsqueda.
+        list: Lista de DataFrames con la información de hoteles, uno por cada tanda de `batch_windows` fechas (vacía si
+              se usa `sink`). Cada fila lleva la clave de su búsqueda (`planfunc.job_key`:
+              "loc_id|entrada|salida|adults=N,children=M,rooms=R") en la columna `window`.
     """
-    url = "https://booking-com.p.rapidapi.com/v1/hotels/search"
+    url = f"{API_URL}/hotels/search"
     headers = {
         "x-rapidapi-key": token,
         "x-rapidapi-host": "booking-com.p.rapidapi.com"
     }
 
+    ages = [age.strip() for age in str(children_ages or "").split(",") if age.strip()]
+    windows = [] # Búsquedas descargadas y aún sin convertir: (hoteles, entrada, salida, clave)
+    cached = {} # Clave -> instante de la descarga original, para las búsquedas servidas por la caché
     list_df_hotel = []
-    page = 1
-
-    for month in tqdm(range(7, 9)):
-        day_in = 1
-        day_out = day_in + trip_duration - 1
-
-        while day_out <= monthrange(year, month)[1]:
-            date_in = pd.to_datetime(f"{year}-{month}-{day_in}").date()
-            date_out = pd.to_datetime(f"{year}-{month}-{day_out}").date()
-
-            querystring = {
-                "children_ages": children_ages,
-                "page_number": page,
-                "adults_number": adult_n,
-                "children_number": len(children_ages.split(',')),
-                "room_number": room_n,
-                "include_adjacency": "true",
-                "units": "metric",
-                "categories_filter_ids": "class::3,class::4,class::5",
-                "checkout_date": str(date_out),
-                "dest_id": loc_id,
-                "filter_by_currency": "EUR",
-                "dest_type": "city",
-                "checkin_date": str(date_in),
-                "order_by": "popularity",
-                "locale": "en-gb"
-            }
-
-            async with session.get(url, headers=headers, params=querystring) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    hotel_info = extract_hotel_info(data["result"])
-
-                    dias = ["Lunes", "Martes", "Miercoles", "Jueves", "Viernes", "Sabado", "Domingo"]
-
-                    hotel_info["date_in"] = date_in
-                    hotel_info["date_out"] = date_out
-                    hotel_info["day_in"] = dias[date_in.weekday()-1]
-                    hotel_info["day_out"] = dias[date_out.weekday()-1]
-
-                    list_df_hotel.append(hotel_info)
-                else:
-                    print(response.status)
-            day_in += 1
-            day_out = day_in + trip_duration - 1
+
+    def flush():
+        if not windows:
+            return
+        hotel_info = extract_hotel_batch(windows)
+        count("rows.hotels", len(hotel_info))
+        if refresh is not None:
+            by_window = dict(list(hotel_info.groupby("window", observed=True)))
+            for _, date_in, _, key in windows: # Las fechas sin hoteles también se apuntan, con un DataFrame vacío
+                refresh.record("hotels", key, date_in, by_window.get(key, hotel_info.iloc[:0]), fetched_at=cached.get(key))
+        if history is not None: # Las búsquedas de la caché ya se observaron al descargarlas
+            history.record_hotels(hotel_info[~hotel_info["window"].isin(list(cached))], observed_at)
+        if sink is not None:
+            sink.write(hotel_info, [key for *_, key in windows])
+        elif len(hotel_info):
+            list_df_hotel.append(hotel_info)
+        windows.clear()
+        cached.clear()
+
+    async def search_dates(date_in, date_out, key):
+        querystring = {
+            "adults_number": adult_n,
+            "children_number": len(ages),
+            "room_number": room_n,
+            "include_adjacency": "true",
+            "units": "metric",
+            "categories_filter_ids": "class::3,class::4,class::5",
+            "checkout_date": str(date_out),
+            "dest_id": loc_id,
+            "filter_by_currency": "EUR",
+            "dest_type": "city",
+            "checkin_date": str(date_in),
+            "order_by": "popularity",
+            "locale": "en-gb"
+        }
+        if ages: # Sin niños no se manda `children_ages` (vacío, la API contaría un niño sin edad)
+            querystring["children_ages"] = ",".join(ages)
+
+        hotels, complete, cached_at = await fetch_hotel_pages(client, url, headers, querystring, key, max_pages)
+        if not complete and (not hotels or sink is not None or refresh is not None): # Si falta alguna página no se marca como hecha, así se repite al reanudar
+            return
+        # Una búsqueda completa sin hoteles también cuenta como hecha: así no se vuelve a consultar en cada ejecución
+        windows.append((hotels, date_in, date_out, key))
+        if cached_at is not None:
+            cached[key] = cached_at
+        if len(windows) >= batch_windows:
+            flush()
+
+    if dates is None:
+        dates = {"year": year, "months": [7, 8], "nights": trip_duration - 1}
+    # El grupo entra en la clave de cada fecha: otro grupo para el mismo destino y fechas es otra búsqueda
+    jobs = plan({"destinations": [loc_id], "dates": dates, "party": {"adults": adult_n, "children": len(ages), "rooms": room_n}})
+    if shard is not None:
+        jobs = shard_jobs(jobs, *shard)
+
+    seen = set() if seen is None else seen
+
+    def searches():
+        for job in jobs:
+            key = job_key(job)
+            if key in seen: # Consulta repetida en el plan: se cuenta como ahorrada y no se lanza
+                client.duplicate()
+                continue
+            seen.add(key)
+            if (sink is None or not sink.done(key)) and (refresh is None or refresh.due("hotels", key, job.check_in)): # Se saltan las fechas ya guardadas o aún frescas
+                yield search_dates(job.check_in, job.check_out, key)
+
+    await run_bounded(searches(), client.limiter.max_concurrency)
+    flush()
     return list_df_hotel
 
-async def main(loc_ids, token):
+@profiled("hotelfunc.main")
+async def main(loc_ids, token, cache=None, sink=None, max_concurrency=10, rate=5, failures=None, max_pages=10, refresh=None, dates=None, party=None, shard=None, history=None):
     """
     Función principal para coordinar la búsqueda de hoteles en múltiples ubicaciones.
 
     Args:
         loc_ids (list): Lista de IDs de destinos para buscar hoteles.
         token (str): La clave de API para autenticar las solicitudes.
+        cache (cachefunc.ResponseCache, optional): Caché persistente de respuestas.
+        sink (sinkfunc.ParquetSink, optional): Salida incremental con reanudación por fecha de entrada.
+        max_concurrency (int): Número máximo de consultas simultáneas a la API.
+        rate (float): Número máximo de consultas por segundo (cuota de la API).
+        failures (list, optional): Lista donde se añaden las consultas fallidas ({"key", "url", "error"}).
+        max_pages (int): Número máximo de páginas de resultados por ubicación y fecha de entrada.
+        refresh (refreshfunc.Refresher, optional): Modo incremental: sólo se consultan las fechas caducadas según el
+                                                   manifiesto, y el resultado se combina después con `refresh.merge`.
+        dates (dict | list, optional): Bloques de fechas del plan de búsqueda (ver `planfunc.date_windows`);
+                                       por defecto estancias de 10 días en julio y agosto de 2025.
+        party (dict, optional): Grupo de viajeros: "adults", "children" (número de niños, con edades al azar pero
+                                fijas para cada grupo), "children_ages" (texto "5,8", tiene prioridad sobre
+                                "children") y "rooms".
+                                Por defecto 2 adultos, 1 niño y 1 habitación.
+        shard (tuple, optional): (índice, total) para quedarse sólo con una parte del plan (ver `planfunc.shard_jobs`).
+        history (historyfunc.PriceHistory, optional): Histórico de precios donde se añaden los hoteles de cada fecha consultada.
 
     Returns:
-        list: Lista de DataFrames con información de hoteles para todas las ubicaciones.
+        list: Lista de DataFrames con información de hoteles para todas las ubicaciones (en modo incremental, sólo las fechas consultadas).
+              Si se usa `sink`, devuelve la ruta de la carpeta de salida.
     """
-    children_n = 1
-    children_ages = ",".join(rand.choices([str(a) for a in range(1, 11)], k=children_n))
-    adult_n = 2
-    room_n = 1
+    if sink is not None and sink.schema is None:
+        sink.schema = sink_schema("hotels") # Esquema fijo: cada tanda de fechas tiene un número distinto de categorías
+    if refresh is not None:
+        refresh.start("hotels") # `refresh.merge` sólo sustituye las fechas de esta ejecución
+    party = {"adults": 2, "children": 1, "rooms": 1, **(party or {})}
+    children_n = party["children"]
+    # Las edades forman parte de la consulta (y de su clave en la caché): se sortean con una semilla sacada del grupo,
+    # así todas las ejecuciones y todas las partes del runner piden lo mismo
+    seed = f"{party['adults']}|{children_n}|{party['rooms']}"
+    children_ages = party.get("children_ages") or ",".join(rand.Random(seed).choices([str(a) for a in range(1, 11)], k=children_n))
+    adult_n = party["adults"]
+    room_n = party["rooms"]
     trip_duration = 10
+    observed_at = time.time() # Todas las fechas de esta ejecución cuentan como una misma observación en el histórico
     year = 2025 
 
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for loc_id in tqdm(loc_ids):
-            task = extract_hotel_info_loc(session, loc_id, children_ages, adult_n, room_n, trip_duration, year, token)
-            tasks.append(task)
-        results = await asyncio.gather(*tasks)
+    try:
+        async with aiohttp.ClientSession() as session:
+            client = ApiClient(session, max_concurrency, rate, cache=cache)
+            tasks = []
+            seen = set() # Claves lanzadas en esta ejecución: un loc_id repetido no duplica filas ni escrituras en `sink`
+            for loc_id in tqdm(loc_ids):
+                task = extract_hotel_info_loc(client, loc_id, children_ages, adult_n, room_n, trip_duration, year, token, sink, max_pages, refresh, dates, shard, history=history, observed_at=observed_at, seen=seen)
+                tasks.append(task)
+            results = await asyncio.gather(*tasks)
+        client.report()
+        if failures is not None:
+            failures.extend(client.failures)
+    finally:
+        if sink is not None:
+            sink.close() # Aunque la ejecución falle, lo ya escrito queda confirmado para reanudar
+
+    if sink is not None:
+        return sink.path
 
-        final_df = [item for sublist in results for item in sublist]
+    final_df = [item for sublist in results for item in sublist]
 
-        return final_df
+    return final_df
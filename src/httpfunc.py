@@ -0,0 +1,397 @@
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+
+from cachefunc import cache_key
+from metricsfunc import count, timer
+
+
+class TokenBucket:
+    """
+    Limitador de tasa tipo "token bucket" para repartir las llamadas a la API en el tiempo.
+
+    Args:
+        rate (float): Número de peticiones por segundo que se reponen en el cubo.
+        capacity (int): Número máximo de peticiones que se pueden lanzar de golpe.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """
+        Espera hasta que haya un token disponible y lo consume.
+        """
+        async with self.lock: # Un solo "waiter" a la vez, así el orden de llegada se respeta
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+async def run_bounded(coros, max_concurrency=10):
+    """
+    Ejecuta corrutinas con un límite de concurrencia.
+
+    `max_concurrency` workers van sacando corrutinas de `coros` a medida que terminan la anterior, así que
+    `coros` puede ser un generador perezoso: nunca hay más de `max_concurrency` corrutinas creadas a la vez.
+    Si una corrutina lanza una excepción se cancelan las que están en vuelo, no se empieza ninguna más y la
+    excepción se propaga cuando todas han terminado (así el `finally` de quien llama ya no tiene tareas vivas).
+
+    Args:
+        coros (iterable): Corrutinas a ejecutar (lista o generador).
+        max_concurrency (int): Número máximo de corrutinas en vuelo a la vez.
+
+    Returns:
+        list: Resultados en el mismo orden que las corrutinas de entrada.
+    """
+    pending = enumerate(coros) # Iterador compartido: en asyncio no hay carreras entre dos `next`
+    results = {}
+
+    async def worker():
+        for index, coro in pending:
+            results[index] = await coro
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(max_concurrency)]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers: # Tras el primer error (o una cancelación) el resto de workers no debe seguir sacando corrutinas
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    return [results[index] for index in range(len(results))] # Mismo orden que la entrada
+
+
+class CircuitBreaker:
+    """
+    Cortocircuito por host: tras `threshold` fallos seguidos deja de enviar peticiones durante `cooldown` segundos.
+
+    Pasado ese tiempo se deja pasar una sola petición de prueba (semiabierto) y el resto sigue esperando:
+    si la prueba va bien el circuito se cierra y si falla se vuelve a abrir otros `cooldown` segundos. Si la
+    prueba no informa de su resultado en `cooldown` segundos (p. ej. se cancela) se deja pasar otra.
+
+    Args:
+        threshold (int): Fallos consecutivos que abren el circuito.
+        cooldown (float): Segundos que el circuito permanece abierto.
+        poll (float): Segundos entre comprobaciones de quien espera a que termine la prueba.
+    """
+
+    def __init__(self, threshold=5, cooldown=30, poll=1.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.poll = poll
+        self.failures = 0
+        self.opened_at = None
+        self.probe_at = None # Instante en que salió la petición de prueba del estado semiabierto
+
+    def wait_time(self):
+        """
+        Segundos que hay que esperar antes de volver a preguntar (0 si se puede enviar la petición ya).
+
+        En el estado semiabierto sólo la primera llamada recibe 0: esa petición es la prueba.
+        """
+        if self.opened_at is None:
+            return 0
+        now = time.monotonic()
+        remaining = self.opened_at + self.cooldown - now
+        if remaining > 0:
+            return remaining
+        if self.probe_at is None or now - self.probe_at >= self.cooldown: # Sin prueba en vuelo (o perdida)
+            self.probe_at = now
+            return 0
+        return min(self.poll, self.cooldown)
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold or self.probe_at is not None: # La prueba ha fallado: se vuelve a abrir
+            self.opened_at = time.monotonic()
+            self.probe_at = None
+
+
+class AdaptiveLimiter:
+    """
+    Límite de concurrencia que se reduce a la mitad al recibir un 429 y crece de uno en uno con las respuestas correctas (AIMD).
+
+    Args:
+        max_concurrency (int): Límite máximo (y de partida) de peticiones en vuelo.
+        min_concurrency (int): Límite mínimo al que se puede reducir.
+    """
+
+    def __init__(self, max_concurrency=10, min_concurrency=1):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def __aexit__(self, *exc):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def throttled(self):
+        self.limit = max(self.min_concurrency, self.limit // 2)
+        self.successes = 0
+
+    def succeeded(self):
+        self.successes += 1
+        if self.successes >= self.limit and self.limit < self.max_concurrency: # Una subida por cada "ventana" completa sin 429
+            self.limit += 1
+            self.successes = 0
+
+
+def retry_after(headers):
+    """
+    Interpreta la cabecera Retry-After (segundos o fecha HTTP).
+
+    Args:
+        headers (Mapping): Cabeceras de la respuesta.
+
+    Returns:
+        float | None: Segundos a esperar, o None si no viene la cabecera o no se entiende.
+    """
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class ApiClient:
+    """
+    Capa común de peticiones asíncronas para las APIs de RapidAPI.
+
+    Sobre una `aiohttp.ClientSession` añade caché opcional, token bucket, concurrencia adaptativa que
+    se reduce cuando aparecen 429, reintentos con backoff exponencial con jitter (respetando Retry-After)
+    y un cortocircuito por host. Las peticiones que fallan tras agotar los reintentos no lanzan excepción:
+    devuelven None y quedan registradas en `failures` para informar al final de la ejecución.
+
+    Las peticiones idénticas (misma URL y parámetros) que coinciden en el tiempo se agrupan ("single-flight"):
+    sólo la primera llega a la API y el resto espera su resultado. Con `memoize` también se reutilizan las
+    respuestas ya recibidas durante la vida del cliente. Todas las llamadas agrupadas reciben el mismo objeto
+    JSON, así que no se debe modificar. `coalesced` cuenta las llamadas ahorradas, también las consultas
+    repetidas del plan que los scrapers se saltan antes de llegar al cliente (ver `duplicate`).
+
+    Args:
+        session (aiohttp.ClientSession): Sesión HTTP asíncrona compartida.
+        max_concurrency (int): Número máximo de peticiones en vuelo.
+        rate (float, optional): Peticiones por segundo permitidas por la cuota de la API.
+        retries (int): Reintentos por petición tras el primer intento.
+        base_delay (float): Espera base del backoff en segundos.
+        max_delay (float): Espera máxima entre reintentos en segundos.
+        cache (cachefunc.ResponseCache, optional): Caché persistente de respuestas.
+        memoize (bool): Reutilizar también las respuestas correctas ya recibidas, no sólo las que están en vuelo.
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, session, max_concurrency=10, rate=None, retries=4, base_delay=0.5, max_delay=30, cache=None, memoize=False):
+        self.session = session
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.bucket = TokenBucket(rate) if rate else None
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.cache = cache
+        self.breakers = {}
+        self.failures = []
+        self.memoize = memoize
+        self.inflight = {} # Clave de la petición -> tarea en curso (o terminada, con `memoize`)
+        self.coalesced = 0
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)) # "Full jitter"
+
+    async def get_json(self, url, headers, params, key=None, validate=None, with_cached_at=False):
+        """
+        Hace un GET y devuelve el JSON, reintentando los errores transitorios.
+
+        Args:
+            url (str): URL del endpoint.
+            headers (dict): Cabeceras de la petición.
+            params (dict): Parámetros de la query.
+            key (str, optional): Identificador legible de la petición para el informe de fallos.
+            validate (callable, optional): Función que indica si el JSON es válido; si no lo es se reintenta.
+            with_cached_at (bool): Devolver también de dónde sale la respuesta, para no contar una respuesta
+                                   de la caché como una observación nueva (histórico, manifiesto).
+
+        Returns:
+            dict | list | None: JSON de la respuesta, o None si ha fallado tras todos los reintentos. Con
+                                `with_cached_at`, una tupla (JSON, cached_at) donde `cached_at` es el instante de la
+                                descarga original si la respuesta sale de la caché persistente, o None si es nueva.
+        """
+        request_key = cache_key(url, params)
+        task = self.inflight.get(request_key)
+        if task is not None:
+            self.duplicate()
+            data, cached_at = await asyncio.shield(task) # Si se cancela quien espera, la petición sigue para el resto
+            return (data, cached_at) if with_cached_at else data
+
+        task = asyncio.ensure_future(self._get_json(url, headers, params, key, validate))
+        self.inflight[request_key] = task
+        try:
+            data, cached_at = await asyncio.shield(task)
+        finally:
+            ok = task.done() and not task.cancelled() and task.exception() is None and task.result()[0] is not None
+            if not (self.memoize and ok): # Con `memoize` sólo se guardan las respuestas correctas
+                self.inflight.pop(request_key, None)
+        return (data, cached_at) if with_cached_at else data
+
+    def duplicate(self):
+        """
+        Cuenta una llamada repetida que se resuelve sin ir a la API (agrupada en vuelo o saltada en el plan).
+        """
+        self.coalesced += 1
+        count("http.coalesced")
+
+    async def _get_json(self, url, headers, params, key=None, validate=None):
+        if self.cache is not None:
+            data, fetched_at = self.cache.get(url, params, with_time=True)
+            if data is not None:
+                count("http.cache_hits")
+                return data, fetched_at
+
+        host = urlsplit(url).netloc
+        breaker = self.breakers.setdefault(host, CircuitBreaker())
+        error = None
+        for attempt in range(self.retries + 1):
+            while wait := breaker.wait_time(): # Con el circuito semiabierto sólo pasa la prueba; el resto vuelve a preguntar
+                await asyncio.sleep(wait)
+            delay = None
+            count("http.requests")
+            if attempt:
+                count("http.retries")
+            try:
+                async with self.limiter:
+                    if self.bucket is not None:
+                        await self.bucket.acquire()
+                    # Sólo el viaje de ida y vuelta: las esperas del semáforo, del token bucket y del backoff quedan fuera
+                    with timer(f"http.request.{host}"):
+                        async with self.session.get(url, headers=headers, params=params) as response:
+                            status = response.status
+                            if status == 200:
+                                body = await response.read()
+                                count("http.bytes", len(body))
+                                data = json.loads(body)
+                            elif status in self.RETRY_STATUS:
+                                delay = retry_after(response.headers)
+                    if status != 200 and status not in self.RETRY_STATUS:
+                        breaker.success() # El host responde; el error es de la petición, no se reintenta
+                        error = f"HTTP {status}"
+                        break
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                status = None
+                error = repr(e)
+                breaker.failure()
+            else:
+                if status == 200:
+                    if validate is None or validate(data):
+                        breaker.success()
+                        self.limiter.succeeded()
+                        if self.cache is not None:
+                            self.cache.set(url, params, data)
+                        return data, None
+                    breaker.success() # El host responde; lo que falla es el contenido
+                    error = f"Respuesta no válida: {str(data)[:200]}"
+                else:
+                    error = f"HTTP {status}"
+                    breaker.failure()
+                    if status == 429:
+                        self.limiter.throttled()
+            if attempt < self.retries:
+                await asyncio.sleep(delay if delay is not None else self._backoff(attempt))
+
+        count("http.failures")
+        self.failures.append({"key": key or url, "url": url, "error": error})
+        return None, None
+
+    def report(self):
+        """
+        Imprime un resumen de las peticiones agrupadas y de las que han fallado.
+        """
+        if self.coalesced:
+            print(f"{self.coalesced} peticiones repetidas resueltas sin llamar a la API")
+        if not self.failures:
+            return
+        print(f"{len(self.failures)} peticiones fallidas:")
+        for failure in self.failures:
+            print(f"  {failure['key']}: {failure['error']}")
+
+
+SYNC_MEMO = {} # Respuestas de `fetch_json_sync(..., memoize=True)` ya obtenidas en este proceso
+
+
+def fetch_json_sync(url, headers, params, cache=None, validate=None, memoize=False):
+    """
+    Versión síncrona (requests) de `ApiClient.get_json`, para las consultas sueltas de IDs.
+
+    Args:
+        url (str): URL del endpoint.
+        headers (dict): Cabeceras de la petición.
+        params (dict): Parámetros de la query.
+        cache (cachefunc.ResponseCache, optional): Caché de respuestas.
+        validate (callable, optional): Función que indica si un JSON es válido para guardarlo en caché.
+        memoize (bool): Reutilizar las respuestas válidas ya obtenidas en este proceso (para datos que no
+                        cambian, como los IDs de ciudades, que los notebooks piden una vez por ciudad).
+
+    Returns:
+        tuple: (código de estado HTTP, JSON de la respuesta o None si no es 200).
+    """
+    request_key = cache_key(url, params)
+    if memoize and request_key in SYNC_MEMO:
+        count("http.coalesced")
+        return 200, SYNC_MEMO[request_key]
+
+    if cache is not None:
+        data = cache.get(url, params)
+        if data is not None:
+            count("http.cache_hits")
+            return 200, data
+
+    with timer(f"http.request.{urlsplit(url).netloc}"):
+        response = requests.get(url, headers=headers, params=params)
+    count("http.requests")
+    count("http.bytes", len(response.content))
+    status = response.status_code
+    data = response.json() if status == 200 else None
+
+    if status == 200 and (validate is None or validate(data)):
+        if cache is not None:
+            cache.set(url, params, data)
+        if memoize:
+            SYNC_MEMO[request_key] = data
+    return status, data
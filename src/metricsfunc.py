@@ -0,0 +1,229 @@
+import asyncio
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_ENV = "SCRAPER_PROFILE" # "cprofile" o "pyinstrument"
+PROFILE_DIR_ENV = "SCRAPER_PROFILE_DIR"
+METRICS_ENV = "SCRAPER_METRICS" # Ruta .json o .prom donde exportar las métricas al final de cada main
+MAX_SAMPLES = 10_000 # Muestras guardadas por temporizador para calcular percentiles
+
+
+class Metrics:
+    """
+    Registro de métricas en memoria: temporizadores por etapa y contadores.
+
+    Es seguro usarlo desde varios hilos. Las funciones que se ejecutan en un ProcessPoolExecutor
+    registran en el proceso hijo, así que sus tiempos no aparecen en el proceso principal.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Borra todas las métricas registradas.
+        """
+        with self.lock:
+            self.timers = {}
+            self.counters = {}
+
+    def observe(self, name, seconds):
+        """
+        Registra una duración para el temporizador `name`.
+        """
+        with self.lock:
+            timer = self.timers.setdefault(name, {"count": 0, "total": 0.0, "min": float("inf"), "max": 0.0, "samples": []})
+            timer["count"] += 1
+            timer["total"] += seconds
+            timer["min"] = min(timer["min"], seconds)
+            timer["max"] = max(timer["max"], seconds)
+            if len(timer["samples"]) < MAX_SAMPLES:
+                timer["samples"].append(seconds)
+
+    def count(self, name, value=1):
+        """
+        Suma `value` al contador `name`.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        """
+        Resumen de las métricas.
+
+        Returns:
+            dict: {"timers": {nombre: {count, total_s, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}}, "counters": {...}}
+        """
+        with self.lock:
+            timers = {}
+            for name, timer in self.timers.items():
+                samples = sorted(timer["samples"])
+                pct = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+                timers[name] = {
+                    "count": timer["count"],
+                    "total_s": timer["total"],
+                    "mean_ms": timer["total"] / timer["count"] * 1000,
+                    "p50_ms": pct(0.50),
+                    "p90_ms": pct(0.90),
+                    "p99_ms": pct(0.99),
+                    "max_ms": timer["max"] * 1000,
+                }
+            return {"timers": timers, "counters": dict(self.counters)}
+
+    def to_prometheus(self):
+        """
+        Métricas en formato de texto de Prometheus.
+
+        Returns:
+            str: Texto listo para el textfile collector de node_exporter.
+        """
+        summary = self.summary()
+        lines = [
+            "# TYPE scraper_stage_seconds summary",
+        ]
+        for name, timer in summary["timers"].items():
+            for q, key in (("0.5", "p50_ms"), ("0.9", "p90_ms"), ("0.99", "p99_ms")):
+                lines.append(f'scraper_stage_seconds{{stage="{name}",quantile="{q}"}} {timer[key] / 1000:.6f}')
+            lines.append(f'scraper_stage_seconds_sum{{stage="{name}"}} {timer["total_s"]:.6f}')
+            lines.append(f'scraper_stage_seconds_count{{stage="{name}"}} {timer["count"]}')
+        lines.append("# TYPE scraper_events_total counter")
+        for name, value in summary["counters"].items():
+            lines.append(f'scraper_events_total{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """
+        Guarda las métricas en `path`: Prometheus si acaba en .prom, JSON en otro caso.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.summary(), f, indent=2)
+
+
+METRICS = Metrics()
+
+
+def count(name, value=1):
+    """
+    Suma `value` al contador `name` del registro global.
+    """
+    METRICS.count(name, value)
+
+
+@contextmanager
+def timer(name):
+    """
+    Context manager que mide la duración del bloque en el temporizador `name`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICS.observe(name, time.perf_counter() - start)
+
+
+def timed(name=None):
+    """
+    Decorador que mide cada llamada a la función (síncrona o asíncrona).
+
+    Args:
+        name (str, optional): Nombre del temporizador; por defecto "modulo.funcion".
+    """
+    def decorator(func):
+        label = name or f"{func.__module__}.{func.__name__}"
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timer(label):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profile(name):
+    """
+    Perfila el bloque si la variable de entorno SCRAPER_PROFILE está definida.
+
+    Con "cprofile" guarda `<name>.prof` (se abre con snakeviz o pstats); con "pyinstrument"
+    guarda `<name>.html`. Los ficheros van a SCRAPER_PROFILE_DIR (por defecto `profiles/`).
+    """
+    mode = os.environ.get(PROFILE_ENV, "").lower()
+    if not mode:
+        yield
+        return
+    out_dir = os.environ.get(PROFILE_DIR_ENV, "profiles")
+    os.makedirs(out_dir, exist_ok=True)
+    if mode == "pyinstrument":
+        from pyinstrument import Profiler # Dependencia opcional, sólo se necesita al activar este modo
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(os.path.join(out_dir, f"{name}.html"), "w") as f:
+                f.write(profiler.output_html())
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(out_dir, f"{name}.prof"))
+
+
+def profiled(name):
+    """
+    Decorador para los `main`: mide la ejecución completa, la perfila si SCRAPER_PROFILE está
+    definida y al terminar exporta las métricas a SCRAPER_METRICS.
+
+    Args:
+        name (str): Nombre del temporizador y del fichero de perfil.
+    """
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                try:
+                    with profile(name), timer(name):
+                        return await func(*args, **kwargs)
+                finally:
+                    export_from_env()
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                with profile(name), timer(name):
+                    return func(*args, **kwargs)
+            finally:
+                export_from_env()
+        return wrapper
+    return decorator
+
+
+def export_from_env():
+    """
+    Exporta las métricas a la ruta de SCRAPER_METRICS, si está definida.
+    """
+    path = os.environ.get(METRICS_ENV)
+    if path:
+        METRICS.export(path)
@@ -0,0 +1,134 @@
+import json
+import zlib
+from calendar import monthrange
+from collections import namedtuple
+from datetime import date, timedelta
+
+import pandas as pd
+
+# Una consulta del plan: origen, destino, fechas de entrada/salida y composición del grupo
+Job = namedtuple("Job", ["origin", "destination", "check_in", "check_out", "party"])
+
+# Rejilla por defecto de los scrapers: 9 noches dentro de julio y agosto de 2025
+DEFAULT_DATES = {"year": 2025, "months": [7, 8], "nights": 9}
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def date_windows(dates=None):
+    """
+    Genera de forma perezosa las ventanas (entrada, salida) descritas por uno o varios bloques de fechas.
+
+    Cada bloque es un diccionario con:
+        - "year" y "months": las ventanas se generan dentro de cada mes (la salida no pasa al mes siguiente), o
+        - "start" y "end": las ventanas se generan entre esas dos fechas (incluidas).
+        - "nights": noches de estancia, un entero o una lista.
+        - "weekdays" (opcional): días de la semana permitidos para la entrada (0 = lunes ... 6 = domingo).
+        - "days" (opcional): días del mes permitidos para la entrada, p. ej. [1, 15].
+
+    Args:
+        dates (dict | list, optional): Bloque o lista de bloques; por defecto `DEFAULT_DATES`.
+
+    Yields:
+        tuple: (check_in, check_out) como `datetime.date`, ordenadas por entrada y luego por noches.
+    """
+    for block in _as_list(DEFAULT_DATES if dates is None else dates):
+        nights = _as_list(block["nights"])
+        weekdays = block.get("weekdays")
+        days = block.get("days")
+        if "months" in block:
+            year = block["year"]
+            ranges = [(date(year, month, 1), date(year, month, monthrange(year, month)[1])) for month in block["months"]]
+        else:
+            ranges = [(pd.Timestamp(block["start"]).date(), pd.Timestamp(block["end"]).date())]
+
+        for first, last in ranges:
+            check_in = first
+            while check_in <= last:
+                if (weekdays is None or check_in.weekday() in weekdays) and (days is None or check_in.day in days):
+                    for n in nights:
+                        check_out = check_in + timedelta(days=n)
+                        if check_out <= last:
+                            yield check_in, check_out
+                check_in += timedelta(days=1)
+
+
+def plan(spec):
+    """
+    Genera de forma perezosa las consultas de un plan de búsqueda declarativo.
+
+    Nunca construye la lista completa: se pueden describir búsquedas de un año entero y muchas ciudades
+    y los scrapers van consumiendo las consultas a medida que tienen hueco.
+
+    Args:
+        spec (dict): Plan con las claves
+            - "destinations" (list): Destinos (skyId + JSON para vuelos, dest_id para hoteles, slug de Civitatis...).
+            - "origins" (list, optional): Orígenes; por defecto uno solo, None.
+            - "dates" (dict | list, optional): Bloques de fechas de `date_windows`.
+            - "party" (dict | list, optional): Grupo o grupos de viajeros, p. ej. {"adults": 2, "children": 2}.
+
+    Yields:
+        Job: Consultas ordenadas por origen, destino, grupo y fechas.
+    """
+    for origin in spec.get("origins", [None]):
+        for destination in spec["destinations"]:
+            for party in _as_list(spec.get("party", {})):
+                for check_in, check_out in date_windows(spec.get("dates")):
+                    yield Job(origin, destination, check_in, check_out, party)
+
+
+def _key_part(value):
+    return value[0] if isinstance(value, tuple) else value # (skyId, JSON) -> skyId
+
+
+def job_key(job):
+    """
+    Clave estable de una consulta, la misma que usan los scrapers para reanudar, para el manifiesto del modo
+    incremental y para repartir el plan.
+
+    Incluye todo lo que define la búsqueda: "origen|destino|entrada|salida|grupo". El origen se omite si es None
+    y el grupo si está vacío, así las consultas sin origen ni grupo (actividades) quedan como "destino|entrada|salida".
+    Si el origen o el destino son una tupla (skyId, JSON) se usa sólo el skyId.
+    """
+    parts = [] if job.origin is None else [_key_part(job.origin)]
+    parts += [_key_part(job.destination), job.check_in, job.check_out]
+    if job.party:
+        parts.append(",".join(f"{name}={value}" for name, value in sorted(job.party.items())))
+    return "|".join(str(part) for part in parts)
+
+
+def shard_jobs(jobs, index, count, key=job_key):
+    """
+    Se queda con la parte `index` de `count` de un plan, repartiendo por hash de la clave de cada consulta.
+
+    El reparto no depende del orden ni del número de consultas, así que cada worker puede generar el
+    plan completo por su cuenta y quedarse sólo con lo suyo.
+
+    Args:
+        jobs (iterable): Consultas del plan.
+        index (int): Parte a devolver, de 0 a `count` - 1.
+        count (int): Número total de partes.
+        key (callable): Función que da la clave de reparto de una consulta.
+
+    Yields:
+        Job: Consultas de la parte `index`.
+    """
+    for job in jobs:
+        if zlib.crc32(key(job).encode()) % count == index:
+            yield job
+
+
+def load_spec(path):
+    """
+    Lee un plan de búsqueda desde un fichero JSON.
+
+    Args:
+        path (str): Ruta del fichero.
+
+    Returns:
+        dict: Plan para `plan`.
+    """
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+def content_hash(df):
+    """
+    Hash del contenido de un DataFrame que no depende del orden de las filas.
+
+    La API no siempre devuelve los resultados en el mismo orden, así que se hashea cada fila y
+    se ordenan los hashes antes de combinarlos.
+
+    Args:
+        df (pd.DataFrame): Datos de una ventana.
+
+    Returns:
+        str: Hash SHA-1 en hexadecimal.
+    """
+    rows = pd.util.hash_pandas_object(df.reindex(sorted(df.columns), axis=1), index=False).values
+    return hashlib.sha1(np.sort(rows).tobytes()).hexdigest()
+
+
+class Refresher:
+    """
+    Modo de refresco incremental: decide qué ventanas de fechas hay que volver a consultar y guarda un
+    manifiesto (SQLite) con la fecha de la última consulta y el hash del contenido de cada una.
+
+    Una ventana se vuelve a consultar si no está en el manifiesto, si su última consulta tiene más de
+    `max_age` segundos, o si sale en menos de `near_days` días y su última consulta tiene más de
+    `near_max_age` segundos (cerca de la salida es cuando más se mueven los precios). Las ventanas que
+    fallan no se apuntan, así que siguen pendientes en la siguiente ejecución.
+
+    Se pasa como `refresh` a `flightfunc.main` y `hotelfunc.main`, que devuelven sólo las ventanas
+    consultadas; `merge` las combina con el dataset existente.
+
+    Args:
+        path (str): Ruta del fichero SQLite del manifiesto.
+        max_age (float): Antigüedad máxima en segundos de una ventana lejana a la salida.
+        near_days (int): Días antes de la salida a partir de los cuales se usa `near_max_age`.
+        near_max_age (float): Antigüedad máxima en segundos de una ventana cercana a la salida.
+    """
+
+    def __init__(self, path="../datos/manifest.sqlite", max_age=7 * 24 * 3600, near_days=14, near_max_age=24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self.near_days = near_days
+        self.near_max_age = near_max_age
+        self.lock = threading.Lock()
+        self.refreshed = {} # Origen -> ventanas consultadas en la ejecución en curso de ese origen
+        self.changed = {} # Origen -> ventanas cuyo contenido ha cambiado respecto a la consulta anterior
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS manifest (
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                depart_date TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                changed_at REAL NOT NULL,
+                hash TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                PRIMARY KEY (source, key)
+            )""")
+        self.conn.commit()
+
+    def start(self, source):
+        """
+        Empieza una ejecución de un origen: olvida las ventanas apuntadas en ejecuciones anteriores.
+
+        Lo llaman `flightfunc.main` y `hotelfunc.main` al empezar, así `merge` sólo sustituye las ventanas
+        de la última ejecución aunque se reutilice el mismo `Refresher`.
+
+        Args:
+            source (str): Origen de los datos ("flights" o "hotels").
+        """
+        with self.lock:
+            self.refreshed[source] = set()
+            self.changed[source] = set()
+
+    def due(self, source, key, depart_date, now=None):
+        """
+        Indica si una ventana hay que volver a consultarla.
+
+        Args:
+            source (str): Origen de los datos ("flights" o "hotels").
+            key (str): Clave de la búsqueda (`planfunc.job_key`), la misma que se usa en `record`.
+            depart_date (str | date): Fecha de salida o de entrada de la ventana.
+            now (float, optional): Instante de referencia (timestamp); por defecto ahora.
+
+        Returns:
+            bool: True si la ventana falta en el manifiesto o está caducada.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            row = self.conn.execute("SELECT fetched_at FROM manifest WHERE source = ? AND key = ?", (source, key)).fetchone()
+        if row is None:
+            return True
+        age = now - row[0]
+        days_left = (pd.Timestamp(depart_date).date() - date.fromtimestamp(now)).days
+        if days_left < 0: # Ventanas ya pasadas: no tiene sentido volver a consultarlas
+            return False
+        max_age = self.near_max_age if days_left <= self.near_days else self.max_age
+        return age > max_age
+
+    def record(self, source, key, depart_date, df, fetched_at=None):
+        """
+        Apunta en el manifiesto una ventana consultada correctamente.
+
+        Args:
+            source (str): Origen de los datos ("flights" o "hotels").
+            key (str): Clave de la búsqueda (`planfunc.job_key`).
+            depart_date (str | date): Fecha de salida o de entrada de la ventana.
+            df (pd.DataFrame): Datos obtenidos para la ventana.
+            fetched_at (float, optional): Instante en que se descargaron los datos; por defecto ahora. Para las
+                                          respuestas servidas por la caché es el de la descarga original.
+
+        Returns:
+            bool: True si el contenido ha cambiado respecto a la consulta anterior.
+        """
+        digest = content_hash(df)
+        now = time.time() if fetched_at is None else fetched_at
+        with self.lock:
+            row = self.conn.execute("SELECT hash FROM manifest WHERE source = ? AND key = ?", (source, key)).fetchone()
+            changed = row is None or row[0] != digest
+            self.conn.execute("""
+                INSERT INTO manifest (source, key, depart_date, fetched_at, changed_at, hash, rows) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (source, key) DO UPDATE SET
+                    fetched_at = excluded.fetched_at,
+                    changed_at = CASE WHEN manifest.hash = excluded.hash THEN manifest.changed_at ELSE excluded.changed_at END,
+                    hash = excluded.hash,
+                    rows = excluded.rows""",
+                (source, key, str(depart_date), now, now, digest, len(df)))
+            self.conn.commit()
+            self.refreshed.setdefault(source, set()).add(key)
+            if changed:
+                self.changed.setdefault(source, set()).add(key)
+        return changed
+
+    def merge(self, existing, delta, source, column="window"):
+        """
+        Combina las ventanas consultadas en la última ejecución de `source` con el dataset existente.
+
+        Las filas de las ventanas consultadas se sustituyen enteras (así desaparecen también los
+        resultados que ya no ofrece la API); el resto del dataset se deja igual.
+
+        Args:
+            existing (pd.DataFrame): Dataset de ejecuciones anteriores, con la columna `column`.
+            delta (pd.DataFrame | list): Salida de `main` en modo refresco.
+            source (str): Origen de los datos ("flights" o "hotels").
+            column (str): Columna con la clave de la ventana de cada fila.
+
+        Returns:
+            pd.DataFrame: Dataset actualizado.
+        """
+        if isinstance(delta, list):
+            delta = pd.concat(delta, ignore_index=True) if delta else pd.DataFrame(columns=existing.columns)
+        if column not in existing.columns:
+            raise ValueError(f"El dataset existente no tiene la columna '{column}'; hay que regenerarlo con un scrape completo")
+        with self.lock:
+            replaced = self.refreshed.get(source, set()) | set(delta[column].unique())
+        kept = existing[~existing[column].isin(replaced)]
+        return pd.concat([kept, delta], ignore_index=True)
+
+    def summary(self):
+        """
+        Resumen del manifiesto por origen.
+
+        Returns:
+            pd.DataFrame: Ventanas, filas y consulta más antigua y más reciente de cada origen.
+        """
+        with self.lock:
+            return pd.read_sql_query("""
+                SELECT source, COUNT(*) AS windows, SUM(rows) AS rows,
+                       datetime(MIN(fetched_at), 'unixepoch') AS oldest, datetime(MAX(fetched_at), 'unixepoch') AS newest
+                FROM manifest GROUP BY source""", self.conn)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
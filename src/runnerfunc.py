@@ -0,0 +1,476 @@
+"""
+Ejecución repartida de los scrapers en varios procesos o varias máquinas.
+
+Un plan de búsqueda (ver `planfunc`) se divide en `shards` partes que se apuntan en una cola SQLite.
+Cada worker toma una parte con un "lease" (alquiler con caducidad que va renovando mientras trabaja),
+la ejecuta con el `main` del scraper escribiendo en su propia carpeta Parquet y la marca como hecha.
+Si un worker muere, su lease caduca y otro worker retoma la parte; como cada parte escribe con
+`sinkfunc.ParquetSink`, se reanuda desde las ventanas ya guardadas. Al final `compact` junta las
+salidas de todas las partes en un único Parquet.
+
+Para varias máquinas basta con que todas vean la misma carpeta (la cola SQLite y las salidas) y
+lancen `worker`. Los tokens se leen de la variable de entorno `rapidapi_token` (o del `.env`).
+
+Uso:
+    python src/runnerfunc.py submit --scraper flights --spec plan.json --shards 16 --run julio
+    python src/runnerfunc.py worker                     # en cada proceso / máquina
+    python src/runnerfunc.py compact --run julio --scraper flights
+    python src/runnerfunc.py run --scraper hotels --spec plan.json --shards 8 --processes 4   # todo en local
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import dotenv
+import pyarrow.parquet as pq
+
+import activityfunc
+import flightfunc
+import hotelfunc
+from cachefunc import ResponseCache
+from sinkfunc import ParquetSink
+from storefunc import sink_schema, to_table
+
+SCRAPERS = ("flights", "hotels", "activities")
+
+
+class LeaseLost(RuntimeError):
+    """
+    El worker ha perdido el lease de la parte (caducó y otro worker la ha tomado): debe dejar de escribir en ella.
+    """
+
+
+class LeasedSink(ParquetSink):
+    """
+    `ParquetSink` de una parte que deja de escribir en cuanto el worker pierde su lease.
+
+    Con el lease perdido, `done` y `write` lanzan `LeaseLost` (así el scraper se detiene) y al cerrar se
+    descarta la parte abierta sin tocar `_done.json`, que ahora escribe el nuevo dueño de la carpeta.
+
+    Args:
+        path (str): Carpeta de salida de la parte.
+        lost (threading.Event): Se activa cuando el heartbeat no consigue renovar el lease.
+    """
+
+    def __init__(self, path, lost, **kwargs):
+        self.lost = lost
+        super().__init__(path, **kwargs)
+
+    def _check(self):
+        if self.lost.is_set():
+            raise LeaseLost(f"Lease perdido: {self.path} tiene otro dueño")
+
+    def done(self, key):
+        self._check()
+        return super().done(key)
+
+    def write(self, df, key=None):
+        self._check()
+        super().write(df, key)
+
+    def _roll(self):
+        if not self.lost.is_set():
+            return super()._roll()
+        if self.writer is not None: # La parte abierta no se confirma: sus ventanas las repite el nuevo dueño
+            self.writer.close()
+            os.remove(self.tmp_path)
+            self.writer = None
+            self.tmp_path = None
+        self.batches = 0
+        self.pending = []
+
+
+class JobQueue:
+    """
+    Cola de partes de un plan en SQLite, compartida por todos los workers.
+
+    Una parte pasa por los estados pending -> running -> done (o failed si agota los intentos).
+    Una parte "running" cuyo lease ha caducado se considera abandonada y se puede volver a tomar, salvo
+    que ya haya agotado sus intentos (p. ej. porque tumba al worker cada vez): entonces pasa a failed.
+
+    Args:
+        path (str): Ruta del fichero SQLite.
+        max_attempts (int): Intentos por parte antes de marcarla como fallida.
+    """
+
+    def __init__(self, path="../datos/runner/queue.sqlite", max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False) # Transacciones explícitas
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS shards (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run TEXT NOT NULL,
+                scraper TEXT NOT NULL,
+                spec TEXT NOT NULL,
+                shard_index INTEGER NOT NULL,
+                shard_count INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                output TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_shards_status ON shards (status, lease_until)")
+
+    def submit(self, scraper, spec, shards, run=None):
+        """
+        Apunta un plan dividido en `shards` partes.
+
+        Args:
+            scraper (str): "flights", "hotels" o "activities".
+            spec (dict): Plan del scraper (ver `run_shard`).
+            shards (int): Número de partes.
+            run (str, optional): Nombre de la ejecución; por defecto uno aleatorio.
+
+        Returns:
+            str: Nombre de la ejecución.
+        """
+        if scraper not in SCRAPERS:
+            raise ValueError(f"Scraper no válido: {scraper}")
+        run = run or uuid.uuid4().hex[:8]
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT INTO shards (run, scraper, spec, shard_index, shard_count, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run, scraper, json.dumps(spec), index, shards, now) for index in range(shards)])
+            self.conn.execute("COMMIT")
+        return run
+
+    def lease(self, owner, seconds=300):
+        """
+        Toma la siguiente parte pendiente (o abandonada) de forma atómica entre procesos.
+
+        Args:
+            owner (str): Identificador del worker.
+            seconds (float): Duración del lease.
+
+        Returns:
+            dict | None: Parte tomada, o None si no queda ninguna.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE") # Bloquea la escritura: dos workers no pueden tomar la misma parte
+            try:
+                self.conn.execute("""
+                    UPDATE shards SET status = 'failed', owner = NULL, lease_until = NULL, updated_at = ?,
+                                      error = 'Lease caducado en el último intento (el worker murió o se colgó)'
+                    WHERE status = 'running' AND lease_until < ? AND attempts >= ?""", (now, now, self.max_attempts))
+                row = self.conn.execute("""
+                    SELECT id, run, scraper, spec, shard_index, shard_count, attempts FROM shards
+                    WHERE status = 'pending' OR (status = 'running' AND lease_until < ? AND attempts < ?)
+                    ORDER BY id LIMIT 1""", (now, self.max_attempts)).fetchone()
+                if row is not None:
+                    self.conn.execute(
+                        "UPDATE shards SET status = 'running', owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (owner, now + seconds, now, row[0]))
+            except sqlite3.Error:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+        if row is None:
+            return None
+        keys = ["id", "run", "scraper", "spec", "shard_index", "shard_count", "attempts"]
+        job = dict(zip(keys, row))
+        job["spec"] = json.loads(job["spec"])
+        job["attempts"] += 1
+        return job
+
+    def _update(self, query, params):
+        with self.lock:
+            return self.conn.execute(query, params).rowcount > 0
+
+    def renew(self, job_id, owner, seconds=300):
+        """
+        Alarga el lease de una parte. Devuelve False si el worker ya no es su dueño.
+        """
+        now = time.time()
+        return self._update("UPDATE shards SET lease_until = ?, updated_at = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                            (now + seconds, now, job_id, owner))
+
+    def complete(self, job_id, owner, output):
+        """
+        Marca una parte como hecha y guarda la ruta de su salida.
+        """
+        return self._update("UPDATE shards SET status = 'done', output = ?, error = NULL, updated_at = ? WHERE id = ? AND owner = ?",
+                            (output, time.time(), job_id, owner))
+
+    def fail(self, job_id, owner, error):
+        """
+        Devuelve una parte a la cola tras un error, o la marca como fallida si ha agotado los intentos.
+        """
+        return self._update("""
+            UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                              owner = NULL, lease_until = NULL, error = ?, updated_at = ?
+            WHERE id = ? AND owner = ?""", (self.max_attempts, error, time.time(), job_id, owner))
+
+    def status(self, run=None):
+        """
+        Número de partes por ejecución, scraper y estado.
+
+        Returns:
+            list: Tuplas (run, scraper, status, partes).
+        """
+        query = "SELECT run, scraper, status, COUNT(*) FROM shards {} GROUP BY run, scraper, status ORDER BY run, scraper, status"
+        with self.lock:
+            if run is None:
+                return self.conn.execute(query.format("")).fetchall()
+            return self.conn.execute(query.format("WHERE run = ?"), (run,)).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def shard_dir(out_dir, run, scraper, index, count):
+    """
+    Carpeta de salida de una parte.
+    """
+    return os.path.join(out_dir, run, scraper, f"shard-{index:04}-of-{count:04}")
+
+
+def run_shard(job, out_dir, cache_path=None, lost=None, processes=1):
+    """
+    Ejecuta una parte de un plan con el `main` del scraper correspondiente.
+
+    El plan (`job["spec"]`) admite:
+        - flights: "origin" (ciudad), "destinations" (ciudades), "adults", "children", "dates", "rate".
+        - hotels: "destinations" (ciudades), "dates", "party", "rate".
+        - activities: "destinations" (slugs de Civitatis), "dates", "engine", "total_pages".
+    "rate" es la cuota por worker: con N workers a la vez la cuota total es N veces "rate".
+
+    Args:
+        job (dict): Parte devuelta por `JobQueue.lease`.
+        out_dir (str): Carpeta raíz de las salidas.
+        cache_path (str, optional): Caché de respuestas compartida entre workers.
+        lost (threading.Event, optional): Señal de lease perdido (ver `LeasedSink`).
+        processes (int): Workers que se ejecutan a la vez en esta máquina. Las CPU se reparten entre ellos para los
+                         procesos de parseo y los navegadores Chrome de las actividades.
+
+    Returns:
+        str: Carpeta Parquet con la salida de la parte.
+
+    Raises:
+        LeaseLost: Si se pierde el lease mientras se ejecuta la parte.
+        RuntimeError: Si alguna ventana ha fallado tras todos los reintentos. Lo ya guardado queda en la carpeta,
+                      así que al volver a tomar la parte sólo se repiten las ventanas que faltan.
+    """
+    spec = job["spec"]
+    failures = []
+    shard = (job["shard_index"], job["shard_count"])
+    lost = threading.Event() if lost is None else lost
+    sink = LeasedSink(shard_dir(out_dir, job["run"], job["scraper"], *shard), lost)
+    token = os.getenv("rapidapi_token")
+    if job["scraper"] != "activities" and not token:
+        raise RuntimeError("Falta la variable de entorno rapidapi_token")
+    cache = ResponseCache(cache_path) if cache_path else None
+
+    try:
+        if job["scraper"] == "flights":
+            origin = flightfunc.skyID(spec["origin"], token, cache)
+            destinations = [flightfunc.skyID(city, token, cache) for city in spec["destinations"]]
+            output = asyncio.run(flightfunc.main(token, origin, destinations, spec.get("adults", 2), spec.get("children", 0), rate=spec.get("rate", 5),
+                                                 cache=cache, sink=sink, failures=failures, dates=spec.get("dates"), shard=shard))
+        elif job["scraper"] == "hotels":
+            loc_ids = hotelfunc.get_location_ids(spec["destinations"], token, cache)
+            output = asyncio.run(hotelfunc.main(loc_ids, token, cache, sink, rate=spec.get("rate", 5), failures=failures,
+                                                dates=spec.get("dates"), party=spec.get("party"), shard=shard))
+        else:
+            # Cada worker ya es un proceso: con un pool de parseo por CPU en cada uno habría CPU² procesos
+            share = max(1, (os.cpu_count() or 1) // processes)
+            output = activityfunc.main(spec["destinations"], pool_size=share, parse_workers=share, sink=sink, engine=spec.get("engine", "http"),
+                                       dates=spec.get("dates"), total_pages=spec.get("total_pages", 2), shard=shard)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if lost.is_set(): # Las escrituras desde hilos de parseo no propagan el error: se comprueba también aquí
+        raise LeaseLost(f"Lease perdido para la parte {job['id']}")
+    if failures:
+        keys = ", ".join(str(failure["key"]) for failure in failures[:3])
+        raise RuntimeError(f"{len(failures)} consultas fallidas en la parte ({keys}...)") # El worker la devuelve a la cola con `fail`
+    return output
+
+
+def worker(queue_path="../datos/runner/queue.sqlite", out_dir="../datos/runner", cache_path=None, lease_seconds=300, owner=None, processes=1):
+    """
+    Bucle de un worker: toma partes de la cola y las ejecuta hasta que no quedan.
+
+    Mientras ejecuta una parte, un hilo renueva el lease cada tercio de `lease_seconds`. Si no lo consigue
+    (el lease caducó y otro worker tomó la parte), la parte se detiene sin escribir más y no se marca como hecha.
+
+    Args:
+        queue_path (str): Ruta de la cola SQLite.
+        out_dir (str): Carpeta raíz de las salidas.
+        cache_path (str, optional): Caché de respuestas compartida.
+        lease_seconds (float): Duración del lease de cada parte.
+        owner (str, optional): Identificador del worker; por defecto "máquina:pid".
+        processes (int): Workers que se ejecutan a la vez en esta máquina (ver `run_shard`).
+
+    Returns:
+        int: Número de partes completadas.
+    """
+    dotenv.load_dotenv()
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+    queue = JobQueue(queue_path)
+    completed = 0
+    try:
+        while True:
+            job = queue.lease(owner, lease_seconds)
+            if job is None:
+                return completed
+            print(f"[{owner}] {job['run']}/{job['scraper']} parte {job['shard_index'] + 1}/{job['shard_count']} (intento {job['attempts']})")
+
+            stop, lost = threading.Event(), threading.Event()
+            def heartbeat():
+                while not stop.wait(lease_seconds / 3):
+                    if not queue.renew(job["id"], owner, lease_seconds):
+                        lost.set()
+                        return
+            beat = threading.Thread(target=heartbeat, daemon=True)
+            beat.start()
+            try:
+                output = run_shard(job, out_dir, cache_path, lost, processes)
+            except LeaseLost:
+                print(f"[{owner}] Lease perdido para la parte {job['id']}: se deja al nuevo dueño")
+            except Exception as e:
+                queue.fail(job["id"], owner, repr(e))
+                print(f"[{owner}] Error en la parte {job['id']}: {e!r}")
+            else:
+                if queue.complete(job["id"], owner, output): # False si otro worker ya es el dueño de la parte
+                    completed += 1
+                else:
+                    print(f"[{owner}] Lease perdido para la parte {job['id']}: no se marca como hecha")
+            finally:
+                stop.set()
+                beat.join()
+    finally:
+        queue.close()
+
+
+def compact(out_dir, run, scraper, output=None):
+    """
+    Junta las salidas de todas las partes de una ejecución en un único fichero Parquet.
+
+    Se copia row group a row group, así que no hace falta cargar todo el dataset en memoria.
+
+    Args:
+        out_dir (str): Carpeta raíz de las salidas.
+        run (str): Nombre de la ejecución.
+        scraper (str): Scraper de la ejecución.
+        output (str, optional): Fichero de salida; por defecto `<out_dir>/<run>/<scraper>.parquet`.
+
+    Returns:
+        str: Ruta del fichero compactado, o None si no hay nada que compactar.
+    """
+    root = os.path.join(out_dir, run, scraper)
+    parts = sorted(os.path.join(root, shard, name)
+                   for shard in os.listdir(root) if shard.startswith("shard-")
+                   for name in os.listdir(os.path.join(root, shard)) if name.startswith("part-") and name.endswith(".parquet"))
+    if not parts:
+        return None
+
+    output = output or os.path.join(out_dir, run, f"{scraper}.parquet")
+    schema = sink_schema(scraper)
+    tmp = output + ".tmp"
+    with pq.ParquetWriter(tmp, schema) as writer:
+        for part in parts:
+            parquet = pq.ParquetFile(part)
+            for group in range(parquet.num_row_groups):
+                # Las partes antiguas pueden tener otros tipos (categorías con índices int8, columnas nulas...)
+                writer.write_table(to_table(parquet.read_row_group(group).to_pandas(), schema))
+    os.replace(tmp, output)
+    return output
+
+
+def run_local(scraper, spec, shards, processes=None, queue_path="../datos/runner/queue.sqlite", out_dir="../datos/runner", cache_path=None, run=None):
+    """
+    Ejecuta un plan repartido en `processes` procesos de esta máquina y compacta el resultado.
+
+    Args:
+        scraper (str): "flights", "hotels" o "activities".
+        spec (dict): Plan del scraper (ver `run_shard`).
+        shards (int): Número de partes.
+        processes (int, optional): Procesos worker; por defecto uno por CPU.
+        queue_path (str): Ruta de la cola SQLite.
+        out_dir (str): Carpeta raíz de las salidas.
+        cache_path (str, optional): Caché de respuestas compartida.
+        run (str, optional): Nombre de la ejecución.
+
+    Returns:
+        str: Ruta del Parquet compactado.
+    """
+    queue = JobQueue(queue_path)
+    run = queue.submit(scraper, spec, shards, run)
+    queue.close()
+
+    processes = processes or os.cpu_count()
+    workers = [multiprocessing.Process(target=worker, args=(queue_path, out_dir, cache_path), kwargs={"processes": processes}) for _ in range(processes)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    return compact(out_dir, run, scraper)
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queue", default="../datos/runner/queue.sqlite", help="Cola SQLite compartida")
+    parser.add_argument("--out", default="../datos/runner", help="Carpeta raíz de las salidas")
+    parser.add_argument("--cache", help="Caché de respuestas compartida (SQLite)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("submit", "run"):
+        command = commands.add_parser(name)
+        command.add_argument("--scraper", choices=SCRAPERS, required=True)
+        command.add_argument("--spec", required=True, help="Plan en JSON")
+        command.add_argument("--shards", type=int, required=True)
+        command.add_argument("--run", help="Nombre de la ejecución")
+        if name == "run":
+            command.add_argument("--processes", type=int)
+    command = commands.add_parser("worker")
+    command.add_argument("--lease", type=float, default=300, help="Duración del lease en segundos")
+    command.add_argument("--processes", type=int, default=1, help="Workers lanzados a la vez en esta máquina")
+    command = commands.add_parser("compact")
+    command.add_argument("--run", required=True)
+    command.add_argument("--scraper", choices=SCRAPERS, required=True)
+    command.add_argument("--output")
+    commands.add_parser("status").add_argument("--run")
+    args = parser.parse_args()
+
+    if args.command in ("submit", "run"):
+        with open(args.spec) as f:
+            spec = json.load(f)
+        if args.command == "submit":
+            queue = JobQueue(args.queue)
+            print(queue.submit(args.scraper, spec, args.shards, args.run))
+            queue.close()
+        else:
+            print(run_local(args.scraper, spec, args.shards, args.processes, args.queue, args.out, args.cache, args.run))
+    elif args.command == "worker":
+        print(f"{worker(args.queue, args.out, args.cache, args.lease, processes=args.processes)} partes completadas")
+    elif args.command == "compact":
+        print(compact(args.out, args.run, args.scraper, args.output))
+    else:
+        queue = JobQueue(args.queue)
+        for run, scraper, status, shards in queue.status(args.run):
+            print(f"{run:>10} {scraper:>10} {status:>8} {shards:>5}")
+        queue.close()
+
+
+if __name__ == "__main__":
+    cli()
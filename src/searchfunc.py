@@ -0,0 +1,267 @@
+import difflib
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# Palabras vacías en español (ya sin tildes); no aportan nada a la búsqueda
+STOPWORDS = set("""
+a al algo ante con contra cual como de del desde donde durante e el ella ellas ellos en entre era es esa ese eso esta
+este esto estos estas fue ha hay hasta la las le les lo los mas me mi muy no nos o os para pero por que se si sin
+sobre su sus te tu un una unas uno unos y ya
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    """
+    Pasa un texto a minúsculas y le quita las tildes y la diéresis ("Excursión a Győr" -> "excursion a gyor").
+    """
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def _stem(token):
+    # Plurales regulares: "excursiones" -> "excursion", "museos" -> "museo"
+    if len(token) > 4 and token.endswith("es") and token[-3] in "lnrdj":
+        return token[:-2]
+    if len(token) > 4 and token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """
+    Divide un texto en términos para el índice: sin tildes, sin palabras vacías y con los plurales reducidos.
+
+    Args:
+        text (str): Texto a dividir.
+
+    Returns:
+        list: Términos del texto, en orden y con repeticiones.
+    """
+    if text is None or (isinstance(text, float) and np.isnan(text)):
+        return []
+    return [_stem(token) for token in TOKEN_RE.findall(normalize(text)) if len(token) > 1 and token not in STOPWORDS]
+
+
+def parse_prices(prices):
+    """
+    Convierte los precios de Civitatis ("1.234,50 €", "¡Gratis!") a float, con NaN si no se pueden leer.
+
+    Args:
+        prices (pd.Series): Precios en texto o ya numéricos.
+
+    Returns:
+        np.ndarray: Precios como float.
+    """
+    if pd.api.types.is_numeric_dtype(prices):
+        return prices.to_numpy(dtype=float, na_value=np.nan)
+    cleaned = prices.astype("string").str.replace(".", "", regex=False).str.replace(",", ".", regex=False).str.replace(" €", "", regex=False).replace("¡Gratis!", "0")
+    return pd.to_numeric(cleaned, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+
+class ActivityIndex:
+    """
+    Índice de texto en memoria sobre las actividades (`Nombre` y `Descripcion`) para buscarlas sin recorrer el DataFrame.
+
+    Cada actividad es un vector TF-IDF disperso guardado como una matriz en formato CSR (términos de cada
+    actividad) y CSC (actividades de cada término, el índice invertido): sólo arrays de numpy con los
+    índices y los pesos no nulos. Una búsqueda sólo toca las listas de los términos de la consulta y
+    devuelve las actividades ordenadas por similitud coseno. El nombre cuenta el doble que la descripción.
+
+    Las actividades se identifican por `Link`. `add` se puede llamar con cada scrape nuevo: las actividades
+    ya indexadas sólo actualizan su precio y las que cambian de texto se vuelven a indexar. Los arrays se
+    reconstruyen una sola vez, en la primera consulta después de añadir.
+
+    Args:
+        df (pd.DataFrame, optional): Actividades iniciales (salida de `activityfunc.main`).
+        name_weight (int): Veces que cuenta cada término del nombre frente a uno de la descripción.
+    """
+
+    def __init__(self, df=None, name_weight=2):
+        self.name_weight = name_weight
+        self.vocab = {} # Término -> columna de la matriz
+        self.terms = [] # Columna -> término (para las búsquedas aproximadas)
+        self.positions = {} # Link -> fila de la matriz
+        self.records = {"Nombre": [], "Precio": [], "Link": [], "Descripcion": [], "Ciudad": []}
+        self.prices = []
+        self.alive = [] # Las filas de actividades reindexadas se marcan como borradas en lugar de quitarse
+        self.texts = []
+        self.chunks = [] # (filas, columnas, frecuencias) añadidos desde la última reconstrucción
+        self.doc_ids = np.zeros(0, dtype=np.int64)
+        self.term_ids = np.zeros(0, dtype=np.int64)
+        self.tf = np.zeros(0, dtype=np.float32)
+        self.dirty = True # Los arrays de consulta aún no se han construido (también con el índice vacío)
+        if df is not None:
+            self.add(df)
+
+    def __len__(self):
+        return sum(self.alive)
+
+    def add(self, df):
+        """
+        Añade o actualiza actividades en el índice.
+
+        Args:
+            df (pd.DataFrame): Actividades con `Nombre`, `Precio`, `Link` y `Descripcion` (y opcionalmente `Ciudad`).
+                               Las filas repetidas de un mismo `Link` (una por fecha) se indexan una sola vez.
+
+        Returns:
+            int: Actividades nuevas o reindexadas.
+        """
+        df = df.drop_duplicates("Link", keep="last")
+        prices = parse_prices(df["Precio"])
+        cities = df["Ciudad"] if "Ciudad" in df.columns else pd.Series([None] * len(df), index=df.index)
+        rows, columns, counts = [], [], []
+        added = 0
+        for (name, description, link, city), price in zip(zip(df["Nombre"], df["Descripcion"], df["Link"], cities), prices):
+            text = (name, description)
+            position = self.positions.get(link)
+            if position is not None:
+                old = self.prices[position]
+                if old != price and not (np.isnan(old) and np.isnan(price)):
+                    self.prices[position] = self.records["Precio"][position] = price
+                    self.dirty = True # Hay que reconstruir `price_array` para los filtros por precio
+                if self.texts[position] == text:
+                    continue
+                self.alive[position] = False # El texto ha cambiado: se indexa de nuevo como otra fila
+
+            position = len(self.alive)
+            self.positions[link] = position
+            for column, value in zip(self.records, (name, price, link, description, city)):
+                self.records[column].append(value)
+            self.prices.append(price)
+            self.alive.append(True)
+            self.texts.append(text)
+            added += 1
+
+            frequencies = Counter(tokenize(description))
+            for term in tokenize(name):
+                frequencies[term] += self.name_weight
+            for term, frequency in frequencies.items():
+                if term not in self.vocab:
+                    self.vocab[term] = len(self.terms)
+                    self.terms.append(term)
+                rows.append(position)
+                columns.append(self.vocab[term])
+                counts.append(frequency)
+
+        if rows:
+            self.chunks.append((np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64), np.array(counts, dtype=np.float32)))
+        if added:
+            self.dirty = True
+        return added
+
+    def _build(self):
+        if not self.dirty:
+            return
+        if self.chunks:
+            self.doc_ids = np.concatenate([self.doc_ids] + [chunk[0] for chunk in self.chunks])
+            self.term_ids = np.concatenate([self.term_ids] + [chunk[1] for chunk in self.chunks])
+            self.tf = np.concatenate([self.tf] + [chunk[2] for chunk in self.chunks])
+            self.chunks = []
+        n_docs, n_terms = len(self.alive), len(self.terms)
+        alive = np.array(self.alive, dtype=bool)
+
+        # Las filas se añaden en orden, así que los arrays ya están en formato CSR
+        self.doc_ptr = np.searchsorted(self.doc_ids, np.arange(n_docs + 1))
+        # CSC (índice invertido): las mismas entradas ordenadas por término
+        self.by_term = np.argsort(self.term_ids, kind="stable")
+        self.term_ptr = np.concatenate([[0], np.cumsum(np.bincount(self.term_ids, minlength=n_terms))])
+
+        # TF-IDF suavizado con frecuencias logarítmicas; los pesos se normalizan para que el producto sea el coseno
+        doc_freq = np.bincount(self.term_ids, weights=alive[self.doc_ids], minlength=n_terms)
+        self.idf = np.log((1 + alive.sum()) / (1 + doc_freq)) + 1
+        weights = (1 + np.log(self.tf)) * self.idf[self.term_ids]
+        norms = np.sqrt(np.bincount(self.doc_ids, weights=weights ** 2, minlength=n_docs))
+        self.weights = weights / np.maximum(norms[self.doc_ids], 1e-12)
+        self.alive_mask = alive
+        self.price_array = np.array(self.prices, dtype=float)
+        self.city_array = np.array(self.records["Ciudad"], dtype=object)
+        self.dirty = False
+
+    def _match_terms(self, query, fuzzy):
+        """
+        Columnas y pesos de los términos de una consulta; los que no están en el índice se cambian por los más parecidos.
+        """
+        weights = Counter()
+        for term in tokenize(query):
+            if term in self.vocab:
+                weights[self.vocab[term]] += 1
+            elif fuzzy:
+                for match in difflib.get_close_matches(term, self.terms, n=2, cutoff=0.8): # Erratas: "catedarl" -> "catedral"
+                    weights[self.vocab[match]] += 0.5
+        return weights
+
+    def _scores(self, term_weights):
+        scores = np.zeros(len(self.alive))
+        for term, weight in term_weights.items():
+            entries = self.by_term[self.term_ptr[term]:self.term_ptr[term + 1]]
+            scores[self.doc_ids[entries]] += weight * self.idf[term] * self.weights[entries] # Un término sale una vez por actividad
+        return scores
+
+    def _top(self, scores, k, min_price, max_price, city, exclude=None):
+        mask = self.alive_mask & (scores > 0)
+        if min_price is not None:
+            mask &= self.price_array >= min_price
+        if max_price is not None:
+            mask &= self.price_array <= max_price
+        if city is not None:
+            mask &= self.city_array == city
+        if exclude is not None:
+            mask[exclude] = False
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        result = pd.DataFrame({column: [values[i] for i in candidates] for column, values in self.records.items()})
+        result["Precio"] = self.price_array[candidates]
+        result["score"] = scores[candidates]
+        return result
+
+    def search(self, query, k=10, min_price=None, max_price=None, city=None, fuzzy=True):
+        """
+        Busca actividades por palabras clave.
+
+        Args:
+            query (str): Texto de la búsqueda, p. ej. "crucero danubio cena".
+            k (int): Número máximo de resultados.
+            min_price (float, optional): Precio mínimo en euros.
+            max_price (float, optional): Precio máximo en euros (0 = sólo gratuitas).
+            city (str, optional): Ciudad (`Ciudad`) a la que se limita la búsqueda.
+            fuzzy (bool): Sustituir los términos que no aparecen en el índice por los más parecidos (erratas).
+
+        Returns:
+            pd.DataFrame: Nombre, Precio (float), Link, Descripcion, Ciudad y score, de más a menos relevante.
+        """
+        self._build()
+        return self._top(self._scores(self._match_terms(query, fuzzy)), k, min_price, max_price, city)
+
+    def similar(self, link, k=10, min_price=None, max_price=None, city=None):
+        """
+        Busca las actividades más parecidas a una dada (por similitud coseno de sus textos).
+
+        Args:
+            link (str): `Link` de la actividad de referencia.
+            k (int): Número máximo de resultados.
+            min_price (float, optional): Precio mínimo en euros.
+            max_price (float, optional): Precio máximo en euros.
+            city (str, optional): Ciudad a la que se limitan los resultados, p. ej. para buscar algo parecido en otro destino.
+
+        Returns:
+            pd.DataFrame: Mismas columnas que `search`, sin la actividad de referencia.
+        """
+        self._build()
+        if link not in self.positions:
+            raise KeyError(f"La actividad no está en el índice: {link}")
+        position = self.positions[link]
+        start, end = self.doc_ptr[position], self.doc_ptr[position + 1]
+        scores = np.zeros(len(self.alive))
+        for term, weight in zip(self.term_ids[start:end], self.weights[start:end]):
+            entries = self.by_term[self.term_ptr[term]:self.term_ptr[term + 1]]
+            scores[self.doc_ids[entries]] += weight * self.weights[entries]
+        return self._top(scores, k, min_price, max_price, city, exclude=position)
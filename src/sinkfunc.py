@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from storefunc import ARROW_TYPES, to_table
+
+
+class ParquetSink:
+    """
+    Escritor incremental de resultados en formato Parquet, con reanudación por ventanas completadas.
+
+    Cada lote (una ventana de fechas, una página...) se escribe como un row group en cuanto se parsea,
+    así no hace falta guardar todos los DataFrames en memoria hasta el final. Los lotes se agrupan en
+    ficheros `part-*.parquet` dentro de `path`; cada parte se escribe con un nombre temporal y se
+    renombra al cerrarse, y sólo entonces sus claves se apuntan en `_done.json`. Si el proceso muere
+    se pierde como mucho la parte abierta, y al relanzar se saltan las claves ya completadas.
+
+    Args:
+        path (str): Carpeta de salida.
+        batches_per_part (int): Número de lotes tras los que se cierra una parte y se confirma su progreso.
+        schema (pa.Schema, optional): Esquema fijo de la salida (ver `storefunc.sink_schema`). Si no se indica se
+                                      infiere del primer lote, con las categorías ampliadas a índices int32 y texto.
+    """
+
+    def __init__(self, path, batches_per_part=50, schema=None):
+        self.path = path
+        self.batches_per_part = batches_per_part
+        self.schema = schema
+        self.lock = threading.Lock()
+        self.writer = None
+        self.tmp_path = None
+        self.batches = 0
+        self.pending = [] # Claves escritas en la parte abierta, aún no confirmadas
+        os.makedirs(path, exist_ok=True)
+        self.done_path = os.path.join(path, "_done.json")
+        self.completed = set()
+        if os.path.exists(self.done_path):
+            with open(self.done_path) as f:
+                self.completed = set(json.load(f))
+
+    def done(self, key):
+        """
+        Indica si un lote ya se completó en una ejecución anterior (o en esta).
+
+        Args:
+            key (str): Clave del lote, p. ej. "destino|ida|vuelta".
+
+        Returns:
+            bool: True si el lote ya está guardado.
+        """
+        with self.lock:
+            return key in self.completed or key in self.pending
+
+    def write(self, df, key=None):
+        """
+        Añade un lote a la salida como un row group.
+
+        Args:
+            df (pd.DataFrame): Lote a escribir.
+            key (str | list, optional): Clave del lote para la reanudación, o lista de claves si el lote agrupa varias.
+        """
+        with self.lock:
+            if len(df):
+                if self.schema is None:
+                    inferred = pa.Schema.from_pandas(df, preserve_index=False).remove_metadata()
+                    self.schema = pa.schema([pa.field(f.name, ARROW_TYPES["category"]) if pa.types.is_dictionary(f.type) else f for f in inferred])
+                table = to_table(df, self.schema) # Cada lote se convierte al esquema fijo, aunque sus categorías o nulos sean otros
+                if self.writer is None:
+                    name = f"part-{uuid.uuid4().hex[:12]}.parquet"
+                    self.tmp_path = os.path.join(self.path, "." + name + ".tmp") # Oculto hasta cerrar la parte
+                    self.writer = pq.ParquetWriter(self.tmp_path, self.schema)
+                self.writer.write_table(table)
+                self.batches += 1
+            if isinstance(key, list):
+                self.pending.extend(key)
+            elif key is not None:
+                self.pending.append(key)
+            if self.batches >= self.batches_per_part:
+                self._roll()
+
+    def _roll(self):
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.tmp_path, os.path.join(self.path, os.path.basename(self.tmp_path)[1:-4]))
+            self.writer = None
+            self.tmp_path = None
+        self.batches = 0
+        if self.pending:
+            self.completed.update(self.pending)
+            self.pending = []
+            tmp_done = self.done_path + ".tmp"
+            with open(tmp_done, "w") as f:
+                json.dump(sorted(self.completed), f)
+            os.replace(tmp_done, self.done_path)
+
+    def close(self):
+        """
+        Cierra la parte abierta y confirma su progreso.
+        """
+        with self.lock:
+            self._roll()
+
+    def read(self, columns=None):
+        """
+        Lee todo lo escrito hasta ahora.
+
+        Args:
+            columns (list, optional): Columnas a leer.
+
+        Returns:
+            pd.DataFrame: Datos de todas las partes cerradas.
+        """
+        parts = sorted(f for f in os.listdir(self.path) if f.startswith("part-") and f.endswith(".parquet"))
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat([pd.read_parquet(os.path.join(self.path, f), columns=columns) for f in parts], ignore_index=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
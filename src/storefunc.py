@@ -0,0 +1,253 @@
+"""
+Almacenamiento tipado de los datasets de `datos/`.
+
+Los CSV guardan todo como texto: cada carga vuelve a parsear fechas y repite cadenas como `carrier_go`,
+`acc_type`, `city` o `day_in` en cada fila. Aquí los datos se guardan en Parquet (o Feather) con tipos
+propios: categorías (diccionario) para las cadenas repetidas, datetime64 para las fechas y float32 para
+precios y notas. La carga admite selección de columnas, filtros que se aplican antes de leer (con las
+estadísticas de cada row group de Parquet) y memory mapping.
+
+Uso:
+    python src/storefunc.py ../datos      # convierte los CSV de la carpeta a Parquet
+"""
+import argparse
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+DIAS = ["Lunes", "Martes", "Miercoles", "Jueves", "Viernes", "Sabado", "Domingo"]
+
+# Tipos de cada dataset. "category" = cadena repetida, guardada como diccionario
+DTYPES = {
+    "flights": {
+        "destination": "category", "price": "float32",
+        "carrier_go": "category", "duration_go": "Int16", "departure_go": "datetime", "arrival_go": "datetime", "stops_go": "Int8",
+        "carrier_back": "category", "duration_back": "Int16", "departure_back": "datetime", "arrival_back": "datetime", "stops_back": "Int8",
+        "window": "category",
+    },
+    "hotels": {
+        "hotel_id": "Int64", "hotel_name": "category", "price": "float32", "rating": "float32", "distance_from_center": "float32",
+        "acc_type": "category", "city": "category", "date_in": "datetime", "date_out": "datetime",
+        "day_in": "weekday", "day_out": "weekday", "window": "category",
+    },
+    "activities": {
+        "Nombre": "string", "Precio": "float32", "Link": "string", "Descripcion": "string", "Ciudad": "category",
+        "date_in": "datetime", "date_out": "datetime",
+    },
+}
+
+# Tipos de Arrow de cada tipo de `DTYPES`. Las categorías usan siempre índices int32 y valores de texto, así
+# todos los lotes de un dataset tienen el mismo esquema aunque cada uno tenga un número distinto de categorías
+ARROW_TYPES = {
+    "category": pa.dictionary(pa.int32(), pa.string()),
+    "weekday": pa.dictionary(pa.int32(), pa.string()),
+    "string": pa.string(),
+    "datetime": pa.timestamp("ns"),
+    "float32": pa.float32(),
+    "Int64": pa.int64(),
+    "Int16": pa.int16(),
+    "Int8": pa.int8(),
+}
+
+# Las salidas de los `main` guardan el precio de las actividades tal cual viene de Civitatis ("26,00 €")
+RAW_DTYPES = {"activities": {"Precio": "string"}}
+
+# Orden de las filas al guardar: así los row groups quedan agrupados por fecha y los filtros por fecha saltan row groups enteros
+SORT_BY = {
+    "flights": ["departure_go", "price"],
+    "hotels": ["date_in", "price"],
+    "activities": [],
+}
+
+
+def detect_kind(df):
+    """
+    Adivina el tipo de dataset por sus columnas.
+
+    Returns:
+        str: "flights", "hotels" o "activities".
+    """
+    columns = set(df.columns)
+    if {"carrier_go", "departure_go"} <= columns:
+        return "flights"
+    if {"hotel_name", "date_in"} <= columns:
+        return "hotels"
+    if {"Nombre", "Precio"} <= columns:
+        return "activities"
+    raise ValueError(f"No se reconoce el dataset por sus columnas: {sorted(columns)}")
+
+
+def typed(df, kind=None):
+    """
+    Convierte un DataFrame (salida de un `main` o un CSV de `datos/`) a los tipos de `DTYPES`.
+
+    Las columnas que no están en `DTYPES` se dejan como están. Los precios de actividades sólo se
+    convierten si ya son numéricos (ver `activityfunc.clean_price`).
+
+    Args:
+        df (pd.DataFrame): Datos a convertir.
+        kind (str, optional): "flights", "hotels" o "activities"; por defecto se detecta.
+
+    Returns:
+        pd.DataFrame: Copia con los tipos aplicados.
+    """
+    kind = kind or detect_kind(df)
+    df = df.copy()
+    for column, dtype in DTYPES[kind].items():
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if dtype == "datetime":
+            df[column] = pd.to_datetime(values)
+        elif dtype == "weekday":
+            source = column.replace("day_", "date_") # day_in -> date_in
+            if source in df.columns: # Se recalcula: los CSV antiguos tienen el día desplazado uno (el martes sale como "Lunes")
+                weekdays = pd.to_datetime(df[source]).dt.dayofweek
+                df[column] = pd.Categorical.from_codes(weekdays.fillna(-1).astype(int).values, categories=DIAS, ordered=True)
+            else:
+                df[column] = pd.Categorical(values, categories=DIAS, ordered=True)
+        elif dtype == "category":
+            df[column] = values.astype("category")
+        elif dtype == "string":
+            df[column] = values.astype("string")
+        elif pd.api.types.is_numeric_dtype(values) or kind != "activities":
+            df[column] = pd.to_numeric(values, errors="coerce").astype(dtype)
+    return df
+
+
+def sink_schema(kind):
+    """
+    Esquema fijo de Arrow de las salidas de un `main` (lo que escriben `sinkfunc.ParquetSink` y `runnerfunc.compact`).
+
+    Args:
+        kind (str): "flights", "hotels" o "activities".
+
+    Returns:
+        pa.Schema: Columnas de `DTYPES[kind]` con los tipos de `ARROW_TYPES`.
+    """
+    dtypes = {**DTYPES[kind], **RAW_DTYPES.get(kind, {})}
+    return pa.schema([(column, ARROW_TYPES[dtype]) for column, dtype in dtypes.items()])
+
+
+def to_table(df, schema):
+    """
+    Convierte un DataFrame a una tabla de Arrow con un esquema fijo, columna a columna.
+
+    No depende de los tipos que pandas haya inferido para el lote: una columna toda nula, unas categorías con
+    pocos valores o unas fechas como `datetime.date` acaban con el tipo del esquema. Las columnas que faltan
+    se rellenan con nulos.
+
+    Args:
+        df (pd.DataFrame): Lote a convertir.
+        schema (pa.Schema): Esquema de salida (p. ej. `sink_schema(kind)`).
+
+    Returns:
+        pa.Table: Tabla con exactamente las columnas y tipos de `schema`.
+    """
+    arrays = []
+    for field in schema:
+        values = df[field.name] if field.name in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+        if pa.types.is_dictionary(field.type):
+            array = pa.array(values.astype(object).where(values.notna(), None).astype("string"), from_pandas=True)
+            array = array.cast(pa.string()).dictionary_encode().cast(field.type)
+        elif pa.types.is_timestamp(field.type):
+            array = pa.array(pd.to_datetime(values).astype("datetime64[ns]"), type=field.type, from_pandas=True)
+        elif pa.types.is_string(field.type):
+            array = pa.array(values.astype(object).where(values.notna(), None).astype("string"), from_pandas=True).cast(pa.string())
+        else:
+            array = pa.array(pd.to_numeric(values, errors="coerce"), from_pandas=True).cast(field.type)
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def save(df, path, kind=None, row_group_size=64_000):
+    """
+    Guarda un dataset tipado en Parquet (zstd) o Feather según la extensión de `path`.
+
+    Args:
+        df (pd.DataFrame | list): Datos a guardar (una lista de DataFrames se concatena).
+        path (str): Fichero de salida, `.parquet` o `.feather`.
+        kind (str, optional): Tipo de dataset; por defecto se detecta.
+        row_group_size (int): Filas por row group de Parquet.
+
+    Returns:
+        str: Ruta del fichero guardado.
+    """
+    if isinstance(df, list):
+        df = pd.concat(df, ignore_index=True)
+    kind = kind or detect_kind(df)
+    df = typed(df, kind)
+    sort_by = [column for column in SORT_BY[kind] if column in df.columns]
+    if sort_by:
+        df = df.sort_values(sort_by, kind="stable")
+    table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if path.endswith((".feather", ".arrow")):
+        feather.write_feather(table, path, compression="uncompressed") # Sin comprimir para poder hacer memory mapping sin copias
+    else:
+        pq.write_table(table, path, compression="zstd", row_group_size=row_group_size)
+    return path
+
+
+def load(path, columns=None, filters=None, memory_map=True):
+    """
+    Carga un dataset guardado con `save`.
+
+    Args:
+        path (str): Fichero `.parquet` o `.feather`.
+        columns (list, optional): Columnas a leer; el resto no se lee del disco.
+        filters (list, optional): Filtros en formato de pyarrow, p. ej. `[("city", "==", "Milan"), ("price", "<", 500)]`.
+                                  En Parquet se descartan los row groups que no pueden cumplirlos sin leerlos.
+        memory_map (bool): Abrir el fichero con memory mapping.
+
+    Returns:
+        pd.DataFrame: Datos con sus tipos (categorías, fechas, float32...).
+    """
+    if path.endswith((".feather", ".arrow")):
+        source = pa.memory_map(path) if memory_map else path
+        read = columns
+        if columns is not None and filters: # Las columnas de los filtros también hay que leerlas, aunque no se devuelvan
+            clauses = [clause for group in filters for clause in group] if isinstance(filters[0], list) else filters
+            read = list(dict.fromkeys(list(columns) + [name for name, *_ in clauses]))
+        table = feather.read_table(source, columns=read, memory_map=memory_map)
+        if filters:
+            table = table.filter(pq.filters_to_expression(filters))
+        if columns is not None:
+            table = table.select(columns)
+    else:
+        table = pq.read_table(path, columns=columns, filters=filters, memory_map=memory_map)
+    return table.to_pandas()
+
+
+def convert_csvs(folder="../datos", fmt="parquet"):
+    """
+    Convierte los CSV de una carpeta (guardados con `to_csv` desde los notebooks) al formato tipado.
+
+    Args:
+        folder (str): Carpeta con los CSV.
+        fmt (str): "parquet" o "feather".
+
+    Returns:
+        list: Rutas de los ficheros generados.
+    """
+    outputs = []
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".csv"):
+            continue
+        df = pd.read_csv(os.path.join(folder, name), index_col=0)
+        outputs.append(save(df, os.path.join(folder, name[:-4] + "." + fmt)))
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", nargs="?", default="../datos", help="Carpeta con los CSV")
+    parser.add_argument("--format", choices=["parquet", "feather"], default="parquet")
+    args = parser.parse_args()
+    for output in convert_csvs(args.folder, args.format):
+        print(output)
@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+
+
+def _day_number(values):
+    """
+    Convierte fechas (texto, date o datetime) en número de días desde 1970-01-01.
+    """
+    return pd.to_datetime(pd.Series(values)).values.astype("datetime64[D]").astype(np.int64)
+
+def _query_day(value):
+    """
+    Número de días desde 1970-01-01 de una sola fecha (sin pasar por `pd.to_datetime` de una Series).
+    """
+    return pd.Timestamp(value).normalize().value // (24 * 3600 * 10**9)
+
+def _pack_keys(city_codes, day_in, day_out):
+    """
+    Empaqueta (ciudad, fecha de ida, fecha de vuelta) en un único int64 ordenable.
+
+    El orden del entero coincide con el de la tupla, así un rango de fechas de una ciudad
+    es un tramo contiguo del array ordenado.
+    """
+    return (np.asarray(city_codes, dtype=np.int64) << 40) | (np.asarray(day_in, dtype=np.int64) << 20) | np.asarray(day_out, dtype=np.int64)
+
+def flight_city(destinations, cities):
+    """
+    Asocia cada destino de vuelo ("Milan Malpensa") a la ciudad de los hoteles ("Milan").
+
+    Args:
+        destinations (pd.Series): Columna `destination` de los vuelos.
+        cities (list): Ciudades presentes en los datos de hoteles.
+
+    Returns:
+        pd.Series: Ciudad de cada vuelo; si ningún nombre de ciudad coincide se deja el destino tal cual.
+    """
+    mapping = {}
+    for dest in pd.unique(destinations):
+        match = [c for c in cities if str(dest).lower().startswith(str(c).lower())]
+        mapping[dest] = max(match, key=len) if match else dest
+    return destinations.map(mapping)
+
+def activity_city(links):
+    """
+    Saca la ciudad de la URL de Civitatis de cada actividad (https://www.civitatis.com/es/<ciudad>/...).
+
+    Args:
+        links (pd.Series): Columna `Link` de las actividades.
+
+    Returns:
+        pd.Series: Ciudad de cada actividad, en minúsculas.
+    """
+    return links.str.extract(r"civitatis\.com/[a-z]{2}/([^/]+)/", expand=False).str.lower()
+
+
+class TripIndex:
+    """
+    Índice precalculado de paquetes vuelo + hotel (+ actividades) por (ciudad, fecha de ida, fecha de vuelta).
+
+    Al construirlo se ordenan vuelos y hoteles por clave, se cruzan con un merge-join sobre los arrays
+    ordenados (sólo las claves presentes en ambos, nunca el producto cartesiano) y se guarda, para cada
+    clave, el paquete más barato y el de mejor relación calidad/precio. Las consultas son búsquedas
+    binarias sobre esos arrays más un top-k ordenando sólo las claves del rango, por lo que no dependen del tamaño de los datos originales.
+
+    Args:
+        flights (pd.DataFrame): Salida de `flightfunc.main` (o los CSV de vuelos).
+        hotels (pd.DataFrame | list): Salida de `hotelfunc.main` (o los CSV de alojamientos).
+        activities (pd.DataFrame, optional): Salida de `activityfunc.main` con la columna `Precio` ya limpia.
+    """
+
+    def __init__(self, flights, hotels, activities=None):
+        if isinstance(hotels, list):
+            hotels = pd.concat(hotels, ignore_index=True)
+        hotels = hotels.dropna(subset=["price", "city"]).reset_index(drop=True)
+        flights = flights.dropna(subset=["price"]).reset_index(drop=True)
+
+        self.cities = sorted(hotels["city"].dropna().unique())
+        self.city_codes = {city: code for code, city in enumerate(self.cities)}
+
+        # Vuelos: clave y orden por (clave, precio)
+        f_city = flight_city(flights["destination"].astype(str), self.cities).map(self.city_codes)
+        flights = flights[f_city.notna()].reset_index(drop=True)
+        f_keys = _pack_keys(f_city[f_city.notna()].astype(np.int64).values, _day_number(flights["departure_go"]), _day_number(flights["departure_back"]))
+        f_order = np.lexsort((flights["price"].values, f_keys))
+        self.flights = flights.iloc[f_order].reset_index(drop=True)
+        f_keys = f_keys[f_order]
+
+        # Hoteles: igual
+        h_keys = _pack_keys(hotels["city"].map(self.city_codes).values, _day_number(hotels["date_in"]), _day_number(hotels["date_out"]))
+        h_order = np.lexsort((hotels["price"].values, h_keys))
+        self.hotels = hotels.iloc[h_order].reset_index(drop=True)
+        h_keys = h_keys[h_order]
+
+        # Primera fila de cada clave = la más barata, porque dentro de la clave está ordenado por precio
+        f_unique, f_first = np.unique(f_keys, return_index=True)
+        h_unique, h_first = np.unique(h_keys, return_index=True)
+
+        # Merge-join sobre los arrays de claves ordenados
+        self.keys, f_pos, h_pos = np.intersect1d(f_unique, h_unique, assume_unique=True, return_indices=True)
+        self.flight_idx = f_first[f_pos]
+        self.cheap_hotel_idx = h_first[h_pos]
+        flight_price = self.flights["price"].values[self.flight_idx]
+        self.cheap_total = flight_price + self.hotels["price"].values[self.cheap_hotel_idx]
+
+        # Mejor relación calidad/precio por clave: nota del hotel por cada 1000 € del paquete (con el vuelo más barato)
+        n_keys = len(self.keys)
+        h_price = self.hotels["price"].values
+        h_key_pos = np.minimum(np.searchsorted(self.keys, h_keys), max(n_keys - 1, 0))
+        in_join = self.keys[h_key_pos] == h_keys if n_keys else np.zeros(len(h_keys), dtype=bool)
+        value = np.full(len(h_keys), -np.inf)
+        value[in_join] = self.hotels["rating"].fillna(0).values[in_join] / (flight_price[h_key_pos[in_join]] + h_price[in_join]) * 1000
+        best_rows = pd.Series(value[in_join], index=np.flatnonzero(in_join)).groupby(h_key_pos[in_join]).idxmax()
+        self.value_hotel_idx = best_rows.reindex(range(n_keys)).values.astype(np.int64)
+        self.value_score = value[self.value_hotel_idx]
+        self.value_total = flight_price + h_price[self.value_hotel_idx]
+
+        # Columnas del resultado de `query`, ya extraídas para indexarlas directamente con las k posiciones
+        self.flight_columns = {column: self.flights[column].array for column in ("price", "carrier_go", "carrier_back")}
+        self.hotel_columns = {column: self.hotels[column].array for column in ("city", "date_in", "date_out", "hotel_name", "price", "rating")}
+
+        # Actividades: nombres por precio y suma acumulada por ciudad, para saber cuántas caben en un presupuesto
+        self.activities = {}
+        if activities is not None:
+            acts = activities.assign(city=activity_city(activities["Link"])).dropna(subset=["Precio", "city"])
+            for city, group in acts.sort_values("Precio").groupby("city"):
+                self.activities[city] = (group["Nombre"].to_numpy(dtype=object), np.cumsum(group["Precio"].values))
+
+    def _candidates(self, city, date_from, date_to):
+        """
+        Posiciones de las claves con salida y vuelta dentro de [date_from, date_to].
+        """
+        day_from, day_to = _query_day(date_from), _query_day(date_to)
+        if city is not None and city not in self.city_codes: # Ciudad sin datos: ningún paquete
+            return np.array([], dtype=np.int64)
+        codes = [self.city_codes[city]] if city is not None else range(len(self.cities))
+        positions = []
+        for code in codes:
+            lo = np.searchsorted(self.keys, _pack_keys(code, day_from, 0), side="left")
+            hi = np.searchsorted(self.keys, _pack_keys(code, day_to + 1, 0), side="left") # La ida va en los bits altos: el tramo es contiguo
+            span = np.arange(lo, hi)
+            day_out = self.keys[span] & ((1 << 20) - 1)
+            positions.append(span[day_out <= day_to])
+        return np.concatenate(positions) if positions else np.array([], dtype=np.int64)
+
+    def _activities_for(self, city, remaining, people):
+        if city is None or str(city).lower() not in self.activities or remaining <= 0:
+            return [], 0.0
+        names, cumulative = self.activities[str(city).lower()]
+        n = int(np.searchsorted(cumulative * people, remaining, side="right"))
+        return names[:n].tolist(), float(cumulative[n - 1] * people) if n else 0.0 # Sólo se copian los nombres de las k filas del resultado
+
+    def query(self, date_from, date_to, city=None, k=5, by="price", budget=None, people=1):
+        """
+        Devuelve los k mejores paquetes vuelo + hotel con ida y vuelta dentro de un rango de fechas.
+
+        Args:
+            date_from (str | date): Primera fecha de ida aceptada.
+            date_to (str | date): Última fecha de vuelta aceptada.
+            city (str, optional): Ciudad de destino; por defecto todas.
+            k (int): Número de paquetes a devolver.
+            by (str): "price" para el más barato o "value" para la mejor nota por euro.
+            budget (float, optional): Presupuesto total. Se descartan paquetes que lo superan y con
+                                      lo que sobra se añaden las actividades más baratas de la ciudad.
+            people (int): Personas que hacen las actividades (multiplica su precio).
+
+        Returns:
+            pd.DataFrame: Paquetes ordenados con ciudad, fechas, vuelo, hotel, precio total y actividades.
+        """
+        positions = self._candidates(city, date_from, date_to)
+        if by == "price":
+            totals, hotel_idx = self.cheap_total, self.cheap_hotel_idx
+            scores = totals
+        elif by == "value":
+            totals, hotel_idx = self.value_total, self.value_hotel_idx
+            scores = -self.value_score # Se ordena de menor a mayor: mayor valor primero
+        else:
+            raise ValueError(f"Criterio no válido: {by}")
+
+        if budget is not None:
+            positions = positions[totals[positions] <= budget]
+        if len(positions) > k: # Top-k: sólo se ordenan las claves que pueden entrar en las k mejores, no todo el rango
+            kth = np.partition(scores[positions], k - 1)[k - 1]
+            positions = positions[scores[positions] <= kth] # Con los empates de la k-ésima, para desempatar igual que un orden estable
+        best = positions[np.lexsort((positions, scores[positions]))][:k] # En empate, el orden de las claves
+
+        # El resultado se monta por columnas, indexando los arrays de vuelos y hoteles con las k posiciones
+        flight_rows, hotel_rows = self.flight_idx[best], hotel_idx[best]
+        flights, hotels = self.flight_columns, self.hotel_columns
+        columns = {
+            "city": hotels["city"][hotel_rows],
+            "date_in": hotels["date_in"][hotel_rows],
+            "date_out": hotels["date_out"][hotel_rows],
+            "flight_price": flights["price"][flight_rows],
+            "carrier_go": flights["carrier_go"][flight_rows],
+            "carrier_back": flights["carrier_back"][flight_rows],
+            "hotel_name": hotels["hotel_name"][hotel_rows],
+            "hotel_price": hotels["price"][hotel_rows],
+            "rating": hotels["rating"][hotel_rows],
+            "total": totals[best],
+        }
+        if budget is not None and self.activities: # Las columnas de actividades se añaden antes de crear el DataFrame: una sola construcción
+            extras = [self._activities_for(city, budget - total, people) for city, total in zip(columns["city"], columns["total"])]
+            columns["activities"] = [names for names, _ in extras]
+            columns["activities_price"] = np.array([cost for _, cost in extras])
+            columns["total"] = columns["total"] + columns["activities_price"]
+        return pd.DataFrame(columns)
+
+    def cheapest(self, date_from, date_to, city=None, k=5, budget=None, people=1):
+        """
+        Atajo de `query` para los paquetes más baratos.
+        """
+        return self.query(date_from, date_to, city, k, "price", budget, people)
+
+    def best_value(self, date_from, date_to, city=None, k=5, budget=None, people=1):
+        """
+        Atajo de `query` para los paquetes con mejor relación calidad/precio.
+        """
+        return self.query(date_from, date_to, city, k, "value", budget, people)
@@ -0,0 +1,102 @@
+import asyncio
+import concurrent.futures
+import os
+import sys
+
+import pandas as pd
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+from activityfunc import DriverPool, PageTask, http_engine, parse_activities_html, parse_page_html
+
+
+def card(name):
+    return f"""<div class="o-search-list__item"><a class="_activity-link" href="/es/budapest/{name}/">
+               <h2 class="comfort-card__title">{name}</h2></a><span class="comfort-card__price__text">25 €</span></div>"""
+
+
+def test_static_page_only_parses_the_activities_container():
+    html = f"""<html><body><div class='o-list' id='activities-container' data-x="1">{card("crucero")}{card("termas")}</div>
+               <aside id="recommendations">{card("recomendada")}</aside></body></html>"""
+    records = parse_page_html(html)
+    assert [record["Nombre"] for record in records] == ["crucero", "termas"]
+    assert records[0]["Link"] == "https://www.civitatis.com/es/budapest/crucero/"
+
+
+def test_static_page_without_container_needs_selenium():
+    assert parse_page_html(f"<html><body><aside>{card('recomendada')}</aside></body></html>") is None
+    assert parse_page_html('<html><body><div id="activities-container"></div></body></html>') is None
+
+
+def test_empty_static_page_needs_selenium():
+    assert parse_page_html("") is None
+    assert parse_page_html("  \n ") is None
+
+
+def test_http_engine_sends_empty_pages_to_selenium():
+    async def go():
+        app = web.Application()
+        app.router.add_get("/vacia", lambda request: web.Response(text=""))
+        app.router.add_get("/llena", lambda request: web.Response(text=f"<div id='activities-container'>{card('crucero')}</div>"))
+        async with TestServer(app) as server:
+            tasks = [PageTask("budapest", "2025-07-01", "2025-07-15", str(server.make_url(path))) for path in ("/vacia", "/llena")]
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                return tasks, await http_engine(tasks, executor)
+    tasks, (records, fallback) = asyncio.run(go())
+    assert [record["Nombre"] for record in records] == ["crucero"]
+    assert fallback == [tasks[0]]
+
+
+def test_cards_with_missing_fields_stay_aligned():
+    sin_precio = """<div class="o-search-list__item"><a class="_activity-link" href="/es/budapest/termas/">
+                    <h2 class="comfort-card__title">termas</h2></a>
+                    <div class="comfort-card__text l-list-card__text">Baños Széchenyi</div></div>"""
+    sin_valoracion = """<div class="o-search-list__item"><h2 class="comfort-card__title">balaton</h2>
+                        <span class="comfort-card__price__text">40 €</span></div>""" # Ni opiniones, ni descripción, ni enlace
+    records = parse_activities_html(card("crucero") + sin_precio + sin_valoracion + card("parlamento"))
+
+    assert [record["Nombre"] for record in records] == ["crucero", "termas", "balaton", "parlamento"]
+    assert records[0]["Precio"] == "25 €" and pd.isna(records[0]["Descripcion"])
+    assert pd.isna(records[1]["Precio"]) # No hereda el precio de la tarjeta siguiente
+    assert records[1]["Link"] == "https://www.civitatis.com/es/budapest/termas/"
+    assert records[1]["Descripcion"] == "Baños Széchenyi"
+    assert records[2]["Precio"] == "40 €"
+    assert pd.isna(records[2]["Link"]) and pd.isna(records[2]["Descripcion"])
+    assert records[3]["Link"] == "https://www.civitatis.com/es/budapest/parlamento/" and records[3]["Precio"] == "25 €"
+
+
+class FlakyPool(DriverPool):
+    """
+    Pool con navegadores falsos cuyo arranque falla mientras `broken` sea True.
+    """
+
+    def __init__(self):
+        super().__init__(size=1, max_pages=1)
+        self.started, self.quit, self.broken = 0, [], False
+
+    def _start(self):
+        if self.broken:
+            raise ConnectionRefusedError("chromedriver no arranca")
+        self.started += 1
+        return f"driver-{self.started}"
+
+    def _quit(self, driver):
+        self.quit.append(driver)
+
+
+def test_failed_restart_does_not_quit_the_old_driver_twice():
+    pool = FlakyPool()
+    with pool.driver() as driver:
+        assert driver == "driver-1"
+    pool.broken = True # Toca reiniciar (max_pages=1) y el arranque falla
+    with pytest.raises(ConnectionRefusedError):
+        with pool.driver():
+            pass
+    assert pool.quit == ["driver-1"]
+
+    pool.broken = False
+    with pool.driver() as driver:
+        assert driver == "driver-2"
+    assert pool.quit == ["driver-1"]
@@ -0,0 +1,74 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+import cachefunc
+from cachefunc import DEFAULT_TTL, ResponseCache
+
+AIRPORT = "https://sky-scrapper.p.rapidapi.com/api/v1/flights/searchAirport"
+FLIGHTS = "https://sky-scrapper.p.rapidapi.com/api/v2/flights/searchFlights"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1751328000.0
+
+    def __call__(self):
+        return self.now
+
+
+def cache(tmp_path, monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(cachefunc.time, "time", clock)
+    return ResponseCache(str(tmp_path / "cache.sqlite"), **kwargs), clock
+
+
+def test_hit_inside_ttl_and_miss_after(tmp_path, monkeypatch):
+    responses, clock = cache(tmp_path, monkeypatch, ttls={"flights/searchFlights": 600})
+    responses.set(FLIGHTS, {"date": "2025-07-01", "adults": 2}, {"data": [1, 2]})
+    fetched_at = clock.now
+
+    clock.now += 599
+    assert responses.get(FLIGHTS, {"adults": "2", "date": "2025-07-01"}) == {"data": [1, 2]} # Mismos parámetros, otro orden y tipo
+    assert responses.get(FLIGHTS, {"date": "2025-07-01", "adults": 2}, with_time=True) == ({"data": [1, 2]}, fetched_at)
+    assert responses.get(FLIGHTS, {"date": "2025-07-02", "adults": 2}) is None
+
+    clock.now += 2
+    assert responses.get(FLIGHTS, {"date": "2025-07-01", "adults": 2}) is None
+    assert responses.get(FLIGHTS, {"date": "2025-07-01", "adults": 2}, with_time=True) == (None, None)
+    responses.close()
+
+
+def test_ttl_depends_on_the_endpoint(tmp_path, monkeypatch):
+    responses, clock = cache(tmp_path, monkeypatch, ttls={"flights/searchAirport": 10 * DEFAULT_TTL, "flights/searchFlights": 60})
+    responses.set(AIRPORT, {"query": "Budapest"}, {"data": "BUD"})
+    responses.set(FLIGHTS, {"date": "2025-07-01"}, {"data": "vuelos"})
+    responses.set("https://booking-com.p.rapidapi.com/v1/otro", {}, {"data": "otro"})
+    responses.set(FLIGHTS, {"date": "2025-07-02"}, {"data": "vuelos"}, ttl=2 * DEFAULT_TTL) # TTL explícito
+
+    clock.now += 61
+    assert responses.get(FLIGHTS, {"date": "2025-07-01"}) is None
+    assert responses.get(AIRPORT, {"query": "Budapest"}) == {"data": "BUD"}
+    assert responses.get("https://booking-com.p.rapidapi.com/v1/otro") == {"data": "otro"}
+
+    clock.now += DEFAULT_TTL
+    assert responses.get("https://booking-com.p.rapidapi.com/v1/otro") is None # TTL por defecto
+    assert responses.get(FLIGHTS, {"date": "2025-07-02"}) == {"data": "vuelos"}
+    assert responses.get(AIRPORT, {"query": "Budapest"}) == {"data": "BUD"}
+    responses.close()
+
+
+def test_eviction_keeps_recently_used_entries(tmp_path, monkeypatch):
+    responses, clock = cache(tmp_path, monkeypatch, max_entries=3, touch_interval=60)
+    for query in ("a", "b", "c"):
+        responses.set(AIRPORT, {"query": query}, {"data": query})
+        clock.now += 100
+
+    assert responses.get(AIRPORT, {"query": "a"}) == {"data": "a"} # "a" pasa a ser la más reciente
+    clock.now += 100
+    responses.writes = 100 # La siguiente escritura expulsa
+    responses.set(AIRPORT, {"query": "d"}, {"data": "d"})
+
+    kept = {query for query in "abcd" if responses.get(AIRPORT, {"query": query}) is not None}
+    assert kept == {"a", "c", "d"}
+    responses.close()
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+import flightfunc
+
+ORIGIN = ("MAD", {"data": [{"skyId": "MAD", "entityId": "1"}]})
+BUDAPEST = ("BUD", {"data": [{"skyId": "BUD", "entityId": "2"}]})
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures")
+
+
+def flights_fixture():
+    with open(os.path.join(FIXTURES, "sky_search_flights.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def leg(destination, departure, arrival, carriers, stops=0, duration=180):
+    return {"durationInMinutes": duration, "departure": departure, "arrival": arrival, "stopCount": stops,
+            "destination": {"name": destination}, "carriers": {"marketing": [{"name": name} for name in carriers]}}
+
+
+class FakeClient:
+    """
+    Cliente que responde siempre con `payload`, sin pasar por la red (como si saliera de la caché si se indica `cached_at`).
+    """
+
+    def __init__(self, payload, cached_at=None):
+        self.payload = payload
+        self.cached_at = cached_at
+        self.failures = []
+
+    async def get_json(self, url, headers, params, key=None, validate=None, with_cached_at=False):
+        return (self.payload, self.cached_at) if with_cached_at else self.payload
+
+
+class Calls:
+    """
+    Histórico / manifiesto falso que apunta las llamadas que recibe.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def record_flights(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+
+    def record(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+
+
+def test_malformed_window_is_reported_instead_of_aborting_the_run():
+    client = FakeClient({"data": {"itineraries": [{"price": {"raw": "caro"}, "legs": "ida"}]}})
+    result = asyncio.run(flightfunc.window_flights("token", client, ORIGIN, BUDAPEST, "2025-07-01", "2025-07-10", 2, 0))
+    assert result is None
+    assert [failure["key"] for failure in client.failures] == [flightfunc.window_key(ORIGIN, BUDAPEST, "2025-07-01", "2025-07-10", 2, 0)]
+    assert "Respuesta no parseable" in client.failures[0]["error"]
+
+
+def test_cached_window_is_not_a_new_observation():
+    history, refresh = Calls(), Calls()
+    client = FakeClient(flights_fixture(), cached_at=1751328000.0)
+    df = asyncio.run(flightfunc.window_flights("token", client, ORIGIN, BUDAPEST, "2025-07-01", "2025-07-10", 2, 0,
+                                               refresh=refresh, history=history))
+    assert len(df) > 0
+    assert history.calls == [] # Ya se guardó al descargarla
+    assert refresh.calls[0][1] == {"fetched_at": 1751328000.0} # El manifiesto conserva la antigüedad real
+
+    client.cached_at = None
+    asyncio.run(flightfunc.window_flights("token", client, ORIGIN, BUDAPEST, "2025-07-01", "2025-07-10", 2, 0, history=history))
+    assert history.calls[0][1] == {"origin": "MAD"}
+
+
+def test_parse_flight_responses_handles_partial_itineraries():
+    go = leg("Budapest", "2025-07-01T10:00:00", "2025-07-01T13:00:00", ["Wizz Air"])
+    back = leg("Madrid", "2025-07-10T14:00:00", "2025-07-10T17:30:00", ["Ryanair", "Iberia"], stops=1, duration=210)
+    no_carrier = leg("Budapest", "2025-07-01T18:00:00", "2025-07-01T21:00:00", [])
+    del no_carrier["carriers"]
+    responses = [
+        {"data": {"itineraries": [{"price": {"raw": 100.5}, "legs": [go, back]}, {"price": {"raw": 80.0}, "legs": [go, None]}]}},
+        None, # Ventana fallida
+        {"status": False},
+        {"data": {"itineraries": [{"price": {"raw": 95.0}, "legs": [no_carrier, back]}]}},
+    ]
+    df = flightfunc.parse_flight_responses(responses)
+
+    assert list(df.columns) == flightfunc.FLIGHT_COLUMNS
+    assert df["price"].tolist() == [100.5, 80.0, 95.0]
+    assert df["destination"].tolist() == ["Budapest"] * 3
+    assert df["carrier_go"].tolist()[:2] == ["Wizz Air", "Wizz Air"] and pd.isna(df["carrier_go"][2])
+    assert df["carrier_back"].tolist()[0] == "Ryanair" and pd.isna(df["carrier_back"][1])
+    assert df["duration_go"].tolist() == [180, 180, 180]
+    assert df["duration_back"].tolist()[::2] == [210, 210] and pd.isna(df["duration_back"][1]) # Sin vuelta
+    assert df["departure_go"][2] == pd.Timestamp("2025-07-01 18:00")
+    assert pd.isna(df["departure_back"][1]) and pd.isna(df["arrival_back"][1])
+
+    assert isinstance(df["destination"].dtype, pd.CategoricalDtype)
+    assert isinstance(df["carrier_go"].dtype, pd.CategoricalDtype) and isinstance(df["carrier_back"].dtype, pd.CategoricalDtype)
+    assert df["price"].dtype == "float64"
+    assert pd.api.types.is_integer_dtype(df["duration_go"]) and pd.api.types.is_integer_dtype(df["stops_go"])
+    assert df["duration_back"].dtype == "float64" # Los nulos de la vuelta obligan a float
+    for column in ("departure_go", "arrival_go", "departure_back", "arrival_back"):
+        assert pd.api.types.is_datetime64_dtype(df[column])
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+from historyfunc import PriceHistory
+
+
+def flights():
+    return pd.DataFrame({"destination": ["Budapest"] * 3, "departure_go": ["2025-07-01"] * 3, "departure_back": ["2025-07-08"] * 3,
+                         "carrier_go": ["W6", "FR", "W6"], "stops_go": [0, 1, 0], "duration_go": [180, 240, 185], "price": [100.0, 80.0, 120.0]})
+
+
+def test_rollups_survive_a_run_without_close(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    history = PriceHistory(path)
+    history.record_flights(flights(), observed_at=1751328000) # 2025-07-01
+    history.conn.close() # El proceso termina sin llamar a close()
+
+    history = PriceHistory(path)
+    rollups = history.rollups("flights")
+    assert len(history.trend("Budapest", now=1751328000)) == 1
+    assert rollups.set_index("category")["offers"].to_dict() == {"FR": 1, "W6": 2}
+    assert list(rollups["day"].unique()) == ["2025-07-01"]
+    history.close()
+
+
+def test_failed_rollup_update_rolls_back(tmp_path):
+    history = PriceHistory(str(tmp_path / "history.sqlite"))
+    history.record_flights(flights(), observed_at=1751328000)
+    history.conn.execute("INSERT INTO rollups_dirty VALUES ('flights', 'Budapest', 'no es un día')")
+    history.conn.commit()
+    try:
+        history.update_rollups()
+    except ValueError:
+        pass
+    assert not history.conn.in_transaction # Se libera el bloqueo de escritura
+    assert history.conn.execute("SELECT COUNT(*) FROM rollups").fetchone()[0] == 0
+    assert history.conn.execute("SELECT COUNT(*) FROM rollups_dirty").fetchone()[0] == 2 # Nada se da por recalculado
+    assert history.record_flights(flights(), observed_at=1751328000) == 3
+    history.conn.close()
+
+
+def test_ingested_flights_share_the_route_of_live_scrapes(tmp_path):
+    path = str(tmp_path / "vuelos.csv")
+    flights().to_csv(path)
+    history = PriceHistory(str(tmp_path / "history.sqlite"))
+    history.record_flights(flights(), observed_at=1751328000, origin="MAD") # Scrape en vivo
+    assert history.ingest(path, observed_at=1751414400, origin="MAD") == 3
+    assert history.window_history("MAD-Budapest", "2025-07-01", "2025-07-08")["offers"].tolist() == [3, 3]
+    history.close()
@@ -0,0 +1,54 @@
+import asyncio
+import os
+import sys
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+from hotelfunc import fetch_hotel_pages
+from httpfunc import ApiClient
+
+
+def search(total, page_size=20):
+    """
+    Servidor de prueba con una búsqueda de `total` hoteles en páginas de `page_size`.
+    """
+    pages = []
+
+    async def handler(request):
+        page = int(request.query["page_number"])
+        pages.append(page)
+        ids = range(page * page_size, min(total, (page + 1) * page_size))
+        return web.json_response({"count": total, "result": [{"hotel_id": i} for i in ids]})
+
+    app = web.Application()
+    app.router.add_get("/search", handler)
+    return TestServer(app), pages
+
+
+def fetch(total, max_pages=10):
+    async def go():
+        server, pages = search(total)
+        async with server, aiohttp.ClientSession() as session:
+            client = ApiClient(session)
+            hotels, complete, _ = await fetch_hotel_pages(client, str(server.make_url("/search")), {}, {}, "clave", max_pages)
+            return hotels, complete, pages
+    return asyncio.run(go())
+
+
+def test_single_page_search_costs_one_request():
+    hotels, complete, pages = fetch(20)
+    assert complete and len(hotels) == 20
+    assert pages == [0]
+
+
+def test_remaining_pages_come_from_count():
+    hotels, complete, pages = fetch(50)
+    assert complete and len(hotels) == 50
+    assert sorted(pages) == [0, 1, 2]
+
+    hotels, complete, pages = fetch(500, max_pages=4)
+    assert len(hotels) == 80
+    assert sorted(pages) == [0, 1, 2, 3]
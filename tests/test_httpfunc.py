@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+from httpfunc import AdaptiveLimiter, ApiClient, CircuitBreaker, run_bounded
+
+
+def test_circuit_breaker_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+    breaker.failure()
+    breaker.failure()
+    assert breaker.wait_time() > 0 # Abierto
+
+    time.sleep(0.06)
+    assert breaker.wait_time() == 0 # La prueba
+    assert breaker.wait_time() > 0 # El resto espera mientras la prueba está en vuelo
+
+    breaker.failure() # La prueba falla: se vuelve a abrir
+    assert breaker.wait_time() > 0.03
+
+    time.sleep(0.06)
+    assert breaker.wait_time() == 0
+    breaker.success()
+    assert breaker.wait_time() == 0 and breaker.wait_time() == 0 # Cerrado
+
+
+def serve(statuses):
+    """
+    Servidor de prueba que responde con los códigos de `statuses` en orden (y 200 cuando se acaban).
+    """
+    calls = []
+
+    async def handler(request):
+        calls.append(dict(request.query))
+        status = statuses[len(calls) - 1] if len(calls) <= len(statuses) else 200
+        if status != 200:
+            return web.Response(status=status, headers={"Retry-After": "0"})
+        await asyncio.sleep(0.01)
+        return web.json_response({"ok": True, "call": len(calls)})
+
+    app = web.Application()
+    app.router.add_get("/api", handler)
+    return TestServer(app), calls
+
+
+def test_api_client_retries_429_and_500_then_succeeds():
+    async def go():
+        server, calls = serve([429, 500])
+        async with server, aiohttp.ClientSession() as session:
+            client = ApiClient(session, max_concurrency=4, base_delay=0)
+            data = await client.get_json(str(server.make_url("/api")), {}, {"q": "a"})
+            return data, calls, client
+    data, calls, client = asyncio.run(go())
+    assert data == {"ok": True, "call": 3}
+    assert len(calls) == 3
+    assert client.failures == []
+    assert client.limiter.limit == 2 # El 429 reduce a la mitad el límite de concurrencia
+
+
+def test_api_client_records_failure_after_retries():
+    async def go():
+        server, calls = serve([500] * 10)
+        async with server, aiohttp.ClientSession() as session:
+            client = ApiClient(session, retries=2, base_delay=0)
+            data = await client.get_json(str(server.make_url("/api")), {}, {"q": "a"}, key="clave")
+            return data, calls, client
+    data, calls, client = asyncio.run(go())
+    assert data is None
+    assert len(calls) == 3
+    assert [(failure["key"], failure["error"]) for failure in client.failures] == [("clave", "HTTP 500")]
+
+
+def test_api_client_single_flight_coalesces_identical_requests():
+    async def go():
+        server, calls = serve([])
+        async with server, aiohttp.ClientSession() as session:
+            client = ApiClient(session)
+            url = str(server.make_url("/api"))
+            results = await asyncio.gather(*[client.get_json(url, {}, {"q": "a"}) for _ in range(5)], client.get_json(url, {}, {"q": "b"}))
+            return results, calls, client
+    results, calls, client = asyncio.run(go())
+    assert len(calls) == 2 # Una por parámetros distintos
+    assert all(result is results[0] for result in results[:5])
+    assert client.coalesced == 4
+
+
+def test_adaptive_limiter_grows_back_after_successes():
+    limiter = AdaptiveLimiter(max_concurrency=4)
+    limiter.throttled()
+    assert limiter.limit == 2
+    for _ in range(2):
+        limiter.succeeded()
+    assert limiter.limit == 3
+
+
+def test_run_bounded_stops_starting_coroutines_after_a_failure():
+    started, finished = [], []
+
+    async def job(index):
+        started.append(index)
+        if index == 1:
+            raise ValueError("fallo")
+        await asyncio.sleep(0.05)
+        finished.append(index)
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_bounded((job(index) for index in range(6)), max_concurrency=2))
+    assert started == [0, 1]
+    assert finished == [] # La que estaba en vuelo se cancela
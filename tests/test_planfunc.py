@@ -0,0 +1,52 @@
+import os
+import random
+import sys
+from datetime import date
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+from planfunc import Job, date_windows, job_key, plan, shard_jobs
+
+
+def test_date_windows_stay_inside_each_month():
+    windows = list(date_windows({"year": 2025, "months": [7], "nights": 9}))
+    assert len(windows) == 22
+    assert windows[0] == (date(2025, 7, 1), date(2025, 7, 10))
+    assert windows[-1] == (date(2025, 7, 22), date(2025, 7, 31))
+
+
+def test_date_windows_filter_weekdays_and_days():
+    fridays = {"start": "2025-07-01", "end": "2025-07-15", "nights": [3, 5], "weekdays": [4]}
+    assert list(date_windows(fridays)) == [(date(2025, 7, 4), date(2025, 7, 7)), (date(2025, 7, 4), date(2025, 7, 9)),
+                                           (date(2025, 7, 11), date(2025, 7, 14))]
+    days = {"year": 2025, "months": [7, 8], "nights": 14, "days": [1, 15]}
+    assert [check_in.isoformat() for check_in, _ in date_windows(days)] == ["2025-07-01", "2025-07-15", "2025-08-01", "2025-08-15"]
+
+
+def test_plan_orders_by_origin_destination_party_and_dates():
+    spec = {"origins": ["MAD", "BCN"], "destinations": ["BUD", "MIL"],
+            "dates": {"start": "2025-07-01", "end": "2025-07-12", "nights": 9},
+            "party": [{"adults": 2}, {"adults": 2, "children": 2}]}
+    jobs = list(plan(spec))
+    assert len(jobs) == 2 * 2 * 2 * 3
+    assert jobs[0] == Job("MAD", "BUD", date(2025, 7, 1), date(2025, 7, 10), {"adults": 2})
+    assert jobs[3].party == {"adults": 2, "children": 2}
+    assert jobs[6].destination == "MIL" and jobs[12].origin == "BCN"
+
+
+def test_job_key_includes_everything_that_defines_a_search():
+    job = Job(("MAD", {}), ("BUD", {}), date(2025, 7, 1), date(2025, 7, 10), {"children": 2, "adults": 2})
+    assert job_key(job) == "MAD|BUD|2025-07-01|2025-07-10|adults=2,children=2"
+    assert job_key(job._replace(origin=None, party={})) == "BUD|2025-07-01|2025-07-10"
+    assert job_key(job._replace(origin=("BCN", {}))) != job_key(job)
+    assert job_key(job._replace(party={"adults": 2, "children": 1})) != job_key(job)
+
+
+def test_shard_jobs_split_the_plan_independently_of_order():
+    jobs = list(plan({"origins": ["MAD"], "destinations": ["BUD", "MIL", "PRG"], "dates": {"year": 2025, "months": [7, 8], "nights": 9}}))
+    shuffled = jobs[:]
+    random.Random(0).shuffle(shuffled)
+
+    shards = [set(map(job_key, shard_jobs(jobs, index, 4))) for index in range(4)]
+    assert set().union(*shards) == set(map(job_key, jobs))
+    assert sum(len(shard) for shard in shards) == len(jobs) # Sin solapes
+    assert all(shards[index] == set(map(job_key, shard_jobs(shuffled, index, 4))) for index in range(4))
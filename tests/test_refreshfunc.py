@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+from datetime import date
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+import flightfunc
+from planfunc import plan, job_key
+from refreshfunc import Refresher
+
+DAY = 24 * 3600
+
+
+def windows(*keys):
+    return pd.DataFrame({"window": list(keys), "price": [100.0 + i for i in range(len(keys))]})
+
+
+def test_merge_twice_only_replaces_the_last_run(tmp_path):
+    refresh = Refresher(str(tmp_path / "manifest.sqlite"))
+    existing = windows("a", "a", "b", "c")
+
+    refresh.start("flights")
+    delta = windows("a")
+    refresh.record("flights", "a", "2025-07-01", delta)
+    merged = refresh.merge(existing, delta, "flights")
+    assert sorted(merged["window"]) == ["a", "b", "c"]
+
+    # Segunda ejecución con el mismo Refresher: "b" se consulta y ya no tiene resultados
+    refresh.start("flights")
+    refresh.record("flights", "b", "2025-07-02", windows())
+    refresh.record("hotels", "c", "2025-07-03", windows("c")) # Otro origen no toca los vuelos
+    merged = refresh.merge(merged, windows(), "flights")
+    assert sorted(merged["window"]) == ["a", "c"]
+    refresh.close()
+
+
+def test_due_depends_on_age_and_days_to_departure(tmp_path):
+    refresh = Refresher(str(tmp_path / "manifest.sqlite"), max_age=7 * DAY, near_days=14, near_max_age=DAY)
+    now = time.time()
+    far = date.fromtimestamp(now + 60 * DAY)
+    near = date.fromtimestamp(now + 5 * DAY)
+    assert refresh.due("flights", "far", far) # No está en el manifiesto
+
+    refresh.record("flights", "far", far, windows("far"))
+    refresh.record("flights", "near", near, windows("near"))
+    assert not refresh.due("flights", "far", far, now=now)
+    assert not refresh.due("flights", "far", far, now=now + 3 * DAY)
+    assert refresh.due("flights", "far", far, now=now + 8 * DAY)
+    assert refresh.due("flights", "near", near, now=now + 2 * DAY) # Cerca de la salida caduca antes
+    assert not refresh.due("flights", "near", near, now=now + 10 * DAY) # Ya ha salido
+    assert refresh.due("hotels", "far", far) # Cada origen tiene su manifiesto
+    refresh.close()
+
+
+def test_record_reports_content_changes_regardless_of_row_order(tmp_path):
+    refresh = Refresher(str(tmp_path / "manifest.sqlite"))
+    first = pd.DataFrame({"window": ["a", "a"], "price": [100.0, 120.0]})
+    assert refresh.record("flights", "a", "2025-07-01", first)
+    assert not refresh.record("flights", "a", "2025-07-01", first.iloc[::-1].reset_index(drop=True))
+    assert refresh.record("flights", "a", "2025-07-01", first.assign(price=[100.0, 90.0]))
+    assert refresh.changed["flights"] == {"a"}
+    assert refresh.summary()["windows"].tolist() == [1]
+    refresh.close()
+
+
+def test_flight_window_key_matches_the_plan_key():
+    origin, budapest = ("MAD", {}), ("BUD", {})
+    spec = {"origins": [origin], "destinations": [budapest], "dates": {"start": "2025-07-01", "end": "2025-07-10", "nights": 9},
+            "party": {"adults": 2, "children": 2}}
+    (job,) = plan(spec)
+    assert flightfunc.window_key(origin, budapest, "2025-07-01", "2025-07-10", 2, 2) == job_key(job)
+    assert flightfunc.window_key(("BCN", {}), budapest, "2025-07-01", "2025-07-10", 2, 2) != job_key(job) # Otro origen
+    assert flightfunc.window_key(origin, budapest, "2025-07-01", "2025-07-10", 2, 0) != job_key(job) # Otro grupo
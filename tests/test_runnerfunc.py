@@ -0,0 +1,90 @@
+import os
+import sys
+import threading
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+import runnerfunc
+from runnerfunc import JobQueue, LeasedSink, LeaseLost
+from sinkfunc import ParquetSink
+
+
+def test_leased_sink_stops_writing_after_losing_the_lease(tmp_path):
+    lost = threading.Event()
+    path = str(tmp_path / "shard")
+    sink = LeasedSink(path, lost, batches_per_part=1)
+    sink.write(pd.DataFrame({"price": [1.0]}), "a") # Confirmada: parte cerrada y clave en _done.json
+    sink.batches_per_part = 10
+    sink.write(pd.DataFrame({"price": [2.0]}), "b") # Aún en la parte abierta
+
+    lost.set()
+    with pytest.raises(LeaseLost):
+        sink.write(pd.DataFrame({"price": [3.0]}), "c")
+    with pytest.raises(LeaseLost):
+        sink.done("a")
+    sink.close()
+
+    resumed = ParquetSink(path)
+    assert resumed.done("a") and not resumed.done("b")
+    assert resumed.read()["price"].tolist() == [1.0]
+    assert not [name for name in os.listdir(path) if name.endswith(".tmp")]
+
+
+def test_lease_fails_expired_shard_at_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite"), max_attempts=2)
+    queue.submit("flights", {}, 1, run="r")
+    for attempt in range(2): # Dos workers que mueren con la parte: el lease caduca enseguida
+        job = queue.lease(f"w{attempt}", seconds=-1)
+        assert job["attempts"] == attempt + 1
+
+    assert queue.lease("w2") is None # Sin intentos: no se vuelve a tomar
+    assert queue.status("r") == [("r", "flights", "failed", 1)]
+    queue.close()
+
+
+def test_fail_returns_to_pending_until_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite"), max_attempts=2)
+    queue.submit("hotels", {}, 1, run="r")
+    job = queue.lease("w")
+    assert queue.fail(job["id"], "w", "error")
+    assert queue.status("r") == [("r", "hotels", "pending", 1)]
+
+    job = queue.lease("w")
+    assert job["attempts"] == 2
+    assert not queue.complete(job["id"], "otro", "salida") # Sólo el dueño del lease la puede cerrar
+    assert queue.fail(job["id"], "w", "error")
+    assert queue.status("r") == [("r", "hotels", "failed", 1)]
+    assert queue.lease("w") is None
+    queue.close()
+
+
+def test_run_shard_raises_when_windows_failed(tmp_path, monkeypatch):
+    async def main(token, origin, destinations, *args, failures=None, sink=None, **kwargs):
+        failures.append({"key": "BUDA|2025-07-03|2025-07-12", "url": "", "error": "HTTP 500"})
+        return sink.path
+
+    monkeypatch.setenv("rapidapi_token", "token")
+    monkeypatch.setattr(runnerfunc.flightfunc, "skyID", lambda city, token, cache=None: (city, "{}"))
+    monkeypatch.setattr(runnerfunc.flightfunc, "main", main)
+    job = {"id": 1, "run": "r", "scraper": "flights", "spec": {"origin": "Madrid", "destinations": ["Budapest"]},
+           "shard_index": 0, "shard_count": 1, "attempts": 1}
+    with pytest.raises(RuntimeError, match="1 consultas fallidas"):
+        runnerfunc.run_shard(job, str(tmp_path))
+
+
+def test_run_shard_splits_cpus_between_local_workers(tmp_path, monkeypatch):
+    calls = []
+
+    def main(destinations, sink=None, **kwargs):
+        calls.append(kwargs)
+        return sink.path
+
+    monkeypatch.setattr(runnerfunc.os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(runnerfunc.activityfunc, "main", main)
+    job = {"id": 1, "run": "r", "scraper": "activities", "spec": {"destinations": ["budapest"]},
+           "shard_index": 0, "shard_count": 1, "attempts": 1}
+    runnerfunc.run_shard(job, str(tmp_path), processes=4)
+    runnerfunc.run_shard(job, str(tmp_path), processes=16)
+    assert [(call["parse_workers"], call["pool_size"]) for call in calls] == [(2, 2), (1, 1)]
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+from searchfunc import ActivityIndex, parse_prices, tokenize
+
+LINKS = [f"https://www.civitatis.com/es/{path}/" for path in ("budapest/crucero", "budapest/termas", "budapest/balaton", "milan/navigli")]
+
+
+def activities():
+    return pd.DataFrame({
+        "Nombre": ["Crucero por el Danubio con cena", "Tour de los baños termales", "Excursión al lago Balaton", "Crucero por los Navigli"],
+        "Precio": ["25 €", "¡Gratis!", "1.200,50 €", "30 €"],
+        "Link": LINKS,
+        "Descripcion": ["Navega por el río Danubio al atardecer y disfruta de una cena", "Visita los baños Széchenyi",
+                        "Excursión de un día desde Budapest", "Paseo en barco por los canales de Milán"],
+        "Ciudad": ["budapest", "budapest", "budapest", "milan"],
+    })
+
+
+def test_tokenize_and_parse_prices():
+    assert tokenize("Excursiones a los Baños") == ["excursion", "bano"]
+    assert parse_prices(activities()["Precio"]).tolist() == [25.0, 0.0, 1200.5, 30.0]
+
+
+def test_search_ranks_and_filters():
+    index = ActivityIndex(activities())
+    assert index.search("crucero danubio")["Link"].tolist() == [LINKS[0], LINKS[3]]
+    assert index.search("crucero", max_price=26)["Link"].tolist() == [LINKS[0]]
+    assert index.search("crucero", city="milan")["Link"].tolist() == [LINKS[3]]
+    assert set(index.search("cruceor")["Link"]) == {LINKS[0], LINKS[3]} # Errata
+    assert len(index.search("cruceor", fuzzy=False)) == 0
+    assert len(ActivityIndex().search("crucero")) == 0
+
+
+def test_add_updates_prices_and_reindexes_changed_text():
+    index = ActivityIndex(activities())
+    update = activities().iloc[[0, 2]].copy()
+    update["Precio"] = ["20 €", "1.200,50 €"]
+    update.loc[update.index[1], "Descripcion"] = "Crucero por el lago"
+    assert index.add(update) == 1 # Sólo Balaton cambia de texto
+    assert len(index) == 4
+    assert index.search("danubio")["Precio"].tolist() == [20.0]
+    assert LINKS[2] in set(index.search("crucero")["Link"])
+
+
+def test_similar_excludes_the_reference_activity():
+    index = ActivityIndex(activities())
+    assert index.similar(LINKS[0])["Link"].tolist() == [LINKS[3]]
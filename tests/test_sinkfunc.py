@@ -0,0 +1,39 @@
+import os
+import sys
+from datetime import date
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+import hotelfunc
+from sinkfunc import ParquetSink
+from storefunc import sink_schema
+
+
+def hotels(n, with_type=True):
+    return [{"hotel_id": i, "hotel_name": f"Hotel {i}", "min_total_price": 100.0 + i, "review_score": 8.0,
+             "distance_to_cc": "1.5", "accommodation_type_name": "Hotel" if with_type else None,
+             "city_trans": "Budapest" if with_type else None} for i in range(n)]
+
+
+def test_sink_round_trip_with_different_category_counts(tmp_path):
+    # El primer lote tiene pocas categorías y columnas categóricas nulas; el segundo, más de 127 nombres distintos
+    first = hotelfunc.extract_hotel_batch([(hotels(5, with_type=False), date(2025, 7, 1), date(2025, 7, 10), "1|2025-07-01|2025-07-10")])
+    second = hotelfunc.extract_hotel_batch([(hotels(300), date(2025, 7, 2), date(2025, 7, 11), "1|2025-07-02|2025-07-11")])
+
+    with ParquetSink(str(tmp_path / "hotels"), schema=sink_schema("hotels")) as sink:
+        sink.write(first, ["1|2025-07-01|2025-07-10"])
+        sink.write(second, ["1|2025-07-02|2025-07-11"])
+
+    df = ParquetSink(str(tmp_path / "hotels")).read()
+    assert len(df) == 305
+    assert df["hotel_name"].nunique() == 300
+    assert df["acc_type"].isna().sum() == 5
+    assert list(df["day_in"].unique()) == ["Martes", "Miercoles"]
+    assert ParquetSink(str(tmp_path / "hotels")).done("1|2025-07-02|2025-07-11")
+
+
+def test_sink_inferred_schema_widens_categories(tmp_path):
+    sink = ParquetSink(str(tmp_path / "hotels"))
+    sink.write(hotelfunc.extract_hotel_batch([(hotels(3, with_type=False), date(2025, 7, 1), date(2025, 7, 10), "a")]), "a")
+    sink.write(hotelfunc.extract_hotel_batch([(hotels(200), date(2025, 7, 1), date(2025, 7, 10), "b")]), "b")
+    sink.close()
+    assert len(sink.read()) == 203
@@ -0,0 +1,60 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+from tripfunc import TripIndex
+
+
+def trip_index(activities=None):
+    flights = pd.DataFrame({
+        "destination": ["Budapest", "Budapest", "Budapest", "Milan Malpensa"],
+        "price": [100.0, 150.0, 120.0, 100.0],
+        "departure_go": ["2025-07-01 10:00", "2025-07-01 18:00", "2025-07-02 10:00", "2025-07-01 09:00"],
+        "departure_back": ["2025-07-10 12:00", "2025-07-10 20:00", "2025-07-11 12:00", "2025-07-10 11:00"],
+        "carrier_go": ["W6", "FR", "W6", "IB"],
+        "carrier_back": ["W6", "FR", "W6", "IB"],
+    })
+    hotels = pd.DataFrame({
+        "city": ["Budapest", "Budapest", "Budapest", "Milan"],
+        "date_in": ["2025-07-01", "2025-07-01", "2025-07-02", "2025-07-01"],
+        "date_out": ["2025-07-10", "2025-07-10", "2025-07-11", "2025-07-10"],
+        "hotel_name": ["A", "B", "C", "D"],
+        "price": [500.0, 700.0, 480.0, 500.0],
+        "rating": [8.0, 9.5, 7.0, 9.0],
+    })
+    return TripIndex(flights, hotels, activities)
+
+
+def test_query_breaks_total_ties_by_key_order():
+    index = trip_index() # Los tres paquetes más baratos cuestan 600
+    result = index.cheapest("2025-07-01", "2025-07-31", k=2)
+    assert result["city"].tolist() == ["Budapest", "Budapest"]
+    assert result["date_in"].tolist() == ["2025-07-01", "2025-07-02"]
+    assert result["total"].tolist() == [600.0, 600.0]
+    assert result["hotel_name"].tolist() == ["A", "C"]
+
+
+def test_query_filters_city_dates_and_budget():
+    index = trip_index()
+    assert index.cheapest("2025-07-01", "2025-07-31", city="Milan")["hotel_name"].tolist() == ["D"]
+    assert index.cheapest("2025-07-02", "2025-07-31")["hotel_name"].tolist() == ["C"]
+    assert index.cheapest("2025-07-01", "2025-07-10", city="Budapest")["hotel_name"].tolist() == ["A"]
+    assert len(index.cheapest("2025-07-01", "2025-07-31", budget=590)) == 0
+    assert len(index.cheapest("2025-07-01", "2025-07-31", city="Roma")) == 0 # Ciudad sin datos
+
+
+def test_best_value_and_activities_within_budget():
+    activities = pd.DataFrame({
+        "Nombre": ["Crucero", "Termas", "Balaton"],
+        "Precio": [25.0, 20.0, 40.0],
+        "Link": [f"https://www.civitatis.com/es/budapest/{name}/" for name in ("crucero", "termas", "balaton")],
+    })
+    index = trip_index(activities)
+    assert index.best_value("2025-07-01", "2025-07-31", k=1)["hotel_name"].tolist() == ["D"] # 9 / 600 €
+
+    result = index.cheapest("2025-07-01", "2025-07-10", city="Budapest", budget=650)
+    assert result["activities"].tolist() == [["Termas", "Crucero"]]
+    assert result["activities_price"].tolist() == [45.0]
+    assert result["total"].tolist() == [645.0]